@@ -8,6 +8,8 @@ from .models import (
     Notificacion,
     Pago,
     Asistencia,
+    PosicionFurgon,
+    ParadaRuta,
 )
 
 
@@ -53,9 +55,15 @@ class EstudianteAdmin(admin.ModelAdmin):
     )
 
 
+class ParadaRutaInline(admin.TabularInline):
+    model = ParadaRuta
+    extra = 0
+
+
 @admin.register(Ruta)
 class RutaAdmin(admin.ModelAdmin):
     list_display = ("id", "furgon", "tipo_ruta", "hora_inicio", "hora_termino")
+    inlines = [ParadaRutaInline]
 
 
 @admin.register(Notificacion)
@@ -80,3 +88,9 @@ class PagoAdmin(admin.ModelAdmin):
 class AsistenciaAdmin(admin.ModelAdmin):
     list_display = ("estudiante", "fecha", "estado", "furgon")
     list_filter = ("estado",)
+
+
+@admin.register(PosicionFurgon)
+class PosicionFurgonAdmin(admin.ModelAdmin):
+    list_display = ("furgon", "latitude", "longitude", "reported_at", "bucket")
+    list_filter = ("bucket",)
@@ -0,0 +1,55 @@
+"""JWT authentication that trusts the role claims of ``core.tokens``.
+
+Tokens with role claims authenticate as a ``ClaimsUser`` built from the
+token alone; older tokens without them fall back to loading the ``User``
+row like ``JWTAuthentication`` does.
+"""
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from . import roles, tokens
+
+
+class ClaimsUser(TokenUser):
+    """Stateless user backed by a role-claims token.
+
+    ``in_group`` answers from the ``roles`` claim and the ownership helpers
+    in ``core.permissions`` use ``conductor_id``/``furgon_ids``, so
+    permission checks never query the database.
+    """
+
+    def __init__(self, token):
+        super().__init__(token)
+        roles.remember(self, frozenset(token.get(tokens.ROLES_CLAIM, ())))
+
+    @cached_property
+    def id(self):
+        value = self.token[api_settings.USER_ID_CLAIM]
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def conductor_id(self):
+        return self.token.get('conductor')
+
+    @cached_property
+    def furgon_ids(self):
+        return frozenset(self.token.get('furgones', ()))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if tokens.ROLES_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        if tokens.is_revoked(validated_token):
+            raise InvalidToken('Token revocado, solicite uno nuevo')
+        return ClaimsUser(validated_token)
@@ -0,0 +1,271 @@
+"""Bulk create/update/upsert for Estudiante, Asistencia and Pago.
+
+``apply`` is the bulk counterpart of the viewsets' ``create``/``update``: the
+rows are validated with the resource serializer (relations as plain ids and
+without the per-row uniqueness queries), relations and natural keys are
+resolved with one query per related model, and the writes are chunked
+``bulk_create``/``bulk_update`` statements, journaled for the delta sync
+(``core.journal``) and versioned for conditional GET (``core.versions``). A
+row that fails never aborts the batch; it gets its own result::
+
+    {'index': 0, 'status': 'created', 'id': 12}
+    {'index': 1, 'status': 'updated', 'id': 7}
+    {'index': 2, 'status': 'error', 'detail': {'rut': ['...']}}
+
+Rows are matched on the model's natural key (``NATURAL_KEYS``; ``id`` when
+there is none):
+
+* ``create`` fails rows whose key already exists,
+* ``update`` fails rows whose key does not exist and only writes the fields
+  present in the row,
+* ``upsert`` updates existing rows and creates the others.
+"""
+from django.db import connection, transaction
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from . import canonical, journal, scoping, search, versions
+from .models import Asistencia, Estudiante, Furgon, Pago
+
+MODE_CREATE = 'create'
+MODE_UPDATE = 'update'
+MODE_UPSERT = 'upsert'
+MODES = (MODE_CREATE, MODE_UPDATE, MODE_UPSERT)
+
+# Upper bound of rows accepted in a single request.
+MAX_ROWS_PER_REQUEST = 1000
+# Rows per INSERT/UPDATE statement.
+WRITE_BATCH_SIZE = 500
+
+STATUS_CREATED = 'created'
+STATUS_UPDATED = 'updated'
+STATUS_ERROR = 'error'
+
+NATURAL_KEYS = {
+    Estudiante: ('rut',),
+    Asistencia: ('estudiante', 'fecha'),
+    Pago: ('id',),
+}
+
+# Related rows a non-admin may reference must be visible to them.
+RELATION_SCOPES = {
+    Estudiante: scoping.estudiantes,
+    Furgon: scoping.furgones,
+}
+
+
+def create(model, objs, batch_size=WRITE_BATCH_SIZE):
+    """Insert ``objs`` setting their pks; True when done with ``bulk_create``.
+
+    A backend that cannot return the rows of a multi-row INSERT (MySQL)
+    leaves the pks unset: they are read back by natural key
+    (``NATURAL_KEYS``), one query per batch. Rows without one (``Pago``,
+    ``Notificacion``) are saved one by one instead and False is returned:
+    the model signals (``core.signals``) have then journaled, indexed and
+    versioned them.
+    """
+    returns_rows = connection.features.can_return_rows_from_bulk_insert
+    names = NATURAL_KEYS.get(model, ('id',))
+    if not returns_rows and names == ('id',):
+        for obj in objs:
+            obj.save(force_insert=True)
+        return False
+    model._default_manager.bulk_create(objs, batch_size=batch_size)
+    if not returns_rows:
+        attnames = [model._meta.get_field(name).attname for name in names]
+        for start in range(0, len(objs), batch_size):
+            by_key = {tuple(getattr(obj, name) for name in attnames): obj for obj in objs[start:start + batch_size]}
+            # superset filter on each key column; exact matching is done below
+            rows = model._default_manager.filter(**{
+                f'{name}__in': {key[i] for key in by_key} for i, name in enumerate(attnames)
+            }).values_list('pk', *attnames)
+            for pk, *key in rows:
+                obj = by_key.get(tuple(key))
+                if obj is not None:
+                    obj.pk = pk
+    return True
+
+
+class _RowSerializerMixin:
+    """Validation of a single row without database queries: relations are
+    validated as integers (resolved later in bulk) and the uniqueness
+    validators are replaced by the natural key lookup."""
+
+    def build_relational_field(self, field_name, relation_info):
+        model_field = relation_info.model_field
+        kwargs = {'source': model_field.attname}
+        if model_field.null:
+            kwargs.update(required=False, allow_null=True)
+        return serializers.IntegerField, kwargs
+
+    def build_standard_field(self, field_name, model_field):
+        field_class, kwargs = super().build_standard_field(field_name, model_field)
+        if 'validators' in kwargs:
+            kwargs['validators'] = [v for v in kwargs['validators'] if not isinstance(v, UniqueValidator)]
+        return field_class, kwargs
+
+    def get_validators(self):
+        return []
+
+
+def row_serializer(serializer_class):
+    return type(f'{serializer_class.__name__}Row', (_RowSerializerMixin, serializer_class), {})
+
+
+def _resolve_relations(model, rows, user):
+    """Check in one query per related model that the ids in ``rows`` exist
+    (and are visible to ``user``). Returns ``{row index: errors}``."""
+    errors = {}
+    for field in model._meta.concrete_fields:
+        if not field.is_relation:
+            continue
+        ids = {row[field.attname] for row in rows.values() if row.get(field.attname) is not None}
+        if not ids:
+            continue
+        queryset = field.related_model._default_manager.filter(pk__in=ids)
+        scope = RELATION_SCOPES.get(field.related_model)
+        if scope is not None:
+            queryset = scope(queryset, user)
+        found = set(queryset.values_list('pk', flat=True))
+        for index, row in rows.items():
+            if row.get(field.attname) is not None and row[field.attname] not in found:
+                errors.setdefault(index, {})[field.name] = [f'{field.verbose_name} no encontrado']
+    return errors
+
+
+def _key(model, row):
+    return tuple(row.get(model._meta.get_field(name).attname) for name in NATURAL_KEYS[model])
+
+
+def _existing(model, keys):
+    """Existing instances by natural key, in one query."""
+    names = NATURAL_KEYS[model]
+    if not keys:
+        return {}
+    if names == ('id',):
+        queryset = model._default_manager.filter(pk__in=[k[0] for k in keys])
+    else:
+        # superset filter on each key column; exact matching is done below
+        queryset = model._default_manager.filter(**{
+            f'{model._meta.get_field(name).attname}__in': {k[i] for k in keys}
+            for i, name in enumerate(names)
+        })
+    found = {}
+    for obj in queryset:
+        key = tuple(getattr(obj, model._meta.get_field(name).attname) for name in names)
+        if key in keys:
+            found[key] = obj
+    return found
+
+
+def apply(serializer_class, items, mode, user):
+    """Validate and write ``items`` (a list of dicts) with ``mode``.
+
+    Returns one result dict per item, in input order.
+    """
+    model = serializer_class.Meta.model
+    row_class = row_serializer(serializer_class)
+    key_names = NATURAL_KEYS[model]
+    results = [{'index': index, 'status': None} for index in range(len(items))]
+
+    def fail(index, detail):
+        results[index].update(status=STATUS_ERROR, detail=detail)
+
+    rows = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            fail(index, 'cada elemento debe ser un objeto')
+            continue
+        serializer = row_class(data=item, partial=True)
+        if not serializer.is_valid():
+            fail(index, serializer.errors)
+            continue
+        row = dict(serializer.validated_data)
+        if key_names == ('id',) and item.get('id') is not None:
+            try:
+                row['id'] = int(item['id'])
+            except (TypeError, ValueError):
+                fail(index, {'id': ['debe ser un entero']})
+                continue
+        rows[index] = row
+
+    for index, detail in _resolve_relations(model, rows, user).items():
+        fail(index, detail)
+        del rows[index]
+
+    keys = {}
+    for index, row in list(rows.items()):
+        key = _key(model, row)
+        if key == (None,) and key_names == ('id',):
+            if mode == MODE_UPDATE:
+                fail(index, {'id': ['requerido para actualizar']})
+                del rows[index]
+            continue
+        if None in key:
+            fail(index, {name: ['requerido'] for name, value in zip(key_names, key) if value is None})
+        elif key in keys:
+            fail(index, {'non_field_errors': [f'clave repetida en la solicitud (elemento {keys[key]})']})
+        else:
+            keys[key] = index
+            continue
+        del rows[index]
+
+    existing = _existing(model, set(keys))
+    required = [
+        field.source for name, field in row_class().fields.items()
+        if field.required and not field.read_only
+    ]
+    to_create, to_update, update_fields = [], [], set()
+    for index, row in rows.items():
+        key = _key(model, row)
+        obj = existing.get(key)
+        if obj is not None:
+            if mode == MODE_CREATE:
+                fail(index, {'non_field_errors': ['ya existe']})
+                continue
+            fields = {name: value for name, value in row.items() if name != 'id'}
+            for name, value in fields.items():
+                setattr(obj, name, value)
+            update_fields.update(model._meta.get_field(name).name for name in fields)
+            to_update.append((index, obj))
+        elif mode == MODE_UPDATE or key_names == ('id',) and key != (None,):
+            fail(index, {'non_field_errors': ['no encontrado']})
+        else:
+            missing = [name for name in required if name not in row]
+            if missing:
+                fail(index, {name: ['Este campo es requerido.'] for name in missing})
+                continue
+            row.pop('id', None)
+            to_create.append((index, model(**row)))
+
+    if model._meta.model_name in canonical.SHADOWS:
+        # save() is not called on these
+        for _, obj in to_create + to_update:
+            update_fields = canonical.fill(obj, update_fields)
+    tracked = journal.is_tracked(model)
+    # the created rows left to journal and index here (see ``create``)
+    created = [obj for _, obj in to_create]
+    with transaction.atomic():
+        if created and not create(model, created):
+            created = []
+        if created and tracked:
+            journal.record(model, journal.CREATE, [obj.pk for obj in created],
+                           current=journal.audiences_of(model, created))
+        if to_update and update_fields:
+            before = journal.audiences(model, [obj.pk for _, obj in to_update]) if tracked else None
+            model._default_manager.bulk_update(
+                [obj for _, obj in to_update], sorted(update_fields), batch_size=WRITE_BATCH_SIZE
+            )
+            if tracked:
+                journal.record(model, journal.UPDATE, [obj.pk for _, obj in to_update], before)
+        if search.is_indexed(model):
+            search.index(model, created, created=True)
+            if set(update_fields or ()) & set(search.INDEXED[model._meta.model_name]):
+                search.index(model, [obj for _, obj in to_update])
+    if to_create or to_update:
+        versions.bump(model)
+    for index, obj in to_create:
+        results[index].update(status=STATUS_CREATED, id=obj.pk)
+    for index, obj in to_update:
+        results[index].update(status=STATUS_UPDATED, id=obj.pk)
+    return results
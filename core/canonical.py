@@ -0,0 +1,115 @@
+"""Canonical forms of ruts and patentes, kept in indexed shadow columns.
+
+Ruts and patentes are stored as typed ('12.345.678-5', '11111111-1',
+'ab-cd 12'), so an exact or prefix lookup on them misses the other
+spellings and ``icontains`` cannot use their unique index.
+``Conductor.rut_canonico``, ``Estudiante.rut_canonico`` and
+``Furgon.patente_canonica`` hold the canonical form ('123456785',
+'ABCD12'), set on ``save()`` and by the bulk writes (``core.bulk``);
+``manage.py backfill_canonical`` fills them for rows written otherwise.
+
+``AutocompleteMixin`` answers prefix queries on them with an index range
+scan that stops after ``limit`` rows.
+"""
+import re
+
+from django.apps import apps as global_apps
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+# Sorts after every character of a canonical value; closes prefix ranges.
+RANGE_END = '['
+BACKFILL_BATCH_SIZE = 1000
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+
+def rut(value):
+    """Digits and check digit of a rut, without leading zeros: '09.876.543-k' -> '9876543K'."""
+    return re.sub(r'[^0-9K]', '', (value or '').upper()).lstrip('0')
+
+
+def patente(value):
+    """Letters and digits of a patente in upper case: 'ab-cd 12' -> 'ABCD12'."""
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+
+
+# model name: (field, shadow column, canonical form)
+SHADOWS = {
+    'conductor': ('rut', 'rut_canonico', rut),
+    'estudiante': ('rut', 'rut_canonico', rut),
+    'furgon': ('patente', 'patente_canonica', patente),
+}
+
+
+def fill(obj, update_fields=None):
+    """Set the shadow column of ``obj``. Returns ``update_fields`` with the
+    column added when its field is among them."""
+    source, target, canonicalize = SHADOWS[obj._meta.model_name]
+    setattr(obj, target, canonicalize(getattr(obj, source)))
+    if update_fields is not None and source in update_fields:
+        return set(update_fields) | {target}
+    return update_fields
+
+
+def prefix_filter(model, text):
+    """Lookup kwargs for the rows whose canonical value starts with the
+    canonical form of ``text``; ``None`` if that is empty."""
+    _, target, canonicalize = SHADOWS[model._meta.model_name]
+    prefix = canonicalize(text)
+    if not prefix:
+        return None
+    return {f'{target}__gte': prefix, f'{target}__lt': prefix + RANGE_END}
+
+
+def backfill(apps=None, batch_size=BACKFILL_BATCH_SIZE):
+    """Recompute every shadow column; returns ``{model name: rows changed}``.
+    ``apps`` is the app registry of a data migration."""
+    changed = {}
+    for name, (source, target, canonicalize) in SHADOWS.items():
+        model = (apps or global_apps).get_model('core', name)
+        last, changed[name] = 0, 0
+        while True:
+            batch = list(model._default_manager.filter(pk__gt=last).order_by('pk').only(source, target)[:batch_size])
+            if not batch:
+                break
+            stale = []
+            for obj in batch:
+                value = canonicalize(getattr(obj, source))
+                if getattr(obj, target) != value:
+                    setattr(obj, target, value)
+                    stale.append(obj)
+            model._default_manager.bulk_update(stale, [target], batch_size=batch_size)
+            last, changed[name] = batch[-1].pk, changed[name] + len(stale)
+    return changed
+
+
+class AutocompleteMixin:
+    """``GET <recurso>/autocomplete/?q=<prefijo>``: the rows visible to the
+    user whose canonical rut or patente starts with ``q``, in that order,
+    as ``autocomplete_columns``."""
+    autocomplete_columns = ('id',)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Autocompletado por prefijo de rut o patente, sin importar puntos,
+        guiones, espacios ni mayúsculas.
+
+        Parámetros (query string):
+            q       comienzo del rut o la patente
+            limit   máximo de resultados (por defecto 10, máximo 50)
+        """
+        queryset = self.get_queryset()
+        lookup = prefix_filter(queryset.model, request.query_params.get('q', ''))
+        if lookup is None:
+            return Response({'detail': 'q debe contener letras o dígitos'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT))
+            if limit <= 0:
+                raise ValueError
+        except ValueError:
+            return Response({'detail': 'limit debe ser un entero positivo'}, status=status.HTTP_400_BAD_REQUEST)
+        target = SHADOWS[queryset.model._meta.model_name][1]
+        rows = queryset.filter(**lookup).order_by(target, 'pk').values(*self.autocomplete_columns)
+        return Response(list(rows[:min(limit, MAX_AUTOCOMPLETE_LIMIT)]))
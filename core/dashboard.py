@@ -0,0 +1,111 @@
+"""Home page statistics (``frontend.views.IndexView``).
+
+The global counters are read with one query of scalar ``COUNT(*)``
+subqueries and cached under the version stamps of the counted models
+(``core.versions``), so a save or delete of any of them computes them again
+on the next request and the home page otherwise costs only the query that
+reads the stamps (``current_stamps``, shared by all the counters). The
+per-user counters and the top colegios are cached the same way, with short
+TTLs bounding how stale they get after writes that bypass the signals.
+Concurrent misses are collapsed (``core.respcache.get_or_compute``).
+"""
+from django.db import connection
+from django.db.models import Count
+
+from . import respcache, versions
+from .models import Asistencia, Colegio, Conductor, Estudiante, Furgon, Notificacion, Pago, Ruta
+from .permissions import in_group
+from .roles import user_roles
+
+COUNTED = (
+    ('furgones', Furgon),
+    ('colegios', Colegio),
+    ('conductores', Conductor),
+    ('estudiantes', Estudiante),
+    ('rutas', Ruta),
+    ('pagos', Pago),
+    ('asistencias', Asistencia),
+)
+COUNTS_TTL = 3600
+USER_COUNTS_TTL = 60
+TOP_COLEGIOS_TTL = 300
+TOP_COLEGIOS_SIZE = 5
+
+
+# every stamp the counters below depend on
+DEPENDENCIES = (Furgon, Colegio, Conductor, Estudiante, Ruta, Pago, Asistencia, Notificacion)
+
+
+def current_stamps():
+    """``{model: stamp}`` of ``DEPENDENCIES``, for the ``stamps`` argument of
+    the counters below (one query for all of them)."""
+    return dict(zip(DEPENDENCIES, versions.stamps(DEPENDENCIES)))
+
+
+def _cached(name, dependencies, compute, timeout, *parts, stamps=None):
+    values = [stamps[dep] for dep in dependencies] if stamps is not None else versions.stamps(dependencies)
+    key = versions.fingerprint(values, parts)
+    return respcache.get_or_compute(f'dashboard:{name}:{key}', lambda: (compute(), True), timeout)
+
+
+def _count_all():
+    quote = connection.ops.quote_name
+    sql = 'SELECT ' + ', '.join(f'(SELECT COUNT(*) FROM {quote(model._meta.db_table)})' for _, model in COUNTED)
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        row = cursor.fetchone()
+    return dict(zip((name for name, _ in COUNTED), row))
+
+
+def counts(stamps=None):
+    """``{'furgones': n, 'colegios': n, ...}`` for every model in ``COUNTED``."""
+    return _cached('counts', [model for _, model in COUNTED], _count_all, COUNTS_TTL, stamps=stamps)
+
+
+def _user_key(user):
+    return user.pk, sorted(user_roles(user))
+
+
+def my_furgones_count(user, stamps=None):
+    """Furgones driven by ``user`` (0 unless conductor)."""
+    if not user or not user.is_authenticated or not in_group(user, 'Conductor'):
+        return 0
+    return _cached(
+        'my_furgones', (Furgon, Conductor),
+        lambda: Furgon.objects.filter(conductor__user=user).count(),
+        USER_COUNTS_TTL, _user_key(user), stamps=stamps,
+    )
+
+
+def _unread(user):
+    unread = Notificacion.objects.filter(leido=False)
+    if in_group(user, 'Apoderado'):
+        return unread.filter(estudiante__apoderado_user=user).count()
+    if in_group(user, 'Conductor'):
+        return unread.filter(furgon__conductor__user=user).count()
+    return unread.count()
+
+
+def unread_notifications_count(user, stamps=None):
+    """Unread notificaciones relevant to ``user``: the ones of its students
+    (apoderado) or furgones (conductor), every one otherwise."""
+    if not user or not user.is_authenticated:
+        return 0
+    return _cached(
+        'unread', (Notificacion, Estudiante, Furgon, Conductor),
+        lambda: _unread(user), USER_COUNTS_TTL, _user_key(user), stamps=stamps,
+    )
+
+
+def top_colegios(stamps=None):
+    """The ``TOP_COLEGIOS_SIZE`` colegios with most furgones, as dicts with
+    ``id``, ``nombre`` and ``num_furgones``."""
+    return _cached(
+        'top_colegios', (Colegio, Furgon),
+        lambda: list(
+            Colegio.objects.annotate(num_furgones=Count('furgones'))
+            .order_by('-num_furgones', 'nombre')
+            .values('id', 'nombre', 'num_furgones')[:TOP_COLEGIOS_SIZE]
+        ),
+        TOP_COLEGIOS_TTL, stamps=stamps,
+    )
@@ -0,0 +1,315 @@
+"""Arrival time estimates per route stop.
+
+Combines the live position of a furgón (``core.live``), the ordered stops
+of its active ``Ruta`` (``ParadaRuta``) and the historical travel time of
+each segment (``TiempoTramo``).
+
+* ``observe_fix`` runs on the GPS write path. It only tracks which stop the
+  furgón last visited and, when it reaches the following stop, folds the
+  segment duration into ``TiempoTramo`` (a database write per completed
+  segment, not per fix).
+* ``compute_eta`` runs on read. The result is cached together with the
+  ``reported_at`` it was computed from, so it is recomputed only after a new
+  fix arrives (or the route changes).
+
+Route data (rutas per furgón, stops and segment times) is cached under the
+version stamps of ``Ruta``, ``ParadaRuta`` and ``TiempoTramo``
+(``core.versions``), so a change made by any process is seen by every other
+one; reading the stamps is one query. The stop progress of each furgón is
+read and written by every process that applies fixes, so it lives in the
+database (``EstadoFurgon.eta``).
+"""
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from . import geo, live, versions
+from .models import EstadoFurgon, ParadaRuta, Ruta, TiempoTramo
+
+ARRIVAL_RADIUS_M = 100.0
+DEFAULT_SPEED_MPS = 25 / 3.6
+EWMA_ALPHA = 0.3
+ROUTE_CACHE_TTL = 3600
+RESULT_CACHE_TTL = 12 * 3600
+# the models the cached route data is read from
+ROUTE_DEPENDENCIES = (Ruta, ParadaRuta, TiempoTramo)
+# a progress this old is discarded: the furgón has not visited any stop yet
+STATE_MAX_AGE = timedelta(hours=12)
+
+
+def _rutas_key(version, furgon_id):
+    return f'eta:rutas:{version}:{furgon_id}'
+
+
+def _plan_key(version, ruta_id):
+    return f'eta:plan:{version}:{ruta_id}'
+
+
+def _result_key(furgon_id):
+    return f'eta:result:{furgon_id}'
+
+
+def route_version():
+    """Fingerprint of the route data stamps, in one query."""
+    return versions.fingerprint(*versions.stamps(ROUTE_DEPENDENCIES))
+
+
+def rutas_for(furgon_ids, version=None):
+    """Return ``{furgon_id: [(ruta_id, hora_inicio, hora_termino)]}`` (cached).
+
+    One cache round trip plus at most one query for the furgones not cached
+    (and one for the stamps unless ``version``, see ``route_version``, is given).
+    """
+    if version is None:
+        version = route_version()
+    keys = {_rutas_key(version, pk): pk for pk in furgon_ids}
+    found = cache.get_many(keys)
+    result = {keys[key]: rutas for key, rutas in found.items()}
+    missing = [pk for pk in furgon_ids if pk not in result]
+    if missing:
+        loaded = {pk: [] for pk in missing}
+        rows = (
+            Ruta.objects.filter(furgon_id__in=missing)
+            .order_by('hora_inicio', 'pk')
+            .values_list('furgon_id', 'pk', 'hora_inicio', 'hora_termino')
+        )
+        for furgon_id, ruta_id, inicio, termino in rows:
+            loaded[furgon_id].append((ruta_id, inicio, termino))
+        cache.set_many({_rutas_key(version, pk): rutas for pk, rutas in loaded.items()}, ROUTE_CACHE_TTL)
+        result.update(loaded)
+    return result
+
+
+def _active(rutas, when):
+    local_time = timezone.localtime(when).time() if timezone.is_aware(when) else when.time()
+    for ruta_id, inicio, termino in rutas:
+        if (inicio is None or inicio <= local_time) and (termino is None or local_time <= termino):
+            return ruta_id
+    return None
+
+
+def active_ruta_id(furgon_id, when, version=None):
+    """Return the ruta whose schedule contains ``when`` (local time).
+
+    Rutas without ``hora_inicio``/``hora_termino`` are active all day.
+    """
+    return _active(rutas_for([furgon_id], version)[furgon_id], when)
+
+
+def plans_for(ruta_ids, version=None):
+    """Return ``{ruta_id: plan}`` with the cached stops and segment data.
+
+    A plan is ``{'stops': [(orden, nombre, lat, lon)], 'lengths': [m],
+    'segments': {orden_desde: s}}`` where ``lengths[i]`` is the distance from
+    stop ``i`` to stop ``i + 1``.
+    """
+    if version is None:
+        version = route_version()
+    keys = {_plan_key(version, pk): pk for pk in ruta_ids}
+    found = cache.get_many(keys)
+    result = {keys[key]: plan for key, plan in found.items()}
+    missing = [pk for pk in ruta_ids if pk not in result]
+    if missing:
+        loaded = {pk: {'stops': [], 'segments': {}} for pk in missing}
+        stops = (
+            ParadaRuta.objects.filter(ruta_id__in=missing)
+            .order_by('ruta_id', 'orden')
+            .values_list('ruta_id', 'orden', 'nombre', 'latitude', 'longitude')
+        )
+        for ruta_id, orden, nombre, lat, lon in stops:
+            loaded[ruta_id]['stops'].append((orden, nombre, lat, lon))
+        tramos = TiempoTramo.objects.filter(ruta_id__in=missing).values_list(
+            'ruta_id', 'orden_desde', 'segundos_promedio'
+        )
+        for ruta_id, orden_desde, seconds in tramos:
+            loaded[ruta_id]['segments'][orden_desde] = seconds
+        for plan in loaded.values():
+            stops = plan['stops']
+            plan['lengths'] = [geo.haversine(a[2], a[3], b[2], b[3]) for a, b in zip(stops, stops[1:])]
+        cache.set_many({_plan_key(version, pk): plan for pk, plan in loaded.items()}, ROUTE_CACHE_TTL)
+        result.update(loaded)
+    return result
+
+
+def route_plan(ruta_id, version=None):
+    return plans_for([ruta_id], version)[ruta_id]
+
+
+def load_states(furgon_ids):
+    """``{furgon_id: state}`` of the furgones with a stored progress, in one query."""
+    rows = EstadoFurgon.objects.filter(furgon_id__in=list(furgon_ids)).values_list('furgon_id', 'eta')
+    return {
+        furgon_id: dict(data, last_stop_at=data['last_stop_at'] and datetime.fromisoformat(data['last_stop_at']))
+        for furgon_id, data in rows if data
+    }
+
+
+def store_states(states):
+    """Write ``{furgon_id: state}`` in one statement."""
+    target = {'unique_fields': ['furgon']} if connection.features.supports_update_conflicts_with_target else {}
+    EstadoFurgon.objects.bulk_create(
+        [
+            EstadoFurgon(furgon_id=furgon_id, eta=dict(
+                state, last_stop_at=state['last_stop_at'] and state['last_stop_at'].isoformat(),
+            ))
+            for furgon_id, state in states.items()
+        ],
+        update_conflicts=True, update_fields=['eta'], **target,
+    )
+
+
+def record_segment(ruta_id, orden_desde, seconds):
+    """Fold one observed segment duration into its moving average."""
+    tramo, created = TiempoTramo.objects.get_or_create(
+        ruta_id=ruta_id,
+        orden_desde=orden_desde,
+        defaults={'segundos_promedio': seconds, 'muestras': 1},
+    )
+    if not created:
+        tramo.segundos_promedio = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * tramo.segundos_promedio
+        tramo.muestras += 1
+        tramo.save(update_fields=['segundos_promedio', 'muestras', 'actualizado_at'])
+    versions.bump(TiempoTramo)
+
+
+def _advance(state, plan, ruta_id, latitude, longitude, reported_at):
+    """Update ``state`` with a fix; returns the state to store (or ``None``)."""
+    stops = plan['stops']
+    if not stops:
+        return None
+    if (
+        state is None
+        or state['ruta'] != ruta_id
+        or (state['last_stop_at'] is not None and reported_at - state['last_stop_at'] > STATE_MAX_AGE)
+    ):
+        state = {'ruta': ruta_id, 'last_stop': None, 'last_stop_at': None}
+    distances = geo.haversine_many(latitude, longitude, [s[2] for s in stops], [s[3] for s in stops])
+    nearest = min(range(len(stops)), key=distances.__getitem__)
+    if distances[nearest] <= ARRIVAL_RADIUS_M:
+        previous = state['last_stop']
+        if previous is not None and nearest == previous + 1 and state['last_stop_at'] is not None:
+            # last_stop_at is the last fix seen at the previous stop (departure)
+            elapsed = (reported_at - state['last_stop_at']).total_seconds()
+            if elapsed > 0:
+                record_segment(ruta_id, stops[previous][0], elapsed)
+        state['last_stop'] = nearest
+        state['last_stop_at'] = reported_at
+    return state
+
+
+def observe_fixes(fixes):
+    """Update the stop progress of the furgones with newly applied fixes.
+
+    Batched: the stamps, a constant number of cache round trips, queries only
+    for rutas/plans not cached yet, the progress read and written once, and
+    one write per completed segment.
+    """
+    if not fixes:
+        return
+    version = route_version()
+    rutas = rutas_for({f['furgon'] for f in fixes}, version)
+    active = []
+    for fix in fixes:
+        ruta_id = _active(rutas[fix['furgon']], fix['reported_at'])
+        if ruta_id is not None:
+            active.append((fix, ruta_id))
+    if not active:
+        return
+    plans = plans_for({ruta_id for _, ruta_id in active}, version)
+    states = load_states({fix['furgon'] for fix, _ in active})
+    updated = {}
+    for fix, ruta_id in active:
+        furgon_id = fix['furgon']
+        current = updated.get(furgon_id, states.get(furgon_id))
+        state = _advance(
+            dict(current) if current else None, plans[ruta_id], ruta_id,
+            fix['latitude'], fix['longitude'], fix['reported_at'],
+        )
+        if state is not None:
+            updated[furgon_id] = state
+    # only the progress that changed is written
+    updated = {pk: state for pk, state in updated.items() if state != states.get(pk)}
+    if updated:
+        store_states(updated)
+
+
+def observe_fix(furgon_id, latitude, longitude, reported_at):
+    observe_fixes([{'furgon': furgon_id, 'latitude': latitude, 'longitude': longitude, 'reported_at': reported_at}])
+
+
+def _segment_seconds(plan, index):
+    """Seconds from stop ``index`` to stop ``index + 1``: historical or by distance."""
+    orden = plan['stops'][index][0]
+    seconds = plan['segments'].get(orden)
+    if seconds is None:
+        seconds = plan['lengths'][index] / DEFAULT_SPEED_MPS
+    return seconds
+
+
+def compute_eta(furgon_id):
+    """Return the ETA of every remaining stop of the furgón's active ruta.
+
+    Returns ``None`` when there is no known position or no active ruta with
+    stops. The result is reused until a newer fix or a route change.
+    """
+    position = live.position(furgon_id)
+    if position is None:
+        return None
+    latitude, longitude, reported_at = position
+    version = route_version()
+    ruta_id = active_ruta_id(furgon_id, reported_at, version)
+    if ruta_id is None:
+        return None
+    plan = route_plan(ruta_id, version)
+    stops = plan['stops']
+    if not stops:
+        return None
+    cached = cache.get(_result_key(furgon_id))
+    if (
+        cached is not None
+        and cached['reported_at'] == reported_at
+        and cached['ruta'] == ruta_id
+        and cached['version'] == version
+    ):
+        return cached
+
+    state = load_states([furgon_id]).get(furgon_id, {})
+    if state.get('ruta') == ruta_id and state.get('last_stop') is not None:
+        next_index = state['last_stop'] + 1
+    else:
+        distances = geo.haversine_many(latitude, longitude, [s[2] for s in stops], [s[3] for s in stops])
+        next_index = min(range(len(stops)), key=distances.__getitem__)
+
+    paradas = []
+    if next_index < len(stops):
+        target = stops[next_index]
+        distance = geo.haversine(latitude, longitude, target[2], target[3])
+        speed = DEFAULT_SPEED_MPS
+        if next_index > 0:
+            length = plan['lengths'][next_index - 1]
+            historical = plan['segments'].get(stops[next_index - 1][0])
+            if historical and length > 0:
+                speed = length / historical
+        seconds = distance / speed
+        for index in range(next_index, len(stops)):
+            if index > next_index:
+                seconds += _segment_seconds(plan, index - 1)
+            orden, nombre, _, _ = stops[index]
+            paradas.append({
+                'orden': orden,
+                'nombre': nombre,
+                'segundos': round(seconds),
+                'eta': reported_at + timedelta(seconds=seconds),
+            })
+
+    result = {
+        'furgon': furgon_id,
+        'ruta': ruta_id,
+        'reported_at': reported_at,
+        'version': version,
+        'paradas': paradas,
+    }
+    cache.set(_result_key(furgon_id), result, RESULT_CACHE_TTL)
+    return result
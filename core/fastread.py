@@ -0,0 +1,127 @@
+"""Read-only list serialization straight from database rows.
+
+``ModelSerializer`` builds a model instance and walks the field chain for
+every row of a list. For the plain ``'__all__'`` serializers of this app the
+same output can be produced from ``values_list()`` rows: ``compile_encoder``
+maps each serializer field to its column once, and encoding a row is then a
+``dict(zip(...))`` plus a call to the field's ``to_representation`` only for
+the types whose representation differs from the database value (dates,
+datetimes, decimals, floats). Keys, order and values are those of the
+serializer, so the rendered JSON is byte-for-byte the same.
+
+Serializers that cannot be compiled (custom sources, method fields, nested
+serializers) return ``None`` and the viewset falls back to the serializer.
+"""
+import functools
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields
+from rest_framework import ISO_8601, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Fields whose representation of a database value is the value itself.
+_IDENTITY = (
+    drf_fields.CharField.to_representation,
+    drf_fields.IntegerField.to_representation,
+    drf_fields.BooleanField.to_representation,
+    drf_fields.ChoiceField.to_representation,
+    relations.PrimaryKeyRelatedField.to_representation,
+)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _converter(field):
+    if isinstance(field, drf_fields.FloatField):
+        return float
+    # ISO-8601 dates and times, as DateField/TimeField.to_representation
+    for field_class, default in ((drf_fields.DateField, api_settings.DATE_FORMAT),
+                                 (drf_fields.TimeField, api_settings.TIME_FORMAT)):
+        if isinstance(field, field_class):
+            output_format = getattr(field, 'format', default)
+            if output_format is not None and output_format.lower() == ISO_8601:
+                return _isoformat
+    return field.to_representation
+
+
+class RowEncoder:
+    """Encoder of ``values_list(*columns, named=True)`` rows; the output
+    columns come first so ``zip`` drops the extra ones."""
+
+    def __init__(self, keys, columns, converters):
+        self.keys = keys
+        self.columns = columns
+        self.converters = converters
+
+    def rows(self, queryset, extra=()):
+        columns = self.columns + tuple(name for name in extra if name not in self.columns)
+        return queryset.values_list(*columns, named=True)
+
+    def encode(self, rows):
+        keys = self.keys
+        converters = self.converters
+        data = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            for key, index, convert in converters:
+                value = row[index]
+                if value is not None:
+                    item[key] = convert(value)
+            data.append(item)
+        return data
+
+
+@functools.lru_cache(maxsize=None)
+def compile_encoder(serializer_class, fields=None):
+    """``RowEncoder`` for ``serializer_class`` limited to ``fields`` (a
+    tuple), or ``None`` if some field is not a plain model column."""
+    serializer = serializer_class(fields=list(fields) if fields is not None else None)
+    model = serializer_class.Meta.model
+    keys, columns, converters = [], [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, relations.RelatedField):
+            if not isinstance(field, relations.PrimaryKeyRelatedField) or field.pk_field is not None:
+                return None
+        elif not isinstance(field, drf_fields.Field) or isinstance(field, drf_fields.SerializerMethodField):
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        index = len(columns)
+        keys.append(name)
+        columns.append(model_field.attname)
+        if type(field).to_representation in _IDENTITY:
+            continue
+        converters.append((name, index, _converter(field)))
+    return RowEncoder(tuple(keys), tuple(columns), tuple(converters))
+
+
+class FastListMixin:
+    """Viewset mixin serving ``list`` through ``compile_encoder`` when the
+    serializer allows it, for viewsets that opt in with ``fast_list = True``
+    (the large lists). Expanded relations (``core.fieldsets``) use the
+    serializer."""
+    fast_list = False
+
+    def list(self, request, *args, **kwargs):
+        fields, expand = self.get_fieldsets()
+        encoder = None
+        if self.fast_list and not expand:
+            encoder = compile_encoder(self.get_serializer_class(), tuple(fields) if fields is not None else None)
+        if encoder is None:
+            return super().list(request, *args, **kwargs)
+        # the pagination cursor reads the ordering columns from the rows
+        extra = [name.lstrip('-') for name in getattr(self, 'keyset_ordering', ())]
+        rows = encoder.rows(self.filter_queryset(self.get_queryset()), extra)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(encoder.encode(page))
+        return Response(encoder.encode(rows))
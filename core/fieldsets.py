@@ -0,0 +1,112 @@
+"""Sparse fieldsets (``?fields=``) and relation expansion (``?expand=``).
+
+``?fields=id,nombre`` limits the columns of every object in a list/retrieve
+response; the same columns (plus the primary key and the pagination
+ordering) are pushed down to ``QuerySet.only()``. ``?expand=furgon`` replaces
+the id of a relation with the nested object, and dotted paths expand deeper
+(``?expand=furgon.conductor``). The relations a serializer can expand are
+declared in ``Meta.expandable_fields`` (see ``core.serializers``).
+
+Expanded forward relations are fetched with ``select_related`` and reverse
+ones with ``prefetch_related``, so an expanded list costs a constant number
+of queries regardless of its length. Expanded relations are always included,
+even when ``fields`` does not name them.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def _expand_tree(paths):
+    tree = {}
+    for path in paths:
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _check_expand(serializer_class, tree, prefix=''):
+    unknown = []
+    expandable = serializer_class.get_expandable_fields()
+    for name, nested in tree.items():
+        if name not in expandable:
+            unknown.append(prefix + name)
+        else:
+            unknown += _check_expand(expandable[name], nested, f'{prefix}{name}.')
+    return unknown
+
+
+def parse(params, serializer_class):
+    """``(fields, expand)`` from the query string, validated against
+    ``serializer_class``. ``fields`` is ``None`` when not requested and
+    ``expand`` a nested dict (``{'furgon': {'conductor': {}}}``).
+    """
+    fields = _split(params.get('fields')) or None
+    expand = _expand_tree(_split(params.get('expand')))
+    if fields is not None:
+        unknown = [name for name in fields if name not in serializer_class().fields]
+        if unknown:
+            raise ValidationError({'fields': f'campos desconocidos: {", ".join(unknown)}'})
+    unknown = _check_expand(serializer_class, expand)
+    if unknown:
+        raise ValidationError({'expand': f'relaciones no expandibles: {", ".join(unknown)}'})
+    return fields, expand
+
+
+def _relations(model, tree, prefix, select, prefetch, prefetching=False):
+    for name, nested in tree.items():
+        field = model._meta.get_field(name)
+        path = prefix + name
+        many = prefetching or field.many_to_many or field.one_to_many
+        (prefetch if many else select).append(path)
+        _relations(field.related_model, nested, f'{path}__', select, prefetch, many)
+
+
+def optimize(queryset, fields=None, expand=None, keep=()):
+    """Apply ``select_related``/``prefetch_related`` for ``expand`` and
+    ``only()`` for ``fields``. ``keep`` lists extra model fields that must be
+    loaded (e.g. the pagination ordering)."""
+    model = queryset.model
+    if expand:
+        select, prefetch = [], []
+        _relations(model, expand, '', select, prefetch)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+    if fields is not None:
+        names = {model._meta.pk.name}
+        for name in [*fields, *(expand or ()), *keep]:
+            field = model._meta.get_field(name)
+            if field.concrete:
+                names.add(field.name)
+        queryset = queryset.only(*names)
+    return queryset
+
+
+class FieldsetsMixin:
+    """Viewset mixin wiring ``?fields=``/``?expand=`` to the serializer and
+    the queryset. Only ``fieldset_actions`` honour the parameters."""
+    fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldsets(self):
+        if not hasattr(self, '_fieldsets'):
+            if self.action in self.fieldset_actions:
+                self._fieldsets = parse(self.request.query_params, self.get_serializer_class())
+            else:
+                self._fieldsets = (None, {})
+        return self._fieldsets
+
+    def get_queryset(self):
+        fields, expand = self.get_fieldsets()
+        keep = [name.lstrip('-') for name in getattr(self, 'keyset_ordering', ())]
+        return optimize(super().get_queryset(), fields, expand, keep)
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_fieldsets()
+        kwargs.setdefault('fields', fields)
+        kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
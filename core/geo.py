@@ -0,0 +1,222 @@
+"""Geohash grid helpers used to index and query furgón positions.
+
+``Furgon.geohash`` stores the geohash of the last known position at
+``GEOHASH_PRECISION`` characters. A proximity query picks the coarsest
+precision whose cells are at least as large as the search radius, so the
+search circle is always covered by the 3x3 block of cells around the
+centre; each cell becomes an indexed range predicate on the column.
+"""
+import math
+
+from django.db.models import Q
+
+GEOHASH_PRECISION = 8
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Sorts after every geohash character; closes prefix ranges.
+_RANGE_END = '{'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point with ``precision`` characters."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bit = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[ch])
+            bit = 0
+            ch = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """Return ``(lat_degrees, lon_degrees)`` covered by one cell."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def precision_for_radius(latitude, radius_m):
+    """Return the finest precision whose cells are at least ``radius_m`` wide and tall."""
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lon_deg = cell_size_degrees(precision)
+        if lat_deg * METERS_PER_DEGREE >= radius_m and lon_deg * METERS_PER_DEGREE * cos_lat >= radius_m:
+            return precision
+    return 1
+
+
+def covering_cells(latitude, longitude, precision):
+    """Return the geohashes of the cell containing the point and its 8 neighbours."""
+    lat_deg, lon_deg = cell_size_degrees(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = min(max(latitude + dy * lat_deg, -90.0), 90.0)
+        for dx in (-1, 0, 1):
+            lon = (longitude + dx * lon_deg + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def cells_q(cells, field='geohash'):
+    """Build an OR of index-friendly range predicates, one per cell prefix."""
+    q = Q()
+    for cell in cells:
+        q |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + _RANGE_END})
+    return q
+
+
+def haversine_many(latitude, longitude, lats, lons):
+    """Distances in meters from one point to many, as a list.
+
+    Works over parallel sequences instead of per-point objects; the constant
+    terms for the origin are computed once.
+    """
+    lat0 = math.radians(latitude)
+    lon0 = math.radians(longitude)
+    cos_lat0 = math.cos(lat0)
+    radians = math.radians
+    sin = math.sin
+    cos = math.cos
+    asin = math.asin
+    sqrt = math.sqrt
+    out = []
+    append = out.append
+    for lat, lon in zip(lats, lons):
+        lat1 = radians(lat)
+        s_lat = sin((lat1 - lat0) / 2)
+        s_lon = sin((radians(lon) - lon0) / 2)
+        h = s_lat * s_lat + cos_lat0 * cos(lat1) * s_lon * s_lon
+        append(2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(h))))
+    return out
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    return haversine_many(lat1, lon1, (lat2,), (lon2,))[0]
+
+
+NEARBY_FIELDS = ('pk', 'patente', 'last_latitude', 'last_longitude', 'last_reported_at')
+
+
+def _refine(rows, latitude, longitude, radius_m=None):
+    distances = haversine_many(latitude, longitude, [r[2] for r in rows], [r[3] for r in rows])
+    found = [
+        (dist, row) for dist, row in zip(distances, rows)
+        if radius_m is None or dist <= radius_m
+    ]
+    found.sort(key=lambda item: item[0])
+    return found
+
+
+def within_radius(queryset, latitude, longitude, radius_m):
+    """Return ``[(distance_m, row)]`` for furgones within ``radius_m``, nearest first.
+
+    ``row`` is a tuple with ``NEARBY_FIELDS``. Candidates come from the
+    geohash index; exact distances are computed only for those.
+    """
+    precision = precision_for_radius(latitude, radius_m)
+    cells = covering_cells(latitude, longitude, precision)
+    rows = list(queryset.filter(cells_q(cells)).values_list(*NEARBY_FIELDS))
+    return _refine(rows, latitude, longitude, radius_m)
+
+
+def nearest(queryset, latitude, longitude, k):
+    """Return the ``k`` nearest furgones as ``[(distance_m, row)]``.
+
+    Widens the searched cells until at least ``k`` candidates are found, then
+    re-queries with the k-th candidate distance as radius so furgones just
+    outside the first block of cells are not missed.
+    """
+    for precision in range(GEOHASH_PRECISION - 1, 0, -1):
+        cells = covering_cells(latitude, longitude, precision)
+        rows = list(queryset.filter(cells_q(cells)).values_list(*NEARBY_FIELDS))
+        if len(rows) >= k:
+            found = _refine(rows, latitude, longitude)
+            radius_m = found[k - 1][0]
+            return within_radius(queryset, latitude, longitude, max(radius_m, 1.0))[:k]
+    rows = list(queryset.exclude(geohash='').values_list(*NEARBY_FIELDS))
+    return _refine(rows, latitude, longitude)[:k]
+
+
+def project(lats, lons):
+    """Project to local planar meters (equirectangular around the mean latitude).
+
+    Good enough for the few kilometres a furgón covers in one trip.
+    """
+    if not lats:
+        return [], []
+    cos_lat = math.cos(math.radians(sum(lats) / len(lats)))
+    xs = [lon * METERS_PER_DEGREE * cos_lat for lon in lons]
+    ys = [lat * METERS_PER_DEGREE for lat in lats]
+    return xs, ys
+
+
+def simplify(lats, lons, tolerance_m):
+    """Douglas–Peucker simplification of a track given as parallel arrays.
+
+    Returns the sorted indices of the points to keep (always the first and
+    the last). Iterative, so long tracks do not hit the recursion limit.
+    """
+    n = len(lats)
+    if n <= 2 or tolerance_m <= 0:
+        return list(range(n))
+    xs, ys = project(lats, lons)
+    keep = [False] * n
+    keep[0] = keep[n - 1] = True
+    tol2 = tolerance_m * tolerance_m
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        x1, y1 = xs[first], ys[first]
+        dx, dy = xs[last] - x1, ys[last] - y1
+        seg2 = dx * dx + dy * dy
+        max_d2 = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = xs[i] - x1, ys[i] - y1
+            if seg2 == 0.0:
+                d2 = px * px + py * py
+            else:
+                # squared distance to the segment's supporting line
+                cross = px * dy - py * dx
+                d2 = cross * cross / seg2
+            if d2 > max_d2:
+                max_d2 = d2
+                index = i
+        if max_d2 > tol2:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [i for i in range(n) if keep[i]]
+
+
+def tolerance_for_zoom(zoom, latitude):
+    """Meters covered by one map pixel at ``zoom`` (Web Mercator tiles)."""
+    return 156543.03392 * math.cos(math.radians(latitude)) / (2 ** zoom)
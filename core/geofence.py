@@ -0,0 +1,229 @@
+"""Geofences around colegios and route stops.
+
+Every batch of fixes written by ``gps.apply_fixes`` (and the single
+``Furgon.update_location`` path) is checked against all geofences at once
+and each enter/exit becomes a ``Notificacion`` of tipo ``evento``; the rows
+of a batch are written with one ``bulk_create`` (``core.bulk.create``).
+
+* Colegios with coordinates are fences for every furgón
+  (``Colegio.radio_geocerca``); route stops (``ParadaRuta``) only for the
+  furgón of their ruta (``STOP_RADIUS_M``).
+* The fences are kept in a geohash grid index: each fence is registered in
+  the cell containing its center and the 8 neighbours, with cells at least
+  as large as the widest exit radius, so a fix is only compared with the
+  fences of its own cell.
+* Hysteresis: a furgón enters a fence within its radius but only leaves it
+  beyond ``EXIT_FACTOR`` times the radius, and an enter right after an exit
+  of the same fence (``REENTER_COOLDOWN``) is ignored, so GPS jitter around
+  the border does not flood the notifications table.
+
+The index is cached under the version stamps of colegios, rutas and stops
+(``core.versions``), so every process rebuilds it after a change made by any
+other; a per-process cache only keeps its own copy. The per-furgón state is
+read and written by every process that applies fixes, so it lives in the
+database (``EstadoFurgon.geocerca``).
+"""
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, IntegerField, Value
+from django.utils import timezone
+
+from . import bulk, geo, journal, versions
+from .models import Colegio, EstadoFurgon, Furgon, Notificacion, ParadaRuta, Ruta
+
+STOP_RADIUS_M = 80
+EXIT_FACTOR = 1.5
+REENTER_COOLDOWN = timedelta(minutes=2)
+INDEX_CACHE_KEY = 'geofence:index'
+INDEX_CACHE_TTL = 3600
+# the models the fences are read from
+INDEX_DEPENDENCIES = (Colegio, Ruta, ParadaRuta)
+# a state this old is discarded: the furgón starts outside every fence
+STATE_MAX_AGE = timedelta(hours=12)
+
+KIND_COLEGIO = 'colegio'
+KIND_PARADA = 'parada'
+
+
+def load_fences():
+    """Return the fences as ``(key, nombre, lat, lon, radius_m, furgon_id)``.
+
+    ``furgon_id`` is ``None`` for fences that apply to every furgón. Colegios
+    and stops are read with a single UNION query.
+    """
+    # Same annotations in the same order on both sides: UNION matches columns by position.
+    colegios = Colegio.objects.filter(latitude__isnull=False, longitude__isnull=False).order_by().annotate(
+        kind=Value(KIND_COLEGIO),
+        radius=F('radio_geocerca'),
+        furgon=Value(None, output_field=IntegerField()),
+    ).values_list('kind', 'pk', 'nombre', 'latitude', 'longitude', 'radius', 'furgon')
+    paradas = ParadaRuta.objects.filter(ruta__furgon__isnull=False).order_by().annotate(
+        kind=Value(KIND_PARADA),
+        radius=Value(STOP_RADIUS_M, output_field=IntegerField()),
+        furgon=F('ruta__furgon_id'),
+    ).values_list('kind', 'pk', 'nombre', 'latitude', 'longitude', 'radius', 'furgon')
+    return [
+        (f'{kind}:{pk}', nombre, lat, lon, radius, furgon_id)
+        for kind, pk, nombre, lat, lon, radius, furgon_id in colegios.union(paradas, all=True)
+    ]
+
+
+def build_index(fences):
+    """Return ``{'precision': p, 'cells': {geohash: [fence, ...]}}``."""
+    if not fences:
+        return {'precision': 1, 'cells': {}}
+    precision = min(geo.precision_for_radius(f[2], f[4] * EXIT_FACTOR) for f in fences)
+    cells = {}
+    for fence in fences:
+        for cell in geo.covering_cells(fence[2], fence[3], precision):
+            cells.setdefault(cell, []).append(fence)
+    return {'precision': precision, 'cells': cells}
+
+
+def get_index():
+    """The index of the current fences; reading the stamps is one query."""
+    key = f'{INDEX_CACHE_KEY}:{versions.fingerprint(*versions.stamps(INDEX_DEPENDENCIES))}'
+    index = cache.get(key)
+    if index is None:
+        index = build_index(load_fences())
+        cache.set(key, index, INDEX_CACHE_TTL)
+    return index
+
+
+def _new_state():
+    return {'at': None, 'inside': {}, 'exited': {}}
+
+
+def _load_state(data):
+    if not data:
+        return _new_state()
+    return {
+        'at': datetime.fromisoformat(data['at']),
+        'inside': {key: (tuple(fence), notified) for key, (fence, notified) in data['inside'].items()},
+        'exited': {key: datetime.fromisoformat(left_at) for key, left_at in data['exited'].items()},
+    }
+
+
+def _dump_state(state):
+    return {
+        'at': state['at'].isoformat(),
+        'inside': state['inside'],
+        'exited': {key: left_at.isoformat() for key, left_at in state['exited'].items()},
+    }
+
+
+def load_states(furgon_ids):
+    """``{furgon_id: state}`` of the furgones with a stored state, in one query."""
+    rows = EstadoFurgon.objects.filter(furgon_id__in=list(furgon_ids)).values_list('furgon_id', 'geocerca')
+    return {furgon_id: _load_state(data) for furgon_id, data in rows if data}
+
+
+def store_states(states):
+    """Write ``{furgon_id: state}`` in one statement."""
+    target = {'unique_fields': ['furgon']} if connection.features.supports_update_conflicts_with_target else {}
+    EstadoFurgon.objects.bulk_create(
+        [EstadoFurgon(furgon_id=furgon_id, geocerca=_dump_state(state)) for furgon_id, state in states.items()],
+        update_conflicts=True, update_fields=['geocerca'], **target,
+    )
+
+
+def _candidates(index, furgon_id, latitude, longitude):
+    fences = index['cells'].get(geo.encode(latitude, longitude, index['precision']), ())
+    return [f for f in fences if f[5] is None or f[5] == furgon_id]
+
+
+def _advance(state, fences, latitude, longitude, reported_at):
+    """Apply one fix to ``state``; returns the ``(event, fence)`` transitions.
+
+    ``state['inside']`` maps fence keys to ``(fence, notified)``: a re-enter
+    within the cooldown is tracked but silent, and so is its exit.
+    """
+    events = []
+    inside = state['inside']
+    exited = state['exited']
+    distances = geo.haversine_many(latitude, longitude, [f[2] for f in fences], [f[3] for f in fences])
+    near = {}
+    for fence, distance in zip(fences, distances):
+        near[fence[0]] = distance
+        if fence[0] in inside or distance > fence[4]:
+            continue
+        left_at = exited.get(fence[0])
+        notified = left_at is None or reported_at - left_at >= REENTER_COOLDOWN
+        inside[fence[0]] = (fence, notified)
+        if notified:
+            events.append(('enter', fence))
+    for key, (fence, notified) in list(inside.items()):
+        distance = near.get(key)
+        if distance is None:
+            # Not in this fix's cell: farther than any exit radius.
+            distance = geo.haversine(latitude, longitude, fence[2], fence[3])
+        if distance > fence[4] * EXIT_FACTOR:
+            del inside[key]
+            exited[key] = reported_at
+            if notified:
+                events.append(('exit', fence))
+    for key, left_at in list(exited.items()):
+        if key not in inside and reported_at - left_at >= REENTER_COOLDOWN:
+            del exited[key]
+    return events
+
+
+def _mensaje(event, patente, nombre, when):
+    hora = timezone.localtime(when).strftime('%H:%M') if timezone.is_aware(when) else when.strftime('%H:%M')
+    if event == 'enter':
+        return f'El furgón {patente} llegó a {nombre} a las {hora}'
+    return f'El furgón {patente} salió de {nombre} a las {hora}'
+
+
+def observe_fixes(fixes):
+    """Check a batch of fixes against every geofence; returns the created notifications.
+
+    Fixes not newer than the last one seen for the furgón are ignored, so
+    late or duplicated fixes never produce events.
+    """
+    if not fixes:
+        return []
+    index = get_index()
+    if not index['cells']:
+        return []
+    ordered = sorted(fixes, key=lambda f: (f['furgon'], f['reported_at']))
+    states = load_states({f['furgon'] for f in ordered})
+    touched = {}
+    events = []
+    for fix in ordered:
+        state = touched.get(fix['furgon']) or states.get(fix['furgon']) or _new_state()
+        if state['at'] is not None and fix['reported_at'] <= state['at']:
+            continue
+        if state['at'] is not None and fix['reported_at'] - state['at'] > STATE_MAX_AGE:
+            state = _new_state()
+        state['at'] = fix['reported_at']
+        touched[fix['furgon']] = state
+        fences = _candidates(index, fix['furgon'], fix['latitude'], fix['longitude'])
+        if not fences and not state['inside'] and not state['exited']:
+            continue
+        for event, fence in _advance(state, fences, fix['latitude'], fix['longitude'], fix['reported_at']):
+            events.append((fix['furgon'], event, fence, fix['reported_at']))
+    if touched:
+        store_states(touched)
+    if not events:
+        return []
+    patentes = dict(Furgon.objects.filter(pk__in={e[0] for e in events}).values_list('pk', 'patente'))
+    created = [
+        Notificacion(
+            tipo='evento',
+            furgon_id=furgon_id,
+            mensaje=_mensaje(event, patentes.get(furgon_id, furgon_id), fence[1], when),
+        )
+        for furgon_id, event, fence, when in events
+    ]
+    if bulk.create(Notificacion, created):
+        journal.record(Notificacion, journal.CREATE, [n.pk for n in created],
+                       current={n.pk: (n.furgon_id, None) for n in created})
+        versions.bump(Notificacion)
+    return created
+
+
+def observe_fix(furgon_id, latitude, longitude, reported_at):
+    return observe_fixes([{'furgon': furgon_id, 'latitude': latitude, 'longitude': longitude, 'reported_at': reported_at}])
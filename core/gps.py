@@ -0,0 +1,228 @@
+"""Ingestion helpers for GPS fixes reported by the furgones.
+
+``ingest_fixes`` is the bulk counterpart of ``Furgon.update_location``: it
+validates a whole list of fixes, authorizes them with a single query and
+applies them with one UPDATE per chunk instead of one ``save()`` per point.
+"""
+from datetime import datetime
+
+from django.db.models import CharField, Case, DateTimeField, FloatField, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import eta, geo, geofence, live, versions
+from .models import Furgon, PosicionFurgon
+from .permissions import in_group
+
+# Upper bound of fixes accepted in a single request.
+MAX_FIXES_PER_REQUEST = 1000
+# Fixes applied per UPDATE statement (keeps the parameter count bounded).
+UPDATE_CHUNK_SIZE = 500
+# Rows per INSERT when appending to the position history.
+HISTORY_BATCH_SIZE = 1000
+
+STATUS_APPLIED = Furgon.LOCATION_APPLIED
+STATUS_DUPLICATE = Furgon.LOCATION_DUPLICATE
+STATUS_STALE = Furgon.LOCATION_STALE
+STATUS_SUPERSEDED = 'superseded'
+STATUS_ERROR = 'error'
+
+
+def parse_reported_at(value):
+    """Parse an ISO-8601 timestamp, falling back to ``timezone.now()``.
+
+    Mirrors the single-point endpoint: a missing or unparsable value means
+    "now". Naive datetimes are interpreted in the current timezone.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            parsed = None
+    if parsed is None:
+        return timezone.now()
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_fix(item):
+    """Validate one raw fix.
+
+    Returns a ``(fix, error)`` tuple where exactly one element is ``None``.
+    """
+    if not isinstance(item, dict):
+        return None, 'cada elemento debe ser un objeto'
+    furgon = item.get('furgon')
+    lat = item.get('latitude')
+    lon = item.get('longitude')
+    if furgon is None or lat is None or lon is None:
+        return None, 'furgon, latitude y longitude son requeridos'
+    try:
+        furgon = int(furgon)
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None, 'furgon debe ser entero; latitude y longitude deben ser números'
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None, 'latitude o longitude fuera de rango'
+    fix = {
+        'furgon': furgon,
+        'latitude': lat,
+        'longitude': lon,
+        'reported_at': parse_reported_at(item.get('reported_at')),
+    }
+    return fix, None
+
+
+def _is_admin(user):
+    return bool(user and (user.is_staff or in_group(user, 'Administrador')))
+
+
+def allowed_furgon_ids(user, furgon_ids):
+    """Return the subset of ``furgon_ids`` that exist and ``user`` may update.
+
+    Returns ``(existing, allowed)`` where ``existing`` maps every furgón id
+    found to its stored ``last_reported_at``, so callers can tell "not found"
+    apart from "not authorized" and detect stale fixes. Runs a single query.
+    """
+    rows = Furgon.objects.filter(pk__in=furgon_ids).values_list('pk', 'conductor__user_id', 'last_reported_at')
+    existing = {}
+    allowed = set()
+    is_admin = _is_admin(user)
+    is_conductor = not is_admin and in_group(user, 'Conductor')
+    user_pk = getattr(user, 'pk', None)
+    for pk, owner_id, last_reported_at in rows:
+        existing[pk] = last_reported_at
+        if is_admin or (is_conductor and owner_id is not None and owner_id == user_pk):
+            allowed.add(pk)
+    return existing, allowed
+
+
+def apply_fixes(fixes, stored=None):
+    """Write the given validated fixes and return the ones applied to ``Furgon``.
+
+    Every fix is appended to ``PosicionFurgon`` (duplicates of an already
+    stored ``(furgon, reported_at)`` are ignored). Only the newest fix per
+    furgón is written to ``Furgon``; each chunk of ``UPDATE_CHUNK_SIZE``
+    furgones is a single UPDATE that touches the GPS columns (and the
+    ``geohash`` index column) only and skips
+    rows whose stored ``last_reported_at`` is not older than the fix, so a
+    late fix never overwrites a newer position.
+
+    The UPDATE does not say which rows it matched, so ``last_reported_at``
+    is read again afterwards: a fix is applied when it was newer than the
+    value stored before (``stored``, ``{furgon id: last_reported_at}``, read
+    here unless the caller has it) and is the value stored now. A concurrent
+    write of a newer fix therefore wins over this one. Only the applied
+    fixes go to the live position store and the ETAs; the whole batch is
+    checked against the geofences (``core.geofence``).
+    """
+    if fixes:
+        PosicionFurgon.objects.bulk_create(
+            [PosicionFurgon.from_fix(f['furgon'], f['latitude'], f['longitude'], f['reported_at']) for f in fixes],
+            batch_size=HISTORY_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    latest = {}
+    for fix in fixes:
+        current = latest.get(fix['furgon'])
+        if current is None or fix['reported_at'] >= current['reported_at']:
+            latest[fix['furgon']] = fix
+    if latest and stored is None:
+        stored = dict(Furgon.objects.filter(pk__in=latest).values_list('pk', 'last_reported_at'))
+    candidates = [
+        f for f in latest.values()
+        if f['furgon'] in stored and (stored[f['furgon']] is None or stored[f['furgon']] < f['reported_at'])
+    ]
+    for start in range(0, len(candidates), UPDATE_CHUNK_SIZE):
+        chunk = candidates[start:start + UPDATE_CHUNK_SIZE]
+        new_reported_at = Case(
+            *[When(pk=f['furgon'], then=Value(f['reported_at'])) for f in chunk],
+            output_field=DateTimeField(),
+        )
+        rows = Furgon.objects.filter(pk__in=[f['furgon'] for f in chunk]).filter(
+            Q(last_reported_at__isnull=True) | Q(last_reported_at__lt=new_reported_at)
+        )
+        rows.update(
+            last_latitude=Case(
+                *[When(pk=f['furgon'], then=Value(f['latitude'])) for f in chunk],
+                output_field=FloatField(),
+            ),
+            last_longitude=Case(
+                *[When(pk=f['furgon'], then=Value(f['longitude'])) for f in chunk],
+                output_field=FloatField(),
+            ),
+            last_reported_at=new_reported_at,
+            geohash=Case(
+                *[When(pk=f['furgon'], then=Value(geo.encode(f['latitude'], f['longitude']))) for f in chunk],
+                output_field=CharField(),
+            ),
+        )
+    winners = []
+    if candidates:
+        now = dict(Furgon.objects.filter(pk__in=[f['furgon'] for f in candidates])
+                   .values_list('pk', 'last_reported_at'))
+        winners = [f for f in candidates if now.get(f['furgon']) == f['reported_at']]
+    if winners:
+        versions.bump_slice(versions.POSITIONS)
+    live.record_fixes(winners)
+    eta.observe_fixes(winners)
+    geofence.observe_fixes(fixes)
+    return winners
+
+
+def ingest_fixes(items, user):
+    """Validate, authorize and apply a list of raw fixes on behalf of ``user``.
+
+    Returns one result dict per input item, in input order::
+
+        {'index': 0, 'furgon': 3, 'status': 'applied'}
+        {'index': 1, 'furgon': 3, 'status': 'superseded'}  # older than index 0
+        {'index': 2, 'furgon': 4, 'status': 'stale'}       # older than the stored fix
+        {'index': 3, 'furgon': 4, 'status': 'duplicate'}   # same reported_at as stored
+        {'index': 4, 'furgon': None, 'status': 'error', 'detail': '...'}
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        fix, error = parse_fix(item)
+        if error:
+            furgon = item.get('furgon') if isinstance(item, dict) else None
+            results.append({'index': index, 'furgon': furgon, 'status': STATUS_ERROR, 'detail': error})
+            continue
+        fix['index'] = index
+        results.append({'index': index, 'furgon': fix['furgon'], 'status': None})
+        valid.append(fix)
+
+    if valid:
+        existing, allowed = allowed_furgon_ids(user, {f['furgon'] for f in valid})
+        authorized = []
+        for fix in valid:
+            result = results[fix['index']]
+            if fix['furgon'] not in existing:
+                result.update(status=STATUS_ERROR, detail='furgón no encontrado')
+            elif fix['furgon'] not in allowed:
+                result.update(status=STATUS_ERROR, detail='No autorizado')
+            else:
+                authorized.append(fix)
+        applied = apply_fixes(authorized, stored={pk: existing[pk] for pk in allowed})
+        winners = {f['furgon']: f for f in applied}
+        for fix in authorized:
+            stored = existing[fix['furgon']]
+            winner = winners.get(fix['furgon'])
+            if winner is fix:
+                status = STATUS_APPLIED
+            elif stored is not None and fix['reported_at'] == stored:
+                status = STATUS_DUPLICATE
+            elif (stored is not None and fix['reported_at'] < stored) or winner is None:
+                # older than the stored fix, or than one written concurrently
+                status = STATUS_STALE
+            elif winner['reported_at'] == fix['reported_at']:
+                status = STATUS_DUPLICATE
+            else:
+                status = STATUS_SUPERSEDED
+            results[fix['index']]['status'] = status
+    return results
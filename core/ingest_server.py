@@ -0,0 +1,261 @@
+"""Standalone asyncio server for GPS device fixes.
+
+Devices keep a TCP connection open and write one fix per line, skipping
+the Django/DRF request stack entirely::
+
+    AUTH <jwt access token>          -> OK | ERR <motivo>
+    {"furgon": 1, "latitude": -38.73, "longitude": -72.59, "reported_at": "..."}
+    1,-38.73,-72.59,2025-11-20T08:30:00
+
+Only malformed or unauthorized lines get an answer (``ERR <n> <motivo>``).
+The token is checked again every ``reauth_interval`` seconds while the
+connection is open. The connection is closed (``ERR <motivo>``) once the
+token has expired or been revoked (``core.tokens``). The furgones the
+device may report for are reloaded then too, picking up reassignments and
+new furgones.
+
+Valid fixes are queued and written behind by a single flusher task in
+batched transactions (``gps.apply_fixes``) when ``batch_size`` fixes are
+pending or ``flush_interval`` seconds have passed. The queue is bounded:
+when the database falls behind, readers block on it and stop reading their
+sockets, which pushes back on the devices through TCP flow control. A
+write that fails because the database is unavailable (``OperationalError``,
+``InterfaceError``) is retried with exponential backoff up to
+``max_retries`` times, so a short outage only holds the fixes back. A batch
+the database rejects is written one fix at a time so that only the rejected
+fixes are dropped (a furgón deleted after its fixes were queued, for
+example). Any other error, or an outage longer than the retries, drops the
+batch: it is logged with its fixes and counted in ``stats['dropped']``.
+
+Started with ``python manage.py gps_server``.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import (
+    DataError, IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction,
+)
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import gps, tokens
+from .models import Furgon
+from .permissions import in_group
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the token of an open connection.
+REAUTH_INTERVAL = 30.0
+# First and longest wait before retrying a failed write, and the number of
+# retries before its fixes are dropped (about a minute and a half).
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+MAX_RETRIES = 8
+
+
+def authenticate_token(token):
+    """Return ``(user, allowed_furgon_ids)`` for a JWT access token.
+
+    Raises ``PermissionError`` with a message for the device when the token
+    is invalid or the user may not report positions.
+    """
+    try:
+        validated = AccessToken(token)
+    except TokenError as exc:
+        raise PermissionError('token inválido') from exc
+    if tokens.ROLES_CLAIM in validated and tokens.is_revoked(validated):
+        raise PermissionError('token revocado')
+    User = get_user_model()
+    try:
+        user = User.objects.get(**{jwt_settings.USER_ID_FIELD: validated[jwt_settings.USER_ID_CLAIM]})
+    except (User.DoesNotExist, KeyError) as exc:
+        raise PermissionError('usuario no encontrado') from exc
+    if not user.is_active:
+        raise PermissionError('usuario inactivo')
+    if user.is_staff or in_group(user, 'Administrador'):
+        allowed = set(Furgon.objects.values_list('pk', flat=True))
+    elif in_group(user, 'Conductor'):
+        allowed = set(Furgon.objects.filter(conductor__user=user).values_list('pk', flat=True))
+    else:
+        allowed = set()
+    if not allowed:
+        raise PermissionError('sin furgones autorizados')
+    return user, allowed
+
+
+def flush_batch(fixes):
+    """Write a batch of fixes in one transaction (runs in a worker thread)."""
+    close_old_connections()
+    with transaction.atomic():
+        gps.apply_fixes(fixes)
+
+
+def parse_line(line):
+    """Parse a JSON or CSV fix line into the dict expected by ``gps.parse_fix``."""
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    parts = [p.strip() for p in line.split(',')]
+    if len(parts) not in (3, 4):
+        return None
+    item = {'furgon': parts[0], 'latitude': parts[1], 'longitude': parts[2]}
+    if len(parts) == 4:
+        item['reported_at'] = parts[3]
+    return item
+
+
+class GpsIngestServer:
+    def __init__(self, batch_size=500, flush_interval=0.5, max_pending=10000,
+                 authenticate=authenticate_token, flush=flush_batch, reauth_interval=REAUTH_INTERVAL,
+                 retry_delay=RETRY_DELAY, max_retry_delay=MAX_RETRY_DELAY, max_retries=MAX_RETRIES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.reauth_interval = reauth_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = max_retries
+        self._authenticate = sync_to_async(authenticate)
+        self._flush = sync_to_async(flush)
+        self.queue = None
+        self.stats = {'received': 0, 'flushed': 0, 'rejected': 0, 'dropped': 0, 'batches': 0, 'retries': 0}
+        self._server = None
+        self._flusher = None
+
+    async def start(self, host='127.0.0.1', port=7070):
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self._flusher = asyncio.create_task(self._flush_loop())
+        self._server = await asyncio.start_server(self.handle_client, host, port)
+        return self._server
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop accepting clients and flush what is still queued."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.queue is not None:
+            await self.queue.join()
+        if self._flusher is not None:
+            self._flusher.cancel()
+
+    async def handle_client(self, reader, writer):
+        try:
+            first = await reader.readline()
+            command, _, token = first.decode(errors='replace').strip().partition(' ')
+            if command.upper() != 'AUTH' or not token:
+                writer.write(b'ERR se espera AUTH <token>\n')
+                return
+            try:
+                _, allowed = await self._authenticate(token)
+            except PermissionError as exc:
+                writer.write(f'ERR {exc}\n'.encode())
+                return
+            writer.write(b'OK\n')
+            loop = asyncio.get_running_loop()
+            checked_at = loop.time()
+            line_no = 0
+            async for raw in reader:
+                line_no += 1
+                if loop.time() - checked_at >= self.reauth_interval:
+                    try:
+                        _, allowed = await self._authenticate(token)
+                    except PermissionError as exc:
+                        writer.write(f'ERR {exc}\n'.encode())
+                        return
+                    checked_at = loop.time()
+                if not raw.strip():
+                    continue
+                item = parse_line(raw.decode(errors='replace'))
+                fix, error = gps.parse_fix(item) if item is not None else (None, 'línea inválida')
+                if fix is not None and fix['furgon'] not in allowed:
+                    fix, error = None, 'No autorizado'
+                if fix is None:
+                    self.stats['rejected'] += 1
+                    writer.write(f'ERR {line_no} {error}\n'.encode())
+                    await writer.drain()
+                    continue
+                self.stats['received'] += 1
+                # Blocks while the queue is full: backpressure to this client.
+                await self.queue.put(fix)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch):
+        delay = self.retry_delay
+        attempt = 0
+        while True:
+            try:
+                await self._flush(batch)
+            except (IntegrityError, DataError):
+                if len(batch) > 1:
+                    for fix in batch:
+                        await self._write([fix])
+                else:
+                    logger.warning('Posición GPS rechazada por la base de datos: %r', batch[0], exc_info=True)
+                    self.stats['dropped'] += 1
+                return
+            except (OperationalError, InterfaceError):
+                if attempt >= self.max_retries:
+                    logger.exception('Error escribiendo %d posiciones GPS tras %d reintentos; se descartan: %r',
+                                     len(batch), attempt, batch)
+                    break
+                logger.warning('Error escribiendo %d posiciones GPS; reintento en %.1f s', len(batch), delay,
+                               exc_info=True)
+                attempt += 1
+                self.stats['retries'] += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            except Exception:
+                logger.exception('Error inesperado escribiendo %d posiciones GPS; se descartan: %r', len(batch), batch)
+                break
+            self.stats['flushed'] += len(batch)
+            self.stats['batches'] += 1
+            return
+        self.stats['dropped'] += len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
@@ -0,0 +1,189 @@
+"""Change journal and delta sync for the mobile apps.
+
+Every create, update and delete of a synced model (``TRACKED``) appends a
+``Cambio`` row, from the model signals (``core.signals``) and from the bulk
+write paths (``core.bulk``, ``core.geofence``). The id of the last row is
+the sync token. Each row also records the audience of the object at that
+moment: the furgón whose conductor sees it and the apoderado user. This
+lets a deletion reach the clients that had the row after the row is gone.
+When an update takes an object away from an audience (an estudiante moved
+to another furgón), a ``delete`` entry with the previous audience is
+written as well.
+
+``changes_since`` turns the entries after a token into ``created``,
+``updated`` and ``deleted`` lists per resource, restricted to what the user
+may see (``core.scoping``). Changes to the user's own visibility are not
+replayed; for example, a furgón reassigned to a conductor is not. Clients
+do a full sync (no token) after logging in.
+"""
+from collections import namedtuple
+
+from django.db.models import Max, Min
+
+from . import scoping
+from .fastread import compile_encoder
+from .models import Cambio, Estudiante, Notificacion, Ruta
+from .permissions import in_group
+from .serializers import EstudianteSerializer, NotificacionSerializer, RutaSerializer
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+# Journal entries handled per sync response; clients ask again while ``more``.
+MAX_ENTRIES_PER_SYNC = 1000
+
+# ``audience``: paths to the furgón and apoderado user ids that decide who
+# sees a row, or ``None`` when every authenticated user sees it.
+Tracked = namedtuple('Tracked', 'resource model serializer_class scope audience')
+
+TRACKED = [
+    Tracked('estudiantes', Estudiante, EstudianteSerializer, scoping.estudiantes,
+            ('furgon_id', 'apoderado_user_id')),
+    Tracked('rutas', Ruta, RutaSerializer, None, None),
+    Tracked('notificaciones', Notificacion, NotificacionSerializer, scoping.notificaciones,
+            ('furgon_id', 'estudiante__apoderado_user_id')),
+]
+_BY_MODEL = {t.model: t for t in TRACKED}
+_BY_LABEL = {t.model._meta.model_name: t for t in TRACKED}
+
+
+def is_tracked(model):
+    return model in _BY_MODEL
+
+
+def audiences(model, ids):
+    """``{pk: (furgon_id, apoderado_id)}`` of the rows ``ids``, in one query."""
+    tracked = _BY_MODEL[model]
+    if tracked.audience is None or not ids:
+        return {pk: (None, None) for pk in ids}
+    rows = model._default_manager.filter(pk__in=ids).values_list('pk', *tracked.audience)
+    return {pk: (furgon, apoderado) for pk, furgon, apoderado in rows}
+
+
+def audiences_of(model, objs):
+    """Same as ``audiences`` for loaded instances; reads the attributes when
+    the audience is stored on the row itself, so no query is needed."""
+    tracked = _BY_MODEL[model]
+    if tracked.audience is not None and any('__' in path for path in tracked.audience):
+        return audiences(model, [obj.pk for obj in objs])
+    paths = tracked.audience or ()
+    return {obj.pk: tuple(getattr(obj, path) for path in paths) or (None, None) for obj in objs}
+
+
+def record(model, action, ids, before=None, current=None):
+    """Append ``action`` entries for the rows ``ids`` of ``model``.
+
+    ``before`` maps ids to their audience before an update, or at deletion
+    for ``DELETE`` (deleted rows can no longer be read). ``current`` saves
+    the ``audiences`` query when the caller already knows them.
+    """
+    if model not in _BY_MODEL or not ids:
+        return
+    label = model._meta.model_name
+    before = before or {}
+    if current is None:
+        current = before if action == DELETE else audiences(model, ids)
+    entries = []
+    for pk in ids:
+        audience = current.get(pk, (None, None))
+        previous = before.get(pk)
+        if action == UPDATE and previous is not None and previous != audience:
+            entries.append(Cambio(modelo=label, objeto_id=pk, accion=DELETE,
+                                  furgon_ref=previous[0], apoderado_ref=previous[1]))
+        entries.append(Cambio(modelo=label, objeto_id=pk, accion=action,
+                              furgon_ref=audience[0], apoderado_ref=audience[1]))
+    Cambio.objects.bulk_create(entries)
+
+
+def current_token():
+    return Cambio.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def is_expired(since):
+    """True when entries after ``since`` were already pruned (``sync_retention``)."""
+    first = Cambio.objects.aggregate(first=Min('pk'))['first']
+    return first is not None and since < first - 1
+
+
+def _encode(tracked, queryset):
+    encoder = compile_encoder(tracked.serializer_class)
+    if encoder is None:
+        return tracked.serializer_class(queryset, many=True).data
+    return encoder.encode(encoder.rows(queryset))
+
+
+def _visible(tracked, queryset, user):
+    return tracked.scope(queryset, user) if tracked.scope is not None else queryset
+
+
+def _audience_filter(user):
+    """Predicate over ``(furgon_ref, apoderado_ref)`` for the entries ``user``
+    was in the audience of."""
+    if scoping.is_admin(user):
+        return lambda furgon, apoderado: True
+    furgones = scoping.driven_furgon_ids(user)
+    apoderado = user.pk if in_group(user, 'Apoderado') else None
+    return lambda furgon, apoderado_ref: (
+        (furgon is not None and furgon in furgones)
+        or (apoderado is not None and apoderado_ref == apoderado)
+    )
+
+
+def snapshot(user):
+    """Every row ``user`` may see, as ``created``, with the current token."""
+    token = current_token()
+    data = {}
+    for tracked in TRACKED:
+        queryset = _visible(tracked, tracked.model._default_manager.order_by('pk'), user)
+        data[tracked.resource] = {'created': _encode(tracked, queryset), 'updated': [], 'deleted': []}
+    return token, False, data
+
+
+def changes_since(user, since, limit=None):
+    """``(token, more, data)`` with the changes after ``since`` visible to ``user``.
+
+    Several entries of one object collapse into its final state: it is
+    ``created`` if it did not exist at ``since``, ``updated`` otherwise, and
+    ``deleted`` if it is gone (or no longer visible) and ``user`` was in the
+    audience of one of its entries.
+    """
+    limit = limit or MAX_ENTRIES_PER_SYNC
+    entries = list(
+        Cambio.objects.filter(pk__gt=since).order_by('pk')
+        .values_list('pk', 'modelo', 'objeto_id', 'accion', 'furgon_ref', 'apoderado_ref')[:limit + 1]
+    )
+    more = len(entries) > limit
+    entries = entries[:limit]
+    token = entries[-1][0] if entries else since
+    in_audience = _audience_filter(user)
+
+    # per object: [created after since, last action, user was in the audience]
+    states = {t.resource: {} for t in TRACKED}
+    for _, label, pk, action, furgon, apoderado in entries:
+        tracked = _BY_LABEL.get(label)
+        if tracked is None:
+            continue
+        state = states[tracked.resource].setdefault(pk, [action == CREATE, action, False])
+        state[1] = action
+        if tracked.audience is None or in_audience(furgon, apoderado):
+            state[2] = True
+
+    data = {}
+    for tracked in TRACKED:
+        objects = states[tracked.resource]
+        alive = [pk for pk, (_, action, _) in objects.items() if action != DELETE]
+        rows = []
+        if alive:
+            queryset = _visible(tracked, tracked.model._default_manager.filter(pk__in=alive), user)
+            rows = _encode(tracked, queryset.order_by('pk'))
+        visible = {row['id'] for row in rows}
+        data[tracked.resource] = {
+            'created': [row for row in rows if objects[row['id']][0]],
+            'updated': [row for row in rows if not objects[row['id']][0]],
+            'deleted': sorted(
+                pk for pk, (created, _, seen) in objects.items()
+                if pk not in visible and seen and not created
+            ),
+        }
+    return token, more, data
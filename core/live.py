@@ -0,0 +1,321 @@
+"""Live fleet positions kept out of the database.
+
+The GPS write path (``Furgon.update_location`` and ``gps.apply_fixes``)
+pushes every fix here, so map views can poll ``/api/furgones/positions/``
+without querying ``Furgon``. Two stores share the same interface:
+
+* ``LocalPositionStore``: process-local, bounded LRU (the default).
+* ``SharedPositionStore``: backed by a Django cache alias, for deployments
+  with several worker processes. Enabled with ``LIVE_POSITIONS_CACHE_ALIAS``.
+
+Both stores keep a monotonically increasing ``version`` that changes on
+every accepted update and is used as the snapshot ETag.
+
+A store holds at most ``LIVE_POSITIONS_MAX_SIZE`` furgones. ``warm_up``
+raises that limit to the size of the fleet (and logs it) so the whole fleet
+fits. If the fleet outgrows it later and a store evicts a furgón, the store
+is no longer complete: ``snapshot`` and ``position`` then fill the gaps from
+``Furgon``.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_MAX_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def _initial_version():
+    # Time based so versions (and ETags) are not reused after a restart.
+    return int(time.time() * 1000)
+
+
+def _log_eviction(max_size):
+    logger.warning('La flota supera el límite de %d posiciones en vivo; las posiciones '
+                   'desalojadas se leerán de la base de datos (LIVE_POSITIONS_MAX_SIZE)', max_size)
+
+
+class LocalPositionStore:
+    """Process-local store of ``furgon_id -> (lat, lon, reported_at)``.
+
+    At most ``max_size`` furgones are kept; the least recently updated one is
+    evicted first.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._positions = OrderedDict()
+        self._version = _initial_version()
+        self._warm = False
+        self._complete = True
+
+    def update(self, furgon_id, latitude, longitude, reported_at):
+        """Store a fix unless a newer one is already cached. Returns True if stored."""
+        with self._lock:
+            current = self._positions.get(furgon_id)
+            if current is not None and current[2] is not None and reported_at <= current[2]:
+                return False
+            self._version += 1
+            self._positions[furgon_id] = (latitude, longitude, reported_at, self._version)
+            self._positions.move_to_end(furgon_id)
+            while len(self._positions) > self.max_size:
+                self._positions.popitem(last=False)
+                if self._complete:
+                    self._complete = False
+                    _log_eviction(self.max_size)
+            return True
+
+    def remove(self, furgon_id):
+        """Forget a furgón (deleted)."""
+        with self._lock:
+            if self._positions.pop(furgon_id, None) is not None:
+                self._version += 1
+
+    def get(self, furgon_id):
+        """Return ``(lat, lon, reported_at)`` for one furgón, or ``None``."""
+        pos = self._positions.get(furgon_id)
+        return pos[:3] if pos is not None else None
+
+    def version(self):
+        return self._version
+
+    def is_warm(self):
+        return self._warm
+
+    def mark_warm(self):
+        self._warm = True
+
+    def is_complete(self):
+        """False once a furgón has been evicted to stay within ``max_size``."""
+        return self._complete
+
+    def snapshot(self):
+        """Return ``(version, {furgon_id: (lat, lon, reported_at)})``."""
+        with self._lock:
+            return self._version, {pk: pos[:3] for pk, pos in self._positions.items()}
+
+    def changed_since(self, version):
+        """Return ``(version, {furgon_id: (lat, lon, reported_at)})`` updated after ``version``."""
+        with self._lock:
+            changed = {pk: pos[:3] for pk, pos in self._positions.items() if pos[3] > version}
+            return self._version, changed
+
+    def clear(self):
+        with self._lock:
+            self._positions.clear()
+            self._version += 1
+            self._warm = False
+            self._complete = True
+
+
+class SharedPositionStore:
+    """Store backed by a Django cache, shared by every worker process.
+
+    Each furgón is a separate key, so concurrent writers for different
+    furgones never overwrite each other; ``version`` uses the cache's atomic
+    ``incr``. The furgones in the store are listed in numbered slots: the
+    first update of a furgón claims its membership with ``add`` and its slot
+    with ``incr``, both atomic, so concurrent writers never drop each
+    other's furgones. Furgones beyond ``max_size`` get no slot (the store is
+    then incomplete); ``max_size`` is shared too, once ``warm_up`` raises it.
+    """
+
+    PREFIX = 'live_positions'
+
+    def __init__(self, cache, max_size=DEFAULT_MAX_SIZE):
+        self.cache = cache
+        self._max_size = max_size
+
+    @property
+    def max_size(self):
+        return self.cache.get(self._key('max_size')) or self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        self.cache.set(self._key('max_size'), value, timeout=None)
+
+    def _key(self, name):
+        return f'{self.PREFIX}:{name}'
+
+    def _bump(self):
+        key = self._key('version')
+        self.cache.add(key, _initial_version(), timeout=None)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(); start a new series.
+            version = _initial_version()
+            self.cache.set(key, version, timeout=None)
+            return version
+
+    def _join(self, furgon_id):
+        member = self._key(f'member:{furgon_id}')
+        if not self.cache.add(member, 0, timeout=None):
+            return
+        self.cache.add(self._key('slots'), 0, timeout=None)
+        slot = self.cache.incr(self._key('slots'))
+        if slot > self.max_size:
+            # not a member: tried again on its next update
+            self.cache.delete(member)
+            if self.cache.add(self._key('evicted'), True, timeout=None):
+                _log_eviction(self.max_size)
+            return
+        self.cache.set_many({self._key(f'slot:{slot}'): furgon_id, member: slot}, timeout=None)
+
+    def _ids(self):
+        sizes = self.cache.get_many([self._key('slots'), self._key('max_size')])
+        count = min(sizes.get(self._key('slots'), 0), sizes.get(self._key('max_size')) or self._max_size)
+        slots = [self._key(f'slot:{n}') for n in range(1, count + 1)]
+        found = self.cache.get_many(slots)
+        return [found[key] for key in slots if key in found]
+
+    def update(self, furgon_id, latitude, longitude, reported_at):
+        key = self._key(f'pos:{furgon_id}')
+        current = self.cache.get(key)
+        if current is not None and current[2] is not None and reported_at <= current[2]:
+            return False
+        version = self._bump()
+        self.cache.set(key, (latitude, longitude, reported_at, version), timeout=None)
+        self._join(furgon_id)
+        return True
+
+    def remove(self, furgon_id):
+        """Forget a furgón (deleted)."""
+        member = self._key(f'member:{furgon_id}')
+        slot = self.cache.get(member)
+        self.cache.delete_many([member, self._key(f'pos:{furgon_id}')] + ([self._key(f'slot:{slot}')] if slot else []))
+        self._bump()
+
+    def get(self, furgon_id):
+        pos = self.cache.get(self._key(f'pos:{furgon_id}'))
+        return pos[:3] if pos is not None else None
+
+    def version(self):
+        return self.cache.get(self._key('version')) or 0
+
+    def is_warm(self):
+        return bool(self.cache.get(self._key('warm')))
+
+    def mark_warm(self):
+        self.cache.set(self._key('warm'), True, timeout=None)
+
+    def is_complete(self):
+        return not self.cache.get(self._key('evicted'))
+
+    def _positions(self):
+        ids = self._ids()
+        found = self.cache.get_many([self._key(f'pos:{pk}') for pk in ids])
+        positions = {}
+        for pk in ids:
+            pos = found.get(self._key(f'pos:{pk}'))
+            if pos is not None:
+                positions[pk] = pos
+        return positions
+
+    def snapshot(self):
+        version = self.version()
+        return version, {pk: pos[:3] for pk, pos in self._positions().items()}
+
+    def changed_since(self, version):
+        current = self.version()
+        if current <= version:
+            return current, {}
+        changed = {pk: pos[:3] for pk, pos in self._positions().items() if pos[3] > version}
+        return current, changed
+
+    def clear(self):
+        slots = min(self.cache.get(self._key('slots')) or 0, self.max_size)
+        ids = self._ids()
+        self.cache.delete_many(
+            [self._key(f'{name}:{pk}') for pk in ids for name in ('pos', 'member')]
+            + [self._key(f'slot:{n}') for n in range(1, slots + 1)]
+            + [self._key(name) for name in ('slots', 'max_size', 'warm', 'evicted')]
+        )
+        self._bump()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def positions():
+    """Return the configured position store (created on first use)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                max_size = getattr(settings, 'LIVE_POSITIONS_MAX_SIZE', DEFAULT_MAX_SIZE)
+                alias = getattr(settings, 'LIVE_POSITIONS_CACHE_ALIAS', None)
+                if alias:
+                    from django.core.cache import caches
+                    _store = SharedPositionStore(caches[alias], max_size=max_size)
+                else:
+                    _store = LocalPositionStore(max_size=max_size)
+    return _store
+
+
+def record_fixes(fixes):
+    """Push validated fixes (dicts as produced by ``gps.parse_fix``) to the store."""
+    store = positions()
+    for fix in fixes:
+        store.update(fix['furgon'], fix['latitude'], fix['longitude'], fix['reported_at'])
+
+
+def _stored_positions(**filters):
+    from .models import Furgon
+    rows = (
+        Furgon.objects.filter(last_reported_at__isnull=False, **filters)
+        .order_by('last_reported_at')
+        .values_list('pk', 'last_latitude', 'last_longitude', 'last_reported_at')
+    )
+    return {pk: (lat, lon, reported_at) for pk, lat, lon, reported_at in rows}
+
+
+def warm_up():
+    """Load the last known positions from ``Furgon`` once per store, after
+    raising the store's ``max_size`` to the size of the fleet if needed."""
+    store = positions()
+    if store.is_warm():
+        return
+    from .models import Furgon
+    fleet = Furgon.objects.count()
+    if fleet > store.max_size:
+        logger.warning('LIVE_POSITIONS_MAX_SIZE=%d es menor que la flota (%d furgones); se usa %d',
+                       store.max_size, fleet, fleet)
+        store.max_size = fleet
+    for pk, (lat, lon, reported_at) in _stored_positions().items():
+        store.update(pk, lat, lon, reported_at)
+    store.mark_warm()
+
+
+def snapshot():
+    """Return ``(version, positions)`` with the store warmed on first use.
+
+    Read from ``Furgon`` (newer live fixes win) when the store is incomplete.
+    """
+    warm_up()
+    store = positions()
+    version, current = store.snapshot()
+    if store.is_complete():
+        return version, current
+    stored = _stored_positions()
+    for pk, pos in current.items():
+        if pk not in stored or stored[pk][2] is None or (pos[2] is not None and pos[2] > stored[pk][2]):
+            stored[pk] = pos
+    return version, stored
+
+
+def position(furgon_id):
+    """Return ``(lat, lon, reported_at)`` for one furgón, or ``None``; read
+    from ``Furgon`` when the store is incomplete and does not have it."""
+    warm_up()
+    store = positions()
+    pos = store.get(furgon_id)
+    if pos is None and not store.is_complete():
+        pos = _stored_positions(pk=furgon_id).get(furgon_id)
+    return pos
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import canonical
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el rut y la patente canónicos (core.canonical) de conductores, estudiantes y furgones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=canonical.BACKFILL_BATCH_SIZE,
+                            help='Filas leídas y actualizadas por lote')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size debe ser mayor que 0')
+        with transaction.atomic():
+            changed = canonical.backfill(batch_size=batch_size)
+        for label, rows in changed.items():
+            self.stdout.write(self.style.SUCCESS(f'{label}: {rows} filas actualizadas'))
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import PosicionFurgon, history_bucket
+
+DELETE_CHUNK_SIZE = 500
+
+
+def bucket_cutoff(days, granularity, now=None):
+    """Return the first bucket that must be kept when keeping ``days`` days.
+
+    With ``month`` granularity the cutoff is aligned to the first day of the
+    month, so whole months are dropped/compacted at once.
+    """
+    now = now or timezone.now()
+    cutoff = history_bucket(now - timedelta(days=days))
+    if granularity == 'month':
+        cutoff = cutoff // 100 * 100 + 1
+    return cutoff
+
+
+def downsample_ids(rows, interval):
+    """Return the ids to delete so that at most one point per furgón and
+    ``interval`` seconds remains. ``rows`` must be ordered by furgon, reported_at.
+    """
+    to_delete = []
+    last_key = None
+    for pk, furgon_id, reported_at in rows:
+        key = (furgon_id, int(reported_at.timestamp()) // interval)
+        if key == last_key:
+            to_delete.append(pk)
+        last_key = key
+    return to_delete
+
+
+class Command(BaseCommand):
+    help = 'Elimina o compacta el historial GPS antiguo por bucket (día/mes) sin recorrer la tabla completa'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=90, help='Días de historial a conservar (0 = sin límite)')
+        parser.add_argument(
+            '--downsample-after-days',
+            type=int,
+            default=0,
+            help='Compactar buckets más antiguos que N días (0 = no compactar)',
+        )
+        parser.add_argument('--interval', type=int, default=60, help='Segundos entre puntos al compactar')
+        parser.add_argument('--granularity', choices=['day', 'month'], default='day')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        keep_days = options['keep_days']
+        downsample_days = options['downsample_after_days']
+        interval = options['interval']
+        granularity = options['granularity']
+        dry_run = options['dry_run']
+        if interval <= 0:
+            raise CommandError('--interval debe ser mayor que 0')
+        if keep_days and downsample_days and downsample_days >= keep_days:
+            raise CommandError('--downsample-after-days debe ser menor que --keep-days')
+
+        keep_from = bucket_cutoff(keep_days, granularity) if keep_days else None
+        if keep_from is not None:
+            old = PosicionFurgon.objects.filter(bucket__lt=keep_from)
+            if dry_run:
+                self.stdout.write(f'Se eliminarían {old.count()} posiciones anteriores a {keep_from}')
+            else:
+                deleted, _ = old.delete()
+                self.stdout.write(self.style.SUCCESS(f'Eliminadas {deleted} posiciones anteriores a {keep_from}'))
+
+        if downsample_days:
+            compact_before = bucket_cutoff(downsample_days, granularity)
+            buckets = PosicionFurgon.objects.filter(bucket__lt=compact_before)
+            if keep_from is not None:
+                buckets = buckets.filter(bucket__gte=keep_from)
+            total = 0
+            for bucket in buckets.order_by('bucket').values_list('bucket', flat=True).distinct():
+                rows = (
+                    PosicionFurgon.objects.filter(bucket=bucket)
+                    .order_by('furgon_id', 'reported_at')
+                    .values_list('pk', 'furgon_id', 'reported_at')
+                )
+                ids = downsample_ids(rows.iterator(), interval)
+                total += len(ids)
+                if not dry_run:
+                    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+                        PosicionFurgon.objects.filter(pk__in=ids[start:start + DELETE_CHUNK_SIZE]).delete()
+            verb = 'Se eliminarían' if dry_run else 'Compactadas:'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {total} posiciones redundantes (intervalo {interval}s)'))
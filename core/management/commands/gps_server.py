@@ -0,0 +1,38 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.ingest_server import GpsIngestServer
+
+
+class Command(BaseCommand):
+    help = 'Inicia el servidor asyncio de ingesta GPS (protocolo de líneas JSON/CSV sobre TCP)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=7070)
+        parser.add_argument('--batch-size', type=int, default=500, help='Posiciones por transacción')
+        parser.add_argument('--flush-interval', type=float, default=0.5, help='Segundos máximos antes de escribir')
+        parser.add_argument('--max-pending', type=int, default=10000, help='Posiciones en cola antes de frenar a los clientes')
+
+    def handle(self, *args, **options):
+        server = GpsIngestServer(
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            max_pending=options['max_pending'],
+        )
+
+        async def run():
+            await server.start(options['host'], options['port'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Servidor GPS escuchando en {options['host']}:{server.port}"
+            ))
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await server.stop()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            self.stdout.write(f'Detenido. Estadísticas: {server.stats}')
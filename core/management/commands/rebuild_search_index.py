@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda (core.search) de colegios, conductores, furgones, estudiantes y pagos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.WRITE_BATCH_SIZE,
+                            help='Filas leídas e indexadas por lote')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size debe ser mayor que 0')
+        with transaction.atomic():
+            counts = search.rebuild(batch_size=batch_size)
+        for label, rows in counts.items():
+            self.stdout.write(self.style.SUCCESS(f'{label}: {rows} filas indexadas'))
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Cambio
+
+DELETE_CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Elimina las entradas antiguas del registro de cambios usado por /api/sync/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30, help='Días de cambios a conservar')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        keep_days = options['keep_days']
+        if keep_days <= 0:
+            raise CommandError('--keep-days debe ser mayor que 0')
+        cutoff = timezone.now() - timedelta(days=keep_days)
+        # ids grow with time: drop everything up to the newest old entry, but
+        # always keep the last entry so expired tokens can be detected
+        last_old = Cambio.objects.filter(creado_at__lt=cutoff).aggregate(last=Max('pk'))['last']
+        last = Cambio.objects.aggregate(last=Max('pk'))['last']
+        if last_old is None:
+            self.stdout.write('No hay cambios anteriores al límite')
+            return
+        upto = min(last_old, last - 1)
+        old = Cambio.objects.filter(pk__lte=upto)
+        if options['dry_run']:
+            self.stdout.write(f'Se eliminarían {old.count()} cambios anteriores a {cutoff:%Y-%m-%d}')
+            return
+        deleted = 0
+        while True:
+            ids = list(old.values_list('pk', flat=True)[:DELETE_CHUNK_SIZE])
+            if not ids:
+                break
+            deleted += Cambio.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Eliminados {deleted} cambios anteriores a {cutoff:%Y-%m-%d}'))
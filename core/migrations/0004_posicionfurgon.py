@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 15:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ruta_localidades'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicionFurgon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('reported_at', models.DateTimeField()),
+                ('bucket', models.PositiveIntegerField(help_text='Día del reporte (YYYYMMDD)')),
+                ('furgon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posiciones', to='core.furgon')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='posicionfurgon',
+            index=models.Index(fields=['bucket', 'furgon'], name='core_posicion_bucket_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posicionfurgon',
+            unique_together={('furgon', 'reported_at')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from core import geo
+
+    Furgon = apps.get_model('core', 'Furgon')
+    rows = Furgon.objects.filter(last_latitude__isnull=False, last_longitude__isnull=False)
+    for furgon in rows.only('pk', 'last_latitude', 'last_longitude'):
+        Furgon.objects.filter(pk=furgon.pk).update(geohash=geo.encode(furgon.last_latitude, furgon.last_longitude))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_posicionfurgon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='furgon',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
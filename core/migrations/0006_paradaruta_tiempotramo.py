@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-18 15:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_furgon_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TiempoTramo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden_desde', models.PositiveIntegerField()),
+                ('segundos_promedio', models.FloatField()),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('actualizado_at', models.DateTimeField(auto_now=True)),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiempos_tramo', to='core.ruta')),
+            ],
+            options={
+                'unique_together': {('ruta', 'orden_desde')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ParadaRuta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.PositiveIntegerField()),
+                ('nombre', models.CharField(max_length=255)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paradas', to='core.ruta')),
+            ],
+            options={
+                'ordering': ['ruta', 'orden'],
+                'unique_together': {('ruta', 'orden')},
+            },
+        ),
+    ]
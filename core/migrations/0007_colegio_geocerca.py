@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_paradaruta_tiempotramo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='colegio',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='colegio',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='colegio',
+            name='radio_geocerca',
+            field=models.PositiveIntegerField(default=150),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_colegio_geocerca'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['furgon', '-fecha'], name='core_asistencia_furgon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estudiante',
+            index=models.Index(fields=['apoderado_user', 'nombre'], name='core_estudiante_apod_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estudiante',
+            index=models.Index(fields=['furgon', 'nombre'], name='core_estudiante_furgon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['furgon', '-creado_at'], name='core_notif_furgon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['estudiante', '-creado_at'], name='core_notif_estudiante_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['estudiante', '-fecha'], name='core_pago_estudiante_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_role_scope_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['-fecha', 'id'], name='core_asistencia_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['-creado_at', '-id'], name='core_notif_creado_idx'),
+        ),
+    ]
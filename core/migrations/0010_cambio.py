@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('accion', models.CharField(choices=[('create', 'Creado'), ('update', 'Modificado'), ('delete', 'Eliminado')], max_length=10)),
+                ('furgon_ref', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('apoderado_ref', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('creado_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_cambio'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estudiante',
+            index=models.Index(fields=['nombre', 'id'], name='core_estudiante_nombre_idx'),
+        ),
+    ]
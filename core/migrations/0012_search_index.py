@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+def build_index(apps, schema_editor):
+    from core import search
+    search.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_estudiante_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('termino', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrigramaBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('termino', models.CharField(max_length=64)),
+            ],
+            options={
+                'unique_together': {('trigrama', 'termino')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='terminobusqueda',
+            index=models.Index(fields=['modelo', 'termino', 'objeto_id'], name='core_termino_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='terminobusqueda',
+            index=models.Index(fields=['modelo', 'objeto_id', 'termino'], name='core_termino_objeto_idx'),
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+def backfill_canonical(apps, schema_editor):
+    from core import canonical
+    canonical.backfill(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conductor',
+            name='rut_canonico',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='estudiante',
+            name='rut_canonico',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='furgon',
+            name='patente_canonica',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=50),
+        ),
+        migrations.RunPython(backfill_canonical, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_canonical_shadow_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sello',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('valor', models.FloatField()),
+            ],
+        ),
+    ]
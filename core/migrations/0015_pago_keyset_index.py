@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sello'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['-fecha', '-id'], name='core_pago_fecha_idx'),
+        ),
+    ]
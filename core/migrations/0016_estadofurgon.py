@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 19:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_pago_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoFurgon',
+            fields=[
+                ('furgon', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado', serialize=False, to='core.furgon')),
+                ('geocerca', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_estadofurgon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadofurgon',
+            name='eta',
+            field=models.JSONField(default=dict),
+        ),
+    ]
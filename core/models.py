@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.urls import reverse
 
+from . import canonical, geo, live, versions
+
 
 class Colegio(models.Model):
     nombre = models.CharField(max_length=255)
@@ -9,6 +11,10 @@ class Colegio(models.Model):
     telefono = models.CharField(max_length=50, blank=True)
     horario_entrada = models.TimeField(null=True, blank=True)
     horario_salida = models.TimeField(null=True, blank=True)
+    # Geocerca: centro y radio (metros) para las notificaciones de llegada/salida
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    radio_geocerca = models.PositiveIntegerField(default=150)
 
     def __str__(self):
         return self.nombre
@@ -22,6 +28,8 @@ class Colegio(models.Model):
 
 class Conductor(models.Model):
     rut = models.CharField(max_length=20, unique=True)
+    # rut sin puntos ni guion (core.canonical), para búsquedas por prefijo
+    rut_canonico = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     nombre = models.CharField(max_length=255)
     telefono = models.CharField(max_length=50, blank=True)
     numero_licencia = models.CharField(max_length=100, blank=True)
@@ -38,6 +46,10 @@ class Conductor(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.rut})"
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = canonical.fill(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('frontend:conductor_edit', args=[self.pk])
 
@@ -53,6 +65,8 @@ class Furgon(models.Model):
     ]
 
     patente = models.CharField(max_length=50, unique=True)
+    # patente sin guiones ni espacios, en mayúsculas (core.canonical)
+    patente_canonica = models.CharField(max_length=50, blank=True, db_index=True, editable=False)
     modelo = models.CharField(max_length=100, blank=True)
     anio = models.PositiveIntegerField(null=True, blank=True)
     capacidad_maxima = models.PositiveIntegerField(default=20)
@@ -66,10 +80,23 @@ class Furgon(models.Model):
     last_longitude = models.FloatField(null=True, blank=True)
     last_reported_at = models.DateTimeField(null=True, blank=True)
     estado_actual = models.CharField(max_length=50, blank=True)
+    # Celda geohash de la última posición (índice para búsquedas por cercanía)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
 
     def __str__(self):
         return self.patente
 
+    def save(self, *args, **kwargs):
+        if self.last_latitude is not None and self.last_longitude is not None:
+            self.geohash = geo.encode(self.last_latitude, self.last_longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'last_latitude', 'last_longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        kwargs['update_fields'] = canonical.fill(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('frontend:furgon_edit', args=[self.pk])
 
@@ -84,20 +111,100 @@ class Furgon(models.Model):
     def verificar_capacidad_disponible(self):
         return self.capacidad_actual < self.capacidad_maxima
 
+    LOCATION_APPLIED = 'applied'
+    LOCATION_DUPLICATE = 'duplicate'
+    LOCATION_STALE = 'stale'
+
     def update_location(self, latitude: float, longitude: float, reported_at=None):
-        """Actualiza la ubicación del furgón (no hace integración con GPS, solo guarda los datos)."""
-        self.last_latitude = latitude
-        self.last_longitude = longitude
-        if reported_at:
-            self.last_reported_at = reported_at
+        """Actualiza la ubicación del furgón (no hace integración con GPS, solo guarda los datos).
+
+        The write is a single conditional UPDATE of the GPS columns, applied
+        only when ``reported_at`` is newer than the stored one, so late or
+        repeated fixes never overwrite a newer position nor other columns.
+        Returns ``LOCATION_APPLIED``, ``LOCATION_DUPLICATE`` or ``LOCATION_STALE``.
+        """
         from django.utils import timezone
-        if not self.last_reported_at:
-            self.last_reported_at = timezone.now()
-        self.save()
+        if not reported_at:
+            reported_at = timezone.now()
+        PosicionFurgon.objects.bulk_create(
+            [PosicionFurgon.from_fix(self.pk, latitude, longitude, reported_at)],
+            ignore_conflicts=True,
+        )
+        updated = (
+            Furgon.objects.filter(pk=self.pk)
+            .filter(models.Q(last_reported_at__isnull=True) | models.Q(last_reported_at__lt=reported_at))
+            .update(
+                last_latitude=latitude,
+                last_longitude=longitude,
+                last_reported_at=reported_at,
+                geohash=geo.encode(latitude, longitude),
+            )
+        )
+        if updated:
+            self.last_latitude = latitude
+            self.last_longitude = longitude
+            self.last_reported_at = reported_at
+            self.geohash = geo.encode(latitude, longitude)
+            live.positions().update(self.pk, latitude, longitude, reported_at)
+            versions.bump_slice(versions.POSITIONS)
+            from . import eta, geofence
+            eta.observe_fix(self.pk, latitude, longitude, reported_at)
+            geofence.observe_fix(self.pk, latitude, longitude, reported_at)
+            return self.LOCATION_APPLIED
+        self.refresh_from_db(fields=['last_latitude', 'last_longitude', 'last_reported_at'])
+        if self.last_reported_at == reported_at:
+            return self.LOCATION_DUPLICATE
+        return self.LOCATION_STALE
+
+
+def history_bucket(reported_at):
+    """Return the day bucket (``YYYYMMDD`` as int) for a GPS timestamp.
+
+    Buckets are computed in the project timezone so a school day never spans
+    two buckets. Month ranges are ``YYYYMM01..YYYYMM31``.
+    """
+    from django.utils import timezone
+    if timezone.is_aware(reported_at):
+        reported_at = timezone.localtime(reported_at)
+    return reported_at.year * 10000 + reported_at.month * 100 + reported_at.day
+
+
+class PosicionFurgon(models.Model):
+    """Append-only GPS history of a furgón.
+
+    Rows are only inserted (in bulk) and removed by bucket with the
+    ``gps_retention`` command; they are never updated.
+    """
+    furgon = models.ForeignKey(Furgon, on_delete=models.CASCADE, related_name='posiciones')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    reported_at = models.DateTimeField()
+    bucket = models.PositiveIntegerField(help_text='Día del reporte (YYYYMMDD)')
+
+    class Meta:
+        unique_together = ('furgon', 'reported_at')
+        indexes = [
+            models.Index(fields=['bucket', 'furgon'], name='core_posicion_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.furgon_id} @ {self.reported_at}"
+
+    @classmethod
+    def from_fix(cls, furgon_id, latitude, longitude, reported_at):
+        return cls(
+            furgon_id=furgon_id,
+            latitude=latitude,
+            longitude=longitude,
+            reported_at=reported_at,
+            bucket=history_bucket(reported_at),
+        )
 
 
 class Estudiante(models.Model):
     rut = models.CharField(max_length=20, unique=True)
+    # rut sin puntos ni guion (core.canonical), para búsquedas por prefijo
+    rut_canonico = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     nombre = models.CharField(max_length=255)
     fecha_nacimiento = models.DateField(null=True, blank=True)
     direccion = models.CharField(max_length=255, blank=True)
@@ -119,9 +226,22 @@ class Estudiante(models.Model):
         related_name='apoderado_estudiantes',
     )
 
+    class Meta:
+        indexes = [
+            # role-scoped lists (core.scoping) ordered by nombre
+            models.Index(fields=['apoderado_user', 'nombre'], name='core_estudiante_apod_idx'),
+            models.Index(fields=['furgon', 'nombre'], name='core_estudiante_furgon_idx'),
+            # keyset pages of the frontend list (frontend.pagination)
+            models.Index(fields=['nombre', 'id'], name='core_estudiante_nombre_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} ({self.rut})"
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = canonical.fill(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('frontend:estudiante_edit', args=[self.pk])
 
@@ -154,6 +274,15 @@ class Notificacion(models.Model):
     creado_at = models.DateTimeField(auto_now_add=True)
     leido = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # role-scoped lists (core.scoping), newest first
+            models.Index(fields=['furgon', '-creado_at'], name='core_notif_furgon_idx'),
+            models.Index(fields=['estudiante', '-creado_at'], name='core_notif_estudiante_idx'),
+            # keyset pagination order (core.pagination)
+            models.Index(fields=['-creado_at', '-id'], name='core_notif_creado_idx'),
+        ]
+
     def __str__(self):
         target = self.estudiante.nombre if self.estudiante else (self.furgon.patente if self.furgon else 'General')
         return f"[{self.get_tipo_display()}] {target} - {self.mensaje[:40]}"
@@ -175,6 +304,12 @@ class Pago(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     referencia = models.CharField(max_length=255, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['estudiante', '-fecha'], name='core_pago_estudiante_idx'),
+            models.Index(fields=['-fecha', '-id'], name='core_pago_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Pago {self.pk} - {self.estudiante.nombre} - {self.monto} ({self.estado})"
 
@@ -199,6 +334,11 @@ class Asistencia(models.Model):
 
     class Meta:
         unique_together = ('estudiante', 'fecha')
+        indexes = [
+            models.Index(fields=['furgon', '-fecha'], name='core_asistencia_furgon_idx'),
+            # keyset pagination order (core.pagination)
+            models.Index(fields=['-fecha', 'id'], name='core_asistencia_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Asistencia {self.estudiante.nombre} - {self.fecha} - {self.estado}"
@@ -230,3 +370,117 @@ class Ruta(models.Model):
 
     def get_edit_url(self):
         return self.get_absolute_url()
+
+
+class ParadaRuta(models.Model):
+    """Parada ordenada de una ruta, con su ubicación."""
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name='paradas')
+    orden = models.PositiveIntegerField()
+    nombre = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        ordering = ['ruta', 'orden']
+        unique_together = ('ruta', 'orden')
+
+    def __str__(self):
+        return f"{self.ruta_id}#{self.orden} {self.nombre}"
+
+
+class TiempoTramo(models.Model):
+    """Tiempo de viaje histórico entre una parada y la siguiente de la misma ruta.
+
+    ``segundos_promedio`` is an exponentially weighted moving average updated
+    by ``core.eta`` each time a furgón completes the segment.
+    """
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name='tiempos_tramo')
+    orden_desde = models.PositiveIntegerField()
+    segundos_promedio = models.FloatField()
+    muestras = models.PositiveIntegerField(default=0)
+    actualizado_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('ruta', 'orden_desde')
+
+    def __str__(self):
+        return f"{self.ruta_id}#{self.orden_desde} {self.segundos_promedio:.0f}s"
+
+
+class EstadoFurgon(models.Model):
+    """State derived from the GPS fixes of a furgón, shared by every process
+    that applies fixes (web workers, ``gps_server``).
+
+    ``geocerca`` holds the geofences the furgón is in and the ones it left
+    recently (``core.geofence``); ``eta`` the last stop of its ruta it
+    visited (``core.eta``).
+    """
+    furgon = models.OneToOneField(Furgon, on_delete=models.CASCADE, primary_key=True, related_name='estado')
+    geocerca = models.JSONField(default=dict)
+    eta = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.furgon_id}"
+
+
+class Cambio(models.Model):
+    """Change journal entry of a synced model (see ``core.journal``).
+
+    Rows are append-only; ``id`` is the token handed to sync clients.
+    ``furgon_ref`` and ``apoderado_ref`` record who could see the object when
+    the change happened (plain ids, so they outlive the rows they point to).
+    """
+    ACCIONES = [
+        ('create', 'Creado'),
+        ('update', 'Modificado'),
+        ('delete', 'Eliminado'),
+    ]
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.PositiveBigIntegerField()
+    accion = models.CharField(max_length=10, choices=ACCIONES)
+    furgon_ref = models.PositiveBigIntegerField(null=True, blank=True)
+    apoderado_ref = models.PositiveBigIntegerField(null=True, blank=True)
+    creado_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.accion} {self.modelo}:{self.objeto_id}"
+
+
+class TerminoBusqueda(models.Model):
+    """Accent-folded word of a searchable field (see ``core.search``),
+    matched by prefix."""
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.PositiveBigIntegerField()
+    termino = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'termino', 'objeto_id'], name='core_termino_idx'),
+            models.Index(fields=['modelo', 'objeto_id', 'termino'], name='core_termino_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo}:{self.objeto_id} {self.termino}"
+
+
+class TrigramaBusqueda(models.Model):
+    """Trigram of a word of ``TerminoBusqueda`` (see ``core.search``), for
+    substring matches. Shared by every object with that word."""
+    trigrama = models.CharField(max_length=3)
+    termino = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('trigrama', 'termino')
+
+    def __str__(self):
+        return f"{self.trigrama} {self.termino}"
+
+
+class Sello(models.Model):
+    """Named timestamp shared by every process (see ``core.versions``): the
+    version stamps of the models and the token revocations."""
+    nombre = models.CharField(max_length=100, unique=True)
+    valor = models.FloatField()
+
+    def __str__(self):
+        return f"{self.nombre} {self.valor}"
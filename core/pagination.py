@@ -0,0 +1,228 @@
+"""Keyset (cursor) pagination for the REST API (``KeysetPagination``); the
+cursor helpers are shared with the frontend lists (``frontend.pagination``).
+
+Pages are read with ``WHERE (ordering columns) > (last row seen) ... LIMIT
+page_size + 1``, so the cost of a page does not grow with its depth and no
+``COUNT(*)`` is issued. The ordering comes from the view's
+``keyset_ordering`` and must end in a unique column (usually ``id``) so the
+position of every row is well defined; mixed directions such as
+``('-creado_at', 'id')`` are supported. NULLs of a nullable column sort
+after every value, whatever its direction (``seek``).
+
+Responses have the same shape as DRF's ``CursorPagination``::
+
+    {"next": <url or null>, "previous": <url or null>, "results": [...]}
+"""
+import base64
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _json_default(value):
+    # Full precision: DjangoJSONEncoder truncates microseconds, which would
+    # make a cursor point between rows.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} no serializable en un cursor')
+
+
+def encode_cursor(values, reverse):
+    """Opaque token for the position ``values`` (one per ordering column)."""
+    payload = json.dumps({'v': values, 'r': int(reverse)}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(encoded, model, ordering):
+    """``(values, reverse)`` of a token made by ``encode_cursor``. Raises
+    ``ValueError`` if it is malformed or does not match ``ordering``."""
+    try:
+        padded = encoded + '=' * (-len(encoded) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        raw = payload['v']
+        if len(raw) != len(ordering):
+            raise ValueError
+        values = [
+            model._meta.get_field(name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, raw)
+        ]
+        return values, bool(payload.get('r'))
+    except Exception as exc:
+        raise ValueError('invalid cursor') from exc
+
+
+def invert(ordering):
+    return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+
+def nullable(model, ordering):
+    """Names of the columns of ``ordering`` that may be NULL."""
+    names = (name.lstrip('-') for name in ordering)
+    return {name for name in names if model._meta.get_field(name).null}
+
+
+def order_by(ordering, nullable=(), nulls_last=True):
+    """``order_by()`` arguments for ``ordering`` with the NULLs of the
+    ``nullable`` columns placed explicitly (last, or first when reading
+    backwards), the same on every database."""
+    expressions = []
+    for name in ordering:
+        field = name.lstrip('-')
+        if field not in nullable:
+            expressions.append(name)
+            continue
+        column = F(field).desc if name.startswith('-') else F(field).asc
+        expressions.append(column(nulls_last=True) if nulls_last else column(nulls_first=True))
+    return expressions
+
+
+def after(ordering, values, nullable=(), nulls_last=True):
+    """``Q`` for the rows strictly after ``values`` in ``ordering``.
+
+    ``(a, b) > (x, y)`` is written as ``a >= x AND (a > x OR (a = x AND
+    b > y))``: the redundant leading bound lets the database seek the
+    index instead of scanning it from the start. A NULL in a ``nullable``
+    column comes after every value when ``nulls_last``, before otherwise.
+    """
+    terms = []
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        op = 'lt' if name.startswith('-') else 'gt'
+        is_null = Q(**{f'{field}__isnull': True})
+        if field not in nullable:
+            beyond = Q(**{f'{field}__{op}': value})
+        elif value is None:
+            beyond = None if nulls_last else Q(**{f'{field}__isnull': False})
+        else:
+            beyond = Q(**{f'{field}__{op}': value})
+            if nulls_last:
+                beyond |= is_null
+        if beyond is not None:
+            terms.append(equal & beyond)
+        equal &= is_null if value is None else Q(**{field: value})
+    if not terms:
+        return Q(pk__in=[])
+    q = Q()
+    for term in terms:
+        q |= term
+    first, value = ordering[0].lstrip('-'), values[0]
+    if value is None:
+        bound = Q(**{f'{first}__isnull': True}) if nulls_last else Q()
+    else:
+        bound = Q(**{f"{first}__{'lte' if ordering[0].startswith('-') else 'gte'}": value})
+        if first in nullable and nulls_last:
+            bound |= Q(**{f'{first}__isnull': True})
+    return bound & q
+
+
+def seek(queryset, ordering, values=None, reverse=False):
+    """``queryset`` in ``ordering`` (inverted when ``reverse``) from the row
+    after ``values``; NULLs sort after every value in ``ordering``."""
+    columns = nullable(queryset.model, ordering)
+    direction = invert(ordering) if reverse else ordering
+    queryset = queryset.order_by(*order_by(direction, columns, nulls_last=not reverse))
+    if values is not None:
+        queryset = queryset.filter(after(direction, values, columns, nulls_last=not reverse))
+    return queryset
+
+
+def position(obj, ordering):
+    return [getattr(obj, name.lstrip('-')) for name in ordering]
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    ordering = ('-id',)
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    # cursor encoding ---------------------------------------------------
+
+    def encode_cursor(self, values, reverse):
+        return encode_cursor(values, reverse)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            return decode_cursor(encoded, model, self.ordering)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    # queries -------------------------------------------------------------
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(view)
+        self.page_size_value = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        queryset = seek(queryset, self.ordering, values, reverse)
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(position(self.page[-1], self.ordering), reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(position(self.page[0], self.ordering), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,26 +1,31 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .roles import user_roles
+
 
 def in_group(user, group_name):
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name=group_name).exists()
+    """Return True if ``user`` belongs to ``group_name`` (see ``core.roles``)."""
+    return group_name in user_roles(user)
 
 
 def _conductor_owns_furgon(user, obj):
     """Return True if the given user has a conductor_profile that matches obj.conductor.
 
     This function carefully avoids raising when object attributes are missing and
-    returns False in case of any failure during the check.
+    returns False in case of any failure during the check. Ids are compared
+    (``conductor_id`` claim of token users, ``obj.conductor_id``) so the
+    check does not load the related rows when they are not cached.
     """
     try:
-        conductor_profile = getattr(user, 'conductor_profile', None)
-        if (
-            conductor_profile
-            and hasattr(obj, 'conductor')
-            and obj.conductor
-            and getattr(obj.conductor, 'pk', None) == getattr(conductor_profile, 'pk', None)
-        ):
+        conductor_pk = getattr(user, 'conductor_id', None)
+        if conductor_pk is None:
+            conductor_pk = getattr(getattr(user, 'conductor_profile', None), 'pk', None)
+        if conductor_pk is None or obj is None:
+            return False
+        owner_pk = getattr(obj, 'conductor_id', None)
+        if owner_pk is None:
+            owner_pk = getattr(getattr(obj, 'conductor', None), 'pk', None)
+        if owner_pk is not None and owner_pk == conductor_pk:
             return True
     except Exception:
         return False
@@ -33,10 +38,10 @@ def _apoderado_owns_student(user, obj):
     This handles missing attributes and returns False on exceptions.
     """
     try:
-        if (
-            getattr(obj, 'apoderado_user', None)
-            and getattr(obj.apoderado_user, 'pk', None) == getattr(user, 'pk', None)
-        ):
+        owner_pk = getattr(obj, 'apoderado_user_id', None)
+        if owner_pk is None:
+            owner_pk = getattr(getattr(obj, 'apoderado_user', None), 'pk', None)
+        if owner_pk is not None and owner_pk == getattr(user, 'pk', None):
             return True
     except Exception:
         return False
@@ -74,7 +79,7 @@ class IsAdminOrConductorOrReadOnly(BasePermission):
         # Allow conductors to call specific actions (e.g. update_location)
         if request.user and in_group(request.user, 'Conductor'):
             action = getattr(view, 'action', None)
-            if action in ('update_location',):
+            if action in ('update_location', 'bulk_update_location'):
                 return True
         return False
 
@@ -0,0 +1,85 @@
+"""Per-request SQL instrumentation: query counts and N+1 detection.
+
+``record()`` captures the statements run on a connection (through
+``connection.execute_wrapper``, so it also works with ``DEBUG`` off).
+Statements are grouped by pattern, their SQL with the placeholders (and
+``IN`` lists of any length) left in place; a pattern repeated
+``DUPLICATE_THRESHOLD`` times or more in one request is almost always a
+relation loaded once per row, i.e. a missing ``select_related`` or
+``prefetch_related``.
+
+The query budgets of every route are enforced by
+``core/tests/test_query_budgets.py``. ``QueryCountMiddleware`` reports the
+same numbers for live requests (``QUERY_COUNT_LOG=1``).
+"""
+import contextlib
+import logging
+import re
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_THRESHOLD = 3
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def pattern(sql):
+    """``sql`` with its ``IN (%s, %s, ...)`` lists collapsed."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryLog:
+    """The statements run while recording, in order."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """``{pattern: times}`` of the patterns run ``threshold`` times or more."""
+        counts = Counter(pattern(sql) for sql in self.queries)
+        return {sql: n for sql, n in counts.items() if n >= threshold}
+
+    def problems(self, budget=None, threshold=DUPLICATE_THRESHOLD):
+        """Human readable budget overrun and repeated patterns (empty if none)."""
+        found = []
+        if budget is not None and len(self) > budget:
+            found.append(f'{len(self)} queries, budget {budget}')
+        found += [f'{n}x {sql}' for sql, n in self.duplicates(threshold).items()]
+        return found
+
+
+@contextlib.contextmanager
+def record(using=DEFAULT_DB_ALIAS):
+    log = QueryLog()
+    with connections[using].execute_wrapper(log):
+        yield log
+
+
+class QueryCountMiddleware:
+    """Adds ``X-Query-Count`` to every response and logs a warning for
+    requests with repeated statements. For development and profiling."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record() as log:
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(len(log))
+        duplicates = log.duplicates()
+        if duplicates:
+            logger.warning('%s %s: %d queries, repeated: %s', request.method, request.path, len(log),
+                           '; '.join(f'{n}x {sql}' for sql, n in duplicates.items()))
+        else:
+            logger.debug('%s %s: %d queries', request.method, request.path, len(log))
+        return response
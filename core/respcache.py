@@ -0,0 +1,138 @@
+"""Cache of list and detail responses, shared between requests.
+
+An entry is keyed by the view, the absolute URL (query string included),
+the visibility scope of the user and the version stamps of the models the
+response depends on (``core.versions``). The post_save/post_delete signals
+bump those stamps, so a write to any of the models makes the next request
+miss; entries nobody can reach any more expire after ``RESPONSE_CACHE_TTL``.
+The stamps are shared by every process, so a write in one of them reaches
+the entries cached by all the others, even when each worker keeps its own
+copy (the default per-process cache, bounded by ``MAX_ENTRIES`` and a short
+TTL). Responses depending on an open slice of a sliced stamp
+(``core.versions.settled``) are not cached.
+
+The scope is ``shared`` for reference data every user sees the same way
+(colegios, conductores, rutas), ``admin`` for administrators, and the user
+and its roles otherwise (``core.scoping``).
+
+Concurrent misses of one key are collapsed: the first request computes the
+response while holding a lock entry (``cache.add``) and the others wait for
+its result, up to ``LOCK_TIMEOUT``.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from . import scoping, versions
+from .roles import user_roles
+
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+
+
+def ttl():
+    return getattr(settings, 'RESPONSE_CACHE_TTL', 0)
+
+
+def scope(user, shared=False):
+    if shared:
+        return 'shared'
+    if scoping.is_admin(user):
+        return 'admin'
+    if not user or not user.is_authenticated:
+        return 'anonymous'
+    return (user.pk, sorted(user_roles(user)))
+
+
+def get_or_compute(key, compute, timeout):
+    """The cached value of ``key``, or the value of ``compute()``.
+
+    ``compute`` returns ``(value, cacheable)``; only cacheable values are
+    stored. While one caller computes, the others poll for its result; if
+    it finishes without storing one, they compute their own.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock = f'{key}:lock'
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.get(lock) is None:
+                value = cache.get(key)
+                if value is not None:
+                    return value
+                break
+        return compute()[0]
+    try:
+        value, cacheable = compute()
+        if cacheable:
+            cache.set(key, value, timeout)
+    finally:
+        cache.delete(lock)
+    return value
+
+
+def page(key, render):
+    """The rendered template response of ``render()``, through the cache
+    (for the frontend views; ``key`` must identify the user, ``None``
+    bypasses the cache)."""
+    timeout = ttl()
+    if timeout <= 0 or key is None:
+        return render()
+    computed = []
+
+    def compute():
+        response = render()
+        if hasattr(response, 'render'):
+            response.render()
+        computed.append(response)
+        return (response.content, response['Content-Type']), response.status_code == 200
+
+    content, content_type = get_or_compute(f'page:{key}', compute, timeout)
+    return computed[0] if computed else HttpResponse(content, content_type=content_type)
+
+
+class ResponseCacheMixin:
+    """Viewset mixin serving ``list``/``retrieve`` from the response cache.
+
+    The stamps are the ones of ``core.versions.ConditionalGetMixin``;
+    ``shared_responses`` marks viewsets whose rows are not scoped per user.
+    """
+    shared_responses = False
+
+    def response_cache_key(self, request):
+        key = versions.fingerprint(
+            type(self).__name__, self.action, request.build_absolute_uri(),
+            scope(request.user, self.shared_responses), self.get_version_stamps(),
+        )
+        return f'response:{key}'
+
+    def _cached(self, handler, request, *args, **kwargs):
+        timeout = ttl()
+        if request.method not in ('GET', 'HEAD') or timeout <= 0:
+            return handler(request, *args, **kwargs)
+        if not versions.settled(self.get_version_dependencies(), self.get_version_stamps()):
+            return handler(request, *args, **kwargs)
+        computed = []
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            computed.append(response)
+            return response.data, response.status_code == 200
+
+        data = get_or_compute(self.response_cache_key(request), compute, timeout)
+        return computed[0] if computed else Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,36 @@
+"""Role (group) resolution for permission checks.
+
+``user_roles`` returns the names of all of a user's groups. They are loaded
+once and memoized on the user object, which lives for one request, so the
+many ``in_group`` checks done by permissions, views and the ``has_group``
+template filter cost at most one query per request. Token users get them
+from the token claims instead (``core.tokens``), without a query.
+
+The names are not cached across requests. A cache shared by every process
+would have to be checked against a stamp in the database on each request,
+which costs the same one query, and a per-process cache would keep a user's
+removed rights in the other processes.
+"""
+
+_ATTR = '_core_roles'
+
+
+def user_roles(user):
+    """Return the frozenset of group names of ``user`` (empty for anonymous)."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, _ATTR, None)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        setattr(user, _ATTR, roles)
+    return roles
+
+
+def remember(user, roles):
+    """Set the roles of ``user`` without a query (e.g. from token claims)."""
+    setattr(user, _ATTR, frozenset(roles))
+
+
+def forget(user):
+    """Drop the roles memoized on ``user``."""
+    user.__dict__.pop(_ATTR, None)
@@ -0,0 +1,100 @@
+"""Row-level visibility of the API resources, applied in SQL.
+
+Each function receives a queryset and the requesting user and returns the
+queryset restricted to the rows that user may see, with the same rules as
+the frontend lists (``FurgonList``, ``EstudianteList``, ``NotificacionList``):
+
+* admins (``is_staff`` or group ``Administrador``) see everything,
+* conductores see what belongs to the furgones they drive,
+* apoderados see what belongs to their students,
+* anyone else sees nothing.
+
+A user with both roles gets the union. Multi-valued relations are expressed
+as ``pk__in`` subqueries instead of joins, so no ``DISTINCT`` is needed.
+"""
+from django.db.models import Q
+
+from .models import Estudiante, Furgon
+from .permissions import in_group
+
+
+def is_admin(user):
+    return bool(user and user.is_authenticated and (user.is_staff or in_group(user, 'Administrador')))
+
+
+def _scope(queryset, user, conductor=None, apoderado=None):
+    """Filter ``queryset`` with the ``Q`` built by ``conductor``/``apoderado``."""
+    if is_admin(user):
+        return queryset
+    if not user or not user.is_authenticated:
+        return queryset.none()
+    q = Q()
+    if conductor is not None and in_group(user, 'Conductor'):
+        q |= conductor(user)
+    if apoderado is not None and in_group(user, 'Apoderado'):
+        q |= apoderado(user)
+    return queryset.filter(q) if q else queryset.none()
+
+
+def _driven(user, field=None):
+    """``Q`` on ``field`` (a path to Furgon, ``None`` for Furgon itself) for
+    the furgones driven by ``user``.
+
+    Token users carry their furgón ids as a claim (``core.tokens``), which
+    avoids the join to ``Conductor``.
+    """
+    furgon_ids = getattr(user, 'furgon_ids', None)
+    if furgon_ids is not None:
+        return Q(**{f'{field or "pk"}__in': furgon_ids})
+    prefix = f'{field}__' if field else ''
+    return Q(**{f'{prefix}conductor__user_id': user.pk})
+
+
+def driven_furgon_ids(user):
+    """Ids of the furgones driven by ``user`` (empty if not a conductor)."""
+    if not in_group(user, 'Conductor'):
+        return set()
+    furgon_ids = getattr(user, 'furgon_ids', None)
+    if furgon_ids is not None:
+        return set(furgon_ids)
+    return set(Furgon.objects.filter(_driven(user)).values_list('pk', flat=True))
+
+
+def furgones(queryset, user):
+    return _scope(
+        queryset, user,
+        conductor=_driven,
+        apoderado=lambda u: Q(pk__in=Estudiante.objects.filter(apoderado_user_id=u.pk).values('furgon_id')),
+    )
+
+
+def estudiantes(queryset, user):
+    return _scope(
+        queryset, user,
+        conductor=lambda u: _driven(u, 'furgon'),
+        apoderado=lambda u: Q(apoderado_user_id=u.pk),
+    )
+
+
+def pagos(queryset, user):
+    return _scope(
+        queryset, user,
+        conductor=lambda u: _driven(u, 'estudiante__furgon'),
+        apoderado=lambda u: Q(estudiante__apoderado_user_id=u.pk),
+    )
+
+
+def asistencias(queryset, user):
+    return _scope(
+        queryset, user,
+        conductor=lambda u: _driven(u, 'furgon') | _driven(u, 'estudiante__furgon'),
+        apoderado=lambda u: Q(estudiante__apoderado_user_id=u.pk),
+    )
+
+
+def notificaciones(queryset, user):
+    return _scope(
+        queryset, user,
+        conductor=lambda u: _driven(u, 'furgon'),
+        apoderado=lambda u: Q(estudiante__apoderado_user_id=u.pk),
+    )
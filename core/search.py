@@ -0,0 +1,238 @@
+"""Search index of colegios, conductores, furgones, estudiantes and pagos.
+
+The text of the fields in ``INDEXED`` is folded (accents removed, lower
+case, punctuation as spaces) and split into words, stored per object in
+``TerminoBusqueda``. Identifiers (``COMPACT``) are also stored without their
+punctuation, so ``12345678`` finds the rut ``12.345.678-5`` and ``abc1`` the
+patente ``AB-C1``. ``TrigramaBusqueda`` maps the trigrams of every distinct
+word to it; names repeat, so this vocabulary is much smaller than the
+objects.
+
+A word of the query matches an object when it is a prefix of one of its
+words or, for substring searches, when it is inside one (``icontains``-like,
+without the table scan). The longest word of the query selects the
+candidates: its prefix is an index range scan; inside words, from
+``MIN_TRIGRAM`` characters, the vocabulary words with its middle trigram
+that contain it are found first, then their objects. The other words of
+the query are checked on the few words of each candidate.
+
+The index is kept up to date by the model signals (``core.signals``) and the
+bulk write paths (``core.bulk``); ``manage.py rebuild_search_index`` builds
+it from scratch.
+"""
+import unicodedata
+
+from django.db.models import Exists, OuterRef, Q
+
+from . import scoping
+from .models import Colegio, Conductor, Estudiante, Furgon, Pago, TerminoBusqueda, TrigramaBusqueda
+
+INDEXED = {
+    'colegio': ('nombre',),
+    'conductor': ('nombre', 'rut'),
+    'furgon': ('patente', 'modelo'),
+    'estudiante': ('nombre', 'rut'),
+    'pago': ('referencia',),
+}
+COMPACT = {'rut', 'patente', 'referencia'}
+MIN_TRIGRAM = 3
+MAX_TERM_LENGTH = 64
+WRITE_BATCH_SIZE = 1000
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+# what ``autocomplete`` searches, with the visibility rules of the API
+SEARCHABLE = {
+    'colegio': (Colegio, None),
+    'conductor': (Conductor, None),
+    'furgon': (Furgon, scoping.furgones),
+    'estudiante': (Estudiante, scoping.estudiantes),
+    'pago': (Pago, scoping.pagos),
+}
+# the upper bound of a prefix range: sorts after any folded text
+_LAST = chr(0x10FFFF)
+
+
+def fold(text):
+    """``text`` without accents, in lower case and with punctuation as spaces."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(
+        ch if ch.isalnum() else ' ' for ch in decomposed.lower() if not unicodedata.combining(ch)
+    )
+
+
+def words(text):
+    return [word[:MAX_TERM_LENGTH] for word in fold(text).split()]
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def terms(values):
+    """The words of ``{field: text}`` to index, identifiers also compacted."""
+    found = set()
+    for field, text in values.items():
+        parts = words(text)
+        found.update(parts)
+        if field in COMPACT and len(parts) > 1:
+            found.add(''.join(parts)[:MAX_TERM_LENGTH])
+    return found
+
+
+def _label(model):
+    return model._meta.model_name
+
+
+def _tables(apps):
+    if apps is None:
+        return TerminoBusqueda, TrigramaBusqueda
+    return apps.get_model('core', 'TerminoBusqueda'), apps.get_model('core', 'TrigramaBusqueda')
+
+
+def is_indexed(model):
+    return _label(model) in INDEXED
+
+
+def unindex(model, pks, apps=None):
+    # the words stay in the vocabulary (TrigramaBusqueda) until a rebuild
+    termino_model, _ = _tables(apps)
+    termino_model.objects.filter(modelo=_label(model), objeto_id__in=list(pks)).delete()
+
+
+def index(model, objs, apps=None, created=False):
+    """(Re)index ``objs``, instances of ``model`` with the ``INDEXED`` fields
+    loaded; ``created`` skips removing their previous entries. ``apps`` is
+    the app registry of a data migration."""
+    label = _label(model)
+    fields = INDEXED[label]
+    objs = [obj for obj in objs if obj.pk is not None]
+    if not objs:
+        return
+    termino_model, trigrama_model = _tables(apps)
+    if not created:
+        unindex(model, [obj.pk for obj in objs], apps)
+    found_terms, vocabulary = [], set()
+    for obj in objs:
+        found = terms({field: getattr(obj, field) for field in fields})
+        found_terms += [termino_model(modelo=label, objeto_id=obj.pk, termino=term) for term in found]
+        vocabulary |= found
+    termino_model.objects.bulk_create(found_terms, batch_size=WRITE_BATCH_SIZE)
+    trigrama_model.objects.bulk_create(
+        [trigrama_model(trigrama=gram, termino=term) for term in vocabulary for gram in trigrams(term)],
+        batch_size=WRITE_BATCH_SIZE, ignore_conflicts=True,
+    )
+
+
+def rebuild(apps=None, batch_size=WRITE_BATCH_SIZE):
+    """Index every row of the ``INDEXED`` models; returns ``{label: rows}``."""
+    counts = {}
+    for table in _tables(apps):
+        table.objects.all().delete()
+    for label, fields in INDEXED.items():
+        model = apps.get_model('core', label) if apps else SEARCHABLE[label][0]
+        last, counts[label] = 0, 0
+        while True:
+            batch = list(model._default_manager.filter(pk__gt=last).order_by('pk').only(*fields)[:batch_size])
+            if not batch:
+                break
+            index(model, batch, apps, created=True)
+            last, counts[label] = batch[-1].pk, counts[label] + len(batch)
+    return counts
+
+
+# queries ------------------------------------------------------------------
+
+
+def _prefix(label, word):
+    return TerminoBusqueda.objects.filter(
+        modelo=label, termino__gte=word, termino__lt=word + _LAST,
+    ).values('objeto_id')
+
+
+def _containing(label, word):
+    # the words with one of its trigrams (the middle one, the least likely
+    # to be a common prefix or suffix), then those that contain it
+    middle = (len(word) - 3) // 2
+    vocabulary = TrigramaBusqueda.objects.filter(
+        trigrama=word[middle:middle + 3], termino__contains=word,
+    ).values('termino')
+    return TerminoBusqueda.objects.filter(modelo=label, termino__in=vocabulary).values('objeto_id')
+
+
+def _is_identifier(parts):
+    """Several words with digits, or of two characters at most (a check
+    digit, the letters of a patente)."""
+    return (
+        len(parts) > 1 and any(ch.isdigit() for part in parts for ch in part)
+        and all(len(part) <= 2 or any(ch.isdigit() for ch in part) for part in parts)
+    )
+
+
+def _has_word(label, field, word, substrings):
+    # the other words of the query, checked on the few words of each object
+    lookup = {'termino__contains': word} if substrings else {'termino__gte': word, 'termino__lt': word + _LAST}
+    return Exists(TerminoBusqueda.objects.filter(modelo=label, objeto_id=OuterRef(field), **lookup))
+
+
+def matches(model, text, field='pk', substrings=True):
+    """``Q`` for the rows of a queryset whose ``field`` (a ``model`` id) is an
+    object matching ``text``; ``None`` when ``text`` has no words.
+
+    The longest word selects the candidates from the index, the others are
+    checked on them. With ``substrings`` false only word prefixes match.
+    """
+    label = _label(model)
+    parts = sorted(words(text), key=len, reverse=True)
+    if not parts:
+        return None
+    if COMPACT.intersection(INDEXED[label]) and _is_identifier(parts):
+        # '12.345.678-5', 'AB-CD 12': one compacted word
+        parts = [''.join(words(text))[:MAX_TERM_LENGTH]]
+    lookup = f'{field}__in'
+    first, others = parts[0], parts[1:]
+    condition = Q(**{lookup: _prefix(label, first)})
+    if substrings and len(first) >= MIN_TRIGRAM:
+        condition |= Q(**{lookup: _containing(label, first)})
+    for word in others:
+        condition &= _has_word(label, field, word, substrings)
+    return condition
+
+
+def matching(queryset, text, *sources):
+    """``queryset`` restricted to the rows matching ``text`` in any of
+    ``sources``, ``(model, field)`` pairs such as ``(Estudiante,
+    'estudiante')`` (by default the rows' own index); unchanged when ``text``
+    has no words."""
+    sources = sources or [(queryset.model, 'pk')]
+    conditions = [c for c in (matches(model, text, field) for model, field in sources) if c is not None]
+    if not conditions:
+        return queryset
+    condition = conditions[0]
+    for other in conditions[1:]:
+        condition |= other
+    return queryset.filter(condition)
+
+
+def autocomplete(text, user, kinds=None, limit=AUTOCOMPLETE_LIMIT):
+    """``{label: [row, ...]}`` of the objects visible to ``user`` matching
+    ``text``, at most ``limit`` per label. Word prefixes are tried first;
+    substring matches only fill up the labels with fewer than ``limit``."""
+    results = {}
+    for label in kinds or SEARCHABLE:
+        model, scope = SEARCHABLE[label]
+        queryset = model.objects.all()
+        if scope is not None:
+            queryset = scope(queryset, user)
+        columns = ('id', *INDEXED[label])
+        rows = []
+        for substrings in (False, True):
+            condition = matches(model, text, substrings=substrings)
+            if condition is None:
+                break
+            seen = [row['id'] for row in rows]
+            rows += queryset.filter(condition).exclude(pk__in=seen).values(*columns)[:limit - len(rows)]
+            if len(rows) >= limit or not any(len(word) >= MIN_TRIGRAM for word in words(text)):
+                break
+        results[label] = rows
+    return results
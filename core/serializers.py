@@ -1,50 +1,98 @@
 from rest_framework import serializers
-from .models import Colegio, Conductor, Furgon, Estudiante, Ruta, Notificacion, Pago, Asistencia
-
-
-class ColegioSerializer(serializers.ModelSerializer):
+from .models import (
+    Colegio, Conductor, Furgon, Estudiante, Ruta, Notificacion, Pago, Asistencia, ParadaRuta
+)
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer taking ``fields`` (names to keep) and ``expand``
+    (nested dict of relations to inline) keyword arguments.
+
+    Expandable relations are declared as ``Meta.expandable_fields``, a map
+    from field name to serializer class name in this module. See
+    ``core.fieldsets``.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = expand or {}
+        expandable = self.get_expandable_fields()
+        for name, nested in expand.items():
+            model_field = self.Meta.model._meta.get_field(name)
+            many = model_field.many_to_many or model_field.one_to_many
+            self.fields[name] = expandable[name](read_only=True, many=many, expand=nested)
+        if fields is not None:
+            keep = set(fields) | set(expand)
+            for name in [name for name in self.fields if name not in keep]:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_expandable_fields(cls):
+        names = getattr(cls.Meta, 'expandable_fields', {})
+        return {field: globals()[serializer] for field, serializer in names.items()}
+
+
+class ColegioSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Colegio
         fields = '__all__'
 
 
-class ConductorSerializer(serializers.ModelSerializer):
+class ConductorSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Conductor
-        fields = '__all__'
+        # index column (core.canonical), not part of the API
+        exclude = ['rut_canonico']
 
 
-class FurgonSerializer(serializers.ModelSerializer):
+class FurgonSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Furgon
-        fields = '__all__'
+        # index columns (core.geo, core.canonical), not part of the API
+        exclude = ['patente_canonica', 'geohash']
+        expandable_fields = {'conductor': 'ConductorSerializer', 'colegio': 'ColegioSerializer'}
 
 
-class EstudianteSerializer(serializers.ModelSerializer):
+class EstudianteSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Estudiante
-        fields = '__all__'
+        # index column (core.canonical), not part of the API
+        exclude = ['rut_canonico']
+        expandable_fields = {'furgon': 'FurgonSerializer'}
 
 
-class RutaSerializer(serializers.ModelSerializer):
+class RutaSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Ruta
         fields = '__all__'
+        # rutas and paradas are not scoped per user (core.scoping): the
+        # furgón is not expandable from them
+        expandable_fields = {'paradas': 'ParadaRutaSerializer'}
+
+
+class ParadaRutaSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = ParadaRuta
+        fields = '__all__'
+        expandable_fields = {'ruta': 'RutaSerializer'}
 
 
-class NotificacionSerializer(serializers.ModelSerializer):
+class NotificacionSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Notificacion
         fields = '__all__'
+        expandable_fields = {'estudiante': 'EstudianteSerializer', 'furgon': 'FurgonSerializer'}
 
 
-class PagoSerializer(serializers.ModelSerializer):
+class PagoSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Pago
         fields = '__all__'
+        expandable_fields = {'estudiante': 'EstudianteSerializer'}
 
 
-class AsistenciaSerializer(serializers.ModelSerializer):
+class AsistenciaSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Asistencia
         fields = '__all__'
+        expandable_fields = {'estudiante': 'EstudianteSerializer', 'furgon': 'FurgonSerializer'}
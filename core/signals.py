@@ -0,0 +1,164 @@
+"""Signal handlers that keep derived data and caches in sync with the models.
+
+Connected from ``CoreConfig.ready``.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models import SET_NULL
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import journal, live, roles, search, tokens, versions
+from .models import Asistencia, Colegio, Conductor, Estudiante, Furgon, Notificacion, Pago, ParadaRuta, Ruta
+
+
+@receiver([post_save, post_delete], sender=Colegio)
+@receiver([post_save, post_delete], sender=Conductor)
+@receiver([post_save, post_delete], sender=Furgon)
+@receiver([post_save, post_delete], sender=Estudiante)
+@receiver([post_save, post_delete], sender=Ruta)
+@receiver([post_save, post_delete], sender=ParadaRuta)
+@receiver([post_save, post_delete], sender=Notificacion)
+@receiver([post_save, post_delete], sender=Pago)
+@receiver([post_save, post_delete], sender=Asistencia)
+@receiver(post_delete, sender=get_user_model())
+def model_changed(sender, signal, **kwargs):
+    changed = [sender]
+    if signal is post_delete:
+        # SET_NULL on the rows pointing to it runs as a plain UPDATE
+        changed += [rel.related_model for rel in sender._meta.related_objects if rel.on_delete is SET_NULL]
+    versions.bump(*changed)
+
+
+@receiver(post_save, sender=Colegio)
+@receiver(post_save, sender=Conductor)
+@receiver(post_save, sender=Furgon)
+@receiver(post_save, sender=Estudiante)
+@receiver(post_save, sender=Pago)
+def searchable_saved(sender, instance, created, update_fields=None, **kwargs):
+    # saves of other fields only (update_fields) keep the index
+    if update_fields is None or set(update_fields) & set(search.INDEXED[sender._meta.model_name]):
+        search.index(sender, [instance], created=created)
+
+
+@receiver(post_delete, sender=Colegio)
+@receiver(post_delete, sender=Conductor)
+@receiver(post_delete, sender=Furgon)
+@receiver(post_delete, sender=Estudiante)
+@receiver(post_delete, sender=Pago)
+def searchable_deleted(sender, instance, **kwargs):
+    search.unindex(sender, [instance.pk])
+
+
+def _roles_changed(user_ids):
+    tokens.revoke(list(user_ids))
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            roles.forget(instance)
+            _roles_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # group.user_set.add/remove(...)
+        _roles_changed(pk_set)
+    elif action == 'pre_clear':
+        _roles_changed(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        _roles_changed(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # is_staff/is_active are token claims; logins only touch last_login
+    if not created and set(update_fields or ()) != {'last_login'}:
+        tokens.revoke([instance.pk])
+        versions.bump(sender)
+
+
+@receiver(pre_save, sender=Conductor)
+def conductor_user_changing(sender, instance, update_fields=None, **kwargs):
+    # The ``conductor`` claim of both the previous and the new user changes.
+    if update_fields is not None and 'user' not in update_fields:
+        return
+    stored = None
+    if instance.pk is not None:
+        stored = Conductor.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first()
+        if stored == instance.user_id:
+            return
+    tokens.revoke([stored, instance.user_id])
+
+
+@receiver(post_delete, sender=Conductor)
+def conductor_deleted(sender, instance, **kwargs):
+    tokens.revoke([instance.user_id])
+
+
+@receiver(pre_save, sender=Furgon)
+def furgon_conductor_changing(sender, instance, update_fields=None, **kwargs):
+    # The ``furgones`` claim of both the previous and the new conductor changes.
+    if update_fields is not None and 'conductor' not in update_fields:
+        return
+    stored = None
+    if instance.pk is not None:
+        stored = Furgon.objects.filter(pk=instance.pk).values_list('conductor_id', flat=True).first()
+        if stored == instance.conductor_id:
+            return
+    conductor_ids = [pk for pk in (stored, instance.conductor_id) if pk is not None]
+    if conductor_ids:
+        tokens.revoke(Conductor.objects.filter(pk__in=conductor_ids).values_list('user_id', flat=True))
+
+
+@receiver(pre_save, sender=Estudiante)
+@receiver(pre_save, sender=Ruta)
+@receiver(pre_save, sender=Notificacion)
+def synced_saving(sender, instance, raw=False, **kwargs):
+    # audience before the change, to journal a removal if it changes
+    if not raw and instance.pk is not None and not instance._state.adding:
+        instance._journal_before = journal.audiences(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Estudiante)
+@receiver(post_save, sender=Ruta)
+@receiver(post_save, sender=Notificacion)
+def synced_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        action = journal.CREATE if created else journal.UPDATE
+        journal.record(sender, action, [instance.pk], instance.__dict__.pop('_journal_before', None))
+
+
+@receiver(pre_delete, sender=Estudiante)
+@receiver(pre_delete, sender=Ruta)
+@receiver(pre_delete, sender=Notificacion)
+def synced_deleting(sender, instance, **kwargs):
+    instance._journal_before = journal.audiences(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Estudiante)
+@receiver(post_delete, sender=Ruta)
+@receiver(post_delete, sender=Notificacion)
+def synced_deleted(sender, instance, **kwargs):
+    journal.record(sender, journal.DELETE, [instance.pk], instance.__dict__.pop('_journal_before', None))
+
+
+@receiver(pre_delete, sender=Furgon)
+def furgon_deleting(sender, instance, **kwargs):
+    # SET_NULL on the synced rows of the furgón runs as a plain UPDATE
+    instance._journal_orphans = {
+        model: journal.audiences(model, list(model.objects.filter(furgon=instance).values_list('pk', flat=True)))
+        for model in (Estudiante, Ruta, Notificacion)
+    }
+
+
+@receiver(post_delete, sender=Furgon)
+def furgon_deleted(sender, instance, **kwargs):
+    live.positions().remove(instance.pk)
+    for model, before in instance.__dict__.pop('_journal_orphans', {}).items():
+        journal.record(model, journal.UPDATE, list(before), before)
@@ -0,0 +1,258 @@
+"""Server-Sent Events stream of live furgón positions.
+
+``positions_stream`` pushes the positions held in ``core.live`` to
+apoderados, conductores and the admin map. Each client only receives the
+furgones it may see, and bursts are coalesced: every tick sends at most one
+(the latest) position per furgón changed since the previous event.
+
+The changes are read from the store once per tick for all the clients of
+a process (``PositionBroadcaster``); each client only filters them down to
+its furgones, so a tick costs one pass over the fleet, not one per client.
+
+Served through ASGI (``gestion_furgones.asgi``) every connection is a
+coroutine that sleeps between ticks, so thousands of idle clients do not
+need a thread each. Under WSGI (``runserver``) the same stream falls back to
+a blocking generator.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from . import live, scoping
+from .authentication import ClaimsJWTAuthentication
+from .models import Furgon
+
+FIELDS = ['id', 'latitude', 'longitude', 'reported_at']
+# Ticks of changes kept for clients that fell behind.
+BROADCAST_HISTORY = 64
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def authenticate(request):
+    """Return the user behind a Bearer token or the session, or ``None``.
+
+    Tokens are checked like in the API (``core.authentication``), so a
+    revoked token is refused.
+    """
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    if result is not None:
+        return result[0]
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    return None
+
+
+def visible_furgon_ids(user):
+    """Return the furgón ids ``user`` may follow, or ``None`` for all of them.
+
+    Same rules as the API (``core.scoping.furgones``): admins see every
+    furgón, conductores their own and apoderados those of their students.
+    """
+    if scoping.is_admin(user):
+        return None
+    return set(scoping.furgones(Furgon.objects.all(), user).values_list('pk', flat=True))
+
+
+def _resolve(request):
+    user = authenticate(request)
+    if user is None:
+        return None, None
+    # Load positions from the database now, so the stream itself never does.
+    live.warm_up()
+    return user, visible_furgon_ids(user)
+
+
+def format_event(version, positions):
+    """Encode a ``positions`` event (SSE wire format) with ``version`` as id."""
+    rows = [
+        [pk, lat, lon, int(reported_at.timestamp()) if reported_at else None]
+        for pk, (lat, lon, reported_at) in sorted(positions.items())
+    ]
+    data = json.dumps({'fields': FIELDS, 'positions': rows}, separators=(',', ':'))
+    return f'event: positions\nid: {version}\ndata: {data}\n\n'.encode()
+
+
+HEARTBEAT = b': ping\n\n'
+
+
+class PositionBroadcaster:
+    """Changes of the live store, read once per ``tick`` seconds for every feed.
+
+    Each read is kept as a ``(since, version, changed)`` delta, the last
+    ``history`` of them. ``changed_since`` merges the deltas a feed has not
+    seen yet; a feed further behind (or resuming from another process's
+    ``Last-Event-ID``) reads the store itself.
+    """
+
+    def __init__(self, tick, history=BROADCAST_HISTORY):
+        self.tick = tick
+        self._lock = threading.Lock()
+        self._store = None
+        self._version = None
+        self._read_at = None
+        self._deltas = deque(maxlen=history)
+
+    def _refresh(self, store):
+        now = time.monotonic()
+        if store is not self._store:
+            self._store, self._version, self._read_at = store, store.version(), now
+            self._deltas.clear()
+            return
+        if now - self._read_at < self.tick or store.version() == self._version:
+            return
+        self._read_at = now
+        version, changed = store.changed_since(self._version)
+        self._deltas.append((self._version, version, changed))
+        self._version = version
+
+    def changed_since(self, version):
+        """Return ``(version, {furgon_id: (lat, lon, reported_at)})`` updated after ``version``."""
+        store = live.positions()
+        with self._lock:
+            self._refresh(store)
+            if version == self._version:
+                return version, {}
+            if self._version > version and self._deltas and self._deltas[0][0] <= version:
+                changed = {}
+                for _, upto, delta in self._deltas:
+                    if upto > version:
+                        changed.update(delta)
+                return self._version, changed
+        return store.changed_since(version)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def broadcaster():
+    """Return the broadcaster shared by the feeds of this process."""
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = PositionBroadcaster(_setting('LIVE_STREAM_INTERVAL', 1.0))
+    return _broadcaster
+
+
+class PositionFeed:
+    """Per-client cursor over the live store.
+
+    ``poll()`` returns the next event to send (or ``None`` when nothing
+    visible changed), so the async and the blocking streams share the logic.
+    The first event is the whole snapshot (``live.snapshot``, which reads
+    ``Furgon`` when the store is incomplete). The changes come from
+    ``source`` (the process's ``broadcaster()`` by default); the feed only
+    scopes them to ``visible_ids``.
+    """
+
+    def __init__(self, visible_ids, last_version=None, source=None):
+        self.visible_ids = visible_ids
+        self.last_version = last_version
+        self.source = source or broadcaster()
+
+    def _scope(self, positions):
+        if self.visible_ids is None:
+            return positions
+        return {pk: pos for pk, pos in positions.items() if pk in self.visible_ids}
+
+    def poll(self):
+        if self.last_version is None:
+            version, positions = live.snapshot()
+            self.last_version = version
+            return format_event(version, self._scope(positions))
+        version, changed = self.source.changed_since(self.last_version)
+        if version == self.last_version:
+            return None
+        self.last_version = version
+        changed = self._scope(changed)
+        return format_event(version, changed) if changed else None
+
+
+async def _aevents(feed, interval, heartbeat, max_events=None):
+    # Stores other than the local one may block on I/O; run them off the loop.
+    local = isinstance(live.positions(), live.LocalPositionStore)
+    poll = feed.poll if local else sync_to_async(feed.poll, thread_sensitive=False)
+    sent = 0
+    idle = 0.0
+    while max_events is None or sent < max_events:
+        if feed.last_version is None:
+            # the snapshot may read Furgon (live.snapshot)
+            event = await sync_to_async(feed.poll)()
+        else:
+            event = poll() if local else await poll()
+        if event is not None:
+            idle = 0.0
+            sent += 1
+            yield event
+            continue
+        if idle >= heartbeat:
+            idle = 0.0
+            yield HEARTBEAT
+        await asyncio.sleep(interval)
+        idle += interval
+
+
+def _events(feed, interval, heartbeat, max_events=None):
+    sent = 0
+    idle = 0.0
+    while max_events is None or sent < max_events:
+        event = feed.poll()
+        if event is not None:
+            idle = 0.0
+            sent += 1
+            yield event
+            continue
+        if idle >= heartbeat:
+            idle = 0.0
+            yield HEARTBEAT
+        time.sleep(interval)
+        idle += interval
+
+
+def _last_event_id(request):
+    value = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+async def positions_stream(request):
+    """GET /api/furgones/stream/: ``text/event-stream`` de posiciones en vivo.
+
+    Autenticación por sesión o ``Authorization: Bearer <access>``. Reanuda
+    desde ``Last-Event-ID`` si el cliente lo envía.
+    """
+    user, visible_ids = await sync_to_async(_resolve)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Autenticación requerida'}, status=401)
+    if visible_ids is not None and not visible_ids:
+        return JsonResponse({'detail': 'No autorizado'}, status=403)
+    feed = PositionFeed(visible_ids, _last_event_id(request))
+    interval = _setting('LIVE_STREAM_INTERVAL', 1.0)
+    heartbeat = _setting('LIVE_STREAM_HEARTBEAT', 15.0)
+    if isinstance(request, ASGIRequest):
+        content = _aevents(feed, interval, heartbeat)
+    else:
+        content = _events(feed, interval, heartbeat)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,158 @@
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core import search
+from core.models import Asistencia, Cambio, Conductor, Estudiante, Furgon, Pago, TerminoBusqueda
+
+
+class BulkWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin_bk', password='p', is_staff=True)
+        self.furgon = Furgon.objects.create(patente='BK-1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def post(self, url, payload):
+        resp = self.client.post(url, payload, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.json()
+
+    def test_create_many_students_with_constant_queries(self):
+        rows = [{'rut': f'{i}-K', 'nombre': f'Est {i}', 'furgon': self.furgon.pk} for i in range(200)]
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.post('/api/estudiantes/bulk/', rows)
+        self.assertEqual(data['created'], 200)
+        self.assertEqual(Estudiante.objects.filter(furgon=self.furgon).count(), 200)
+        self.assertEqual([r['id'] for r in data['results']], list(
+            Estudiante.objects.order_by('pk').values_list('pk', flat=True)
+        ))
+        # estudiante, journal and search index (core.search) INSERTs are
+        # chunked by SQLite's parameter limit; the estudiante rows carry
+        # their canonical rut (core.canonical) too. + the version stamp
+        index = [q for q in ctx.captured_queries if 'busqueda' in q['sql']]
+        self.assertLessEqual(len(ctx.captured_queries) - len(index), 10)
+        self.assertTrue(all(q['sql'].startswith('INSERT') for q in index))
+
+    def test_backend_without_returning_bulk_inserts(self):
+        # MySQL: bulk_create leaves the pks unset
+        features = type(connection.features)
+        rows = [{'rut': f'{i}-K', 'nombre': f'Ana {i}'} for i in range(100)]
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False):
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.post('/api/estudiantes/bulk/', {'mode': 'upsert', 'rows': [
+                    {'rut': '1-9', 'nombre': 'Ana Uno'}, {'rut': '2-7', 'nombre': 'Ana Dos'},
+                ] + rows})
+            queries = [q['sql'] for q in ctx.captured_queries]
+            asistencias = self.post('/api/asistencias/bulk/', [
+                {'estudiante': data['results'][0]['id'], 'fecha': '2025-03-03', 'estado': 'presente'},
+            ])
+            pagos = self.post('/api/pagos/bulk/', [{'estudiante': data['results'][0]['id'], 'monto': 100}])
+        ids = [r['id'] for r in data['results']]
+        self.assertEqual(ids, [Estudiante.objects.get(rut=rut).pk for rut in ['1-9', '2-7'] + [row['rut'] for row in rows]])
+        # chunked INSERTs and the pks read back by rut, not a save() per row
+        self.assertLessEqual(len([sql for sql in queries if sql.startswith('INSERT INTO "core_estudiante"')]), 2)
+        self.assertLessEqual(len([sql for sql in queries if 'busqueda' not in sql]), 10)
+        self.assertEqual(asistencias['results'][0]['id'], Asistencia.objects.get().pk)
+        self.assertEqual(pagos['results'][0]['id'], Pago.objects.get().pk)
+        # journaled and indexed once
+        self.assertEqual(sorted(Cambio.objects.filter(modelo='estudiante').values_list('objeto_id', flat=True)), ids)
+        terms = TerminoBusqueda.objects.filter(modelo='estudiante', objeto_id=ids[0])
+        self.assertEqual(terms.count(), terms.values('termino').distinct().count())
+        self.assertEqual(set(search.matching(Estudiante.objects.all(), 'ana dos').values_list('pk', flat=True)),
+                         {ids[1]})
+
+    def test_row_errors_do_not_abort_the_batch(self):
+        Estudiante.objects.create(rut='1-1', nombre='Existente')
+        data = self.post('/api/estudiantes/bulk/', [
+            {'rut': '1-1', 'nombre': 'Duplicado'},
+            {'rut': '2-2'},
+            {'rut': '3-3', 'nombre': 'Ok', 'furgon': 999999},
+            {'rut': '4-4', 'nombre': 'Ok'},
+            {'rut': '4-4', 'nombre': 'Repetido'},
+            'no es objeto',
+        ])
+        statuses = [r['status'] for r in data['results']]
+        self.assertEqual(statuses, ['error', 'error', 'error', 'created', 'error', 'error'])
+        self.assertIn('nombre', data['results'][1]['detail'])
+        self.assertIn('furgon', data['results'][2]['detail'])
+        self.assertEqual(Estudiante.objects.get(rut='1-1').nombre, 'Existente')
+        self.assertTrue(Estudiante.objects.filter(rut='4-4').exists())
+
+    def test_upsert_students_by_rut(self):
+        existing = Estudiante.objects.create(rut='1-1', nombre='Antes', telefono='123')
+        data = self.post('/api/estudiantes/bulk/', {'mode': 'upsert', 'rows': [
+            {'rut': '1-1', 'nombre': 'Después'},
+            {'rut': '5-5', 'nombre': 'Nuevo'},
+        ]})
+        self.assertEqual((data['created'], data['updated']), (1, 1))
+        existing.refresh_from_db()
+        self.assertEqual((existing.nombre, existing.telefono), ('Después', '123'))
+        self.assertEqual(data['results'][0]['id'], existing.pk)
+
+    def test_update_mode_requires_existing_keys(self):
+        data = self.post('/api/estudiantes/bulk/', {'mode': 'update', 'rows': [{'rut': '9-9', 'nombre': 'X'}]})
+        self.assertEqual(data['results'][0]['status'], 'error')
+        self.assertFalse(Estudiante.objects.exists())
+
+    def test_upsert_attendance_by_student_and_date(self):
+        est = [Estudiante.objects.create(rut=f'{i}-1', nombre=f'E{i}') for i in range(3)]
+        Asistencia.objects.create(estudiante=est[0], fecha=date(2025, 3, 3), estado='presente')
+        rows = [{'estudiante': e.pk, 'fecha': '2025-03-03', 'estado': 'ausente'} for e in est]
+        data = self.post('/api/asistencias/bulk/', {'mode': 'upsert', 'rows': rows})
+        self.assertEqual((data['created'], data['updated'], data['error']), (2, 1, 0))
+        self.assertEqual(set(Asistencia.objects.values_list('estado', flat=True)), {'ausente'})
+        self.assertEqual(Asistencia.objects.count(), 3)
+
+    def test_payments_create_and_update_by_id(self):
+        est = Estudiante.objects.create(rut='1-1', nombre='E')
+        pago = Pago.objects.create(estudiante=est, monto=1000)
+        data = self.post('/api/pagos/bulk/', {'mode': 'upsert', 'rows': [
+            {'id': pago.pk, 'estado': 'pagado'},
+            {'estudiante': est.pk, 'monto': '25000.00', 'fecha': '2025-03-01'},
+            {'id': 999999, 'estado': 'pagado'},
+        ]})
+        self.assertEqual([r['status'] for r in data['results']], ['updated', 'created', 'error'])
+        pago.refresh_from_db()
+        self.assertEqual((pago.estado, pago.monto), ('pagado', 1000))
+        self.assertEqual(Pago.objects.count(), 2)
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.client.post('/api/pagos/bulk/', [], format='json').status_code, 400)
+        resp = self.client.post('/api/pagos/bulk/', {'mode': 'merge', 'rows': [{}]}, format='json')
+        self.assertEqual(resp.status_code, 400)
+
+
+class BulkWritePermissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('cond_bk', password='p')
+        user.groups.add(Group.objects.create(name='Conductor'))
+        conductor = Conductor.objects.create(rut='97000000-1', nombre='Cond BK', user=user)
+        mine = Furgon.objects.create(patente='BK-MINE', conductor=conductor)
+        self.pasajero = Estudiante.objects.create(rut='1-1', nombre='Pasajero', furgon=mine)
+        self.ajeno = Estudiante.objects.create(rut='2-2', nombre='Ajeno')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+    def test_conductor_records_attendance_of_own_students_only(self):
+        rows = [
+            {'estudiante': self.pasajero.pk, 'fecha': '2025-03-03', 'estado': 'presente'},
+            {'estudiante': self.ajeno.pk, 'fecha': '2025-03-03', 'estado': 'presente'},
+        ]
+        resp = self.client.post('/api/asistencias/bulk/', rows, format='json')
+        self.assertEqual([r['status'] for r in resp.json()['results']], ['created', 'error'])
+        self.assertEqual(list(Asistencia.objects.values_list('estudiante', flat=True)), [self.pasajero.pk])
+
+    def test_conductor_cannot_bulk_write_students_or_payments(self):
+        resp = self.client.post('/api/estudiantes/bulk/', [{'rut': '3-3', 'nombre': 'X'}], format='json')
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.post('/api/pagos/bulk/', [{'estudiante': self.pasajero.pk, 'monto': 1}], format='json')
+        self.assertEqual(resp.status_code, 403)
@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core import canonical
+from core.models import Conductor, Estudiante, Furgon
+
+
+class CanonicalColumnsTests(TestCase):
+    def test_canonical_forms(self):
+        self.assertEqual(canonical.rut('12.345.678-5'), '123456785')
+        self.assertEqual(canonical.rut('09.876.543-k'), '9876543K')
+        self.assertEqual(canonical.rut(' 11111111 1 '), '111111111')
+        self.assertEqual(canonical.patente('ab-cd 12'), 'ABCD12')
+        self.assertEqual(canonical.rut(None), '')
+
+    def test_save_fills_the_shadow_columns(self):
+        conductor = Conductor.objects.create(rut='7.654.321-k', nombre='Pedro')
+        furgon = Furgon.objects.create(patente='ab-cd 12')
+        self.assertEqual(Conductor.objects.get(pk=conductor.pk).rut_canonico, '7654321K')
+        self.assertEqual(Furgon.objects.get(pk=furgon.pk).patente_canonica, 'ABCD12')
+        furgon.patente = 'XY-99'
+        furgon.save(update_fields=['patente'])
+        self.assertEqual(Furgon.objects.get(pk=furgon.pk).patente_canonica, 'XY99')
+
+    def test_bulk_writes_fill_the_shadow_columns(self):
+        api = APIClient()
+        api.force_authenticate(User.objects.create_user('admin_cn', password='p', is_staff=True))
+        Estudiante.objects.create(rut='5-5', nombre='Existente')
+        resp = api.post('/api/estudiantes/bulk/', {'mode': 'upsert', 'rows': [
+            {'rut': '3.333.333-3', 'nombre': 'Nuevo'}, {'rut': '5-5', 'nombre': 'Cambiado'},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(dict(Estudiante.objects.values_list('rut', 'rut_canonico')),
+                         {'3.333.333-3': '33333333', '5-5': '55'})
+
+    def test_shadow_columns_stay_out_of_the_api(self):
+        api = APIClient()
+        api.force_authenticate(User.objects.create_user('admin_sh', password='p', is_staff=True))
+        conductor = Conductor.objects.create(rut='7.654.321-k', nombre='Pedro')
+        furgon = Furgon.objects.create(patente='ab-cd 12', conductor=conductor, last_latitude=-38.7, last_longitude=-72.6)
+        Estudiante.objects.create(rut='1.111.111-1', nombre='A', furgon=furgon)
+        payloads = [
+            api.get(f'/api/conductores/{conductor.pk}/').json(),
+            api.get(f'/api/furgones/{furgon.pk}/').json(),
+            api.get('/api/estudiantes/').json()['results'][0],  # values_list rows (core.fastread)
+            api.get('/api/sync/').json()['estudiantes']['created'][0],
+        ]
+        expanded = api.get('/api/estudiantes/?expand=furgon.conductor').json()['results'][0]
+        payloads += [expanded, expanded['furgon'], expanded['furgon']['conductor']]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                self.assertFalse({'rut_canonico', 'patente_canonica', 'geohash'} & set(payload))
+
+    def test_backfill_command(self):
+        Estudiante.objects.create(rut='1.111.111-1', nombre='A')
+        Estudiante.objects.create(rut='2.222.222-2', nombre='B')
+        Estudiante.objects.update(rut_canonico='')
+        out = StringIO()
+        call_command('backfill_canonical', '--batch-size', '1', stdout=out)
+        self.assertIn('estudiante: 2 filas actualizadas', out.getvalue())
+        self.assertEqual(set(Estudiante.objects.values_list('rut_canonico', flat=True)), {'11111111', '22222222'})
+        call_command('backfill_canonical', stdout=out)
+        self.assertIn('estudiante: 0 filas actualizadas', out.getvalue())
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.apoderado = User.objects.create_user('apod_cn', password='p')
+        self.apoderado.groups.add(Group.objects.create(name='Apoderado'))
+        self.mine = Estudiante.objects.create(rut='12.345.678-5', nombre='Ana', apoderado_user=self.apoderado)
+        self.other = Estudiante.objects.create(rut='12345679-3', nombre='Berta')
+        Estudiante.objects.create(rut='22.345.678-1', nombre='Carla')
+        self.furgon = Furgon.objects.create(patente='ab-cd 12', modelo='Sprinter')
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user('admin_ac', password='p', is_staff=True))
+
+    def get(self, url, **params):
+        return self.api.get(url, params)
+
+    def test_prefix_ignores_formatting(self):
+        for q in ('12.345', '12345', '1234-5'):
+            data = self.get('/api/estudiantes/autocomplete/', q=q).json()
+            self.assertEqual([row['id'] for row in data], [self.mine.pk, self.other.pk], q)
+        data = self.get('/api/estudiantes/autocomplete/', q='12.345.678-5').json()
+        self.assertEqual(data, [{'id': self.mine.pk, 'rut': '12.345.678-5', 'nombre': 'Ana'}])
+        data = self.get('/api/furgones/autocomplete/', q='AB CD').json()
+        self.assertEqual(data, [{'id': self.furgon.pk, 'patente': 'ab-cd 12', 'modelo': 'Sprinter'}])
+
+    def test_range_scan_on_the_shadow_column(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.get('/api/estudiantes/autocomplete/', q='123')
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"rut_canonico" >= ', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_limit_and_errors(self):
+        self.assertEqual(len(self.get('/api/estudiantes/autocomplete/', q='1', limit=1).json()), 1)
+        self.assertEqual(self.get('/api/estudiantes/autocomplete/', q='.-').status_code, 400)
+        self.assertEqual(self.get('/api/estudiantes/autocomplete/', q='1', limit='x').status_code, 400)
+        self.assertEqual(self.get('/api/estudiantes/autocomplete/', q='1', limit=0).status_code, 400)
+
+    def test_scoped_to_the_user(self):
+        self.api.force_authenticate(self.apoderado)
+        data = self.get('/api/estudiantes/autocomplete/', q='12').json()
+        self.assertEqual([row['id'] for row in data], [self.mine.pk])
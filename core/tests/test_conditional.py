@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import versions
+from core.models import Conductor, Estudiante, Furgon, Sello
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin_cg', password='p', is_staff=True)
+        self.furgon = Furgon.objects.create(patente='CG-1')
+        self.estudiante = Estudiante.objects.create(rut='1-1', nombre='Uno', furgon=self.furgon)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def etag(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('no-cache', resp['Cache-Control'])
+        return resp['ETag']
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_list_and_detail_are_answered_from_the_stamps(self):
+        for url in ('/api/estudiantes/', f'/api/estudiantes/{self.estudiante.pk}/'):
+            etag = self.etag(url)
+            with self.assertNumQueries(1):  # the version stamps
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp['ETag'], etag)
+
+    def test_stamps_are_shared_by_every_process(self):
+        etag = self.etag('/api/estudiantes/')
+        cache.clear()  # the default cache is per process
+        self.assertEqual(self.revalidate('/api/estudiantes/', etag), 304)
+        # a write in another process (gps_server, a management command)
+        Sello.objects.filter(nombre='version:core.estudiante').update(valor=F('valor') + 1)
+        self.assertEqual(self.revalidate('/api/estudiantes/', etag), 200)
+
+    def test_saves_and_bulk_writes_change_the_etag(self):
+        url = '/api/estudiantes/'
+        etag = self.etag(url)
+        self.estudiante.nombre = 'Uno bis'
+        self.estudiante.save()
+        self.assertEqual(self.revalidate(url, etag), 200)
+
+        etag = self.etag(url)
+        self.client.post('/api/estudiantes/bulk/', [{'rut': '2-2', 'nombre': 'Dos'}], format='json')
+        self.assertEqual(self.revalidate(url, etag), 200)
+
+    def test_gps_fixes_only_invalidate_what_shows_positions(self):
+        furgones, estudiantes = self.etag('/api/furgones/'), self.etag('/api/estudiantes/')
+        expanded = self.etag('/api/estudiantes/?expand=furgon')
+        self.furgon.update_location(-33.4, -70.6)
+        self.assertEqual(self.revalidate('/api/furgones/', furgones), 200)
+        self.assertEqual(self.revalidate('/api/estudiantes/?expand=furgon', expanded), 200)
+        self.assertEqual(self.revalidate('/api/estudiantes/', estudiantes), 304)
+
+    def test_deleting_a_furgon_invalidates_the_rows_set_to_null(self):
+        etag = self.etag('/api/estudiantes/')
+        self.furgon.delete()
+        self.assertEqual(self.revalidate('/api/estudiantes/', etag), 200)
+
+    def test_etags_are_per_user(self):
+        etag = self.etag('/api/estudiantes/')
+        conductor_user = User.objects.create_user('cond_cg', password='p')
+        conductor_user.groups.add(Group.objects.create(name='Conductor'))
+        Conductor.objects.create(rut='98000000-1', nombre='Cond CG', user=conductor_user)
+        self.client.force_authenticate(user=conductor_user)
+        self.assertEqual(self.revalidate('/api/estudiantes/', etag), 200)
+
+    def test_if_modified_since(self):
+        with mock.patch.object(versions, 'LAST_MODIFIED_MIN_AGE', 0):
+            resp = self.client.get('/api/furgones/')
+            last_modified = resp['Last-Modified']
+            resp = self.client.get('/api/furgones/', HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(resp.status_code, 304)
+
+
+@override_settings(RESPONSE_CACHE_TTL=300)
+class PositionSliceTests(TestCase):
+    start = 1_700_000_000.25
+
+    def setUp(self):
+        cache.clear()
+        versions._stored_slices.clear()
+        self.addCleanup(versions._stored_slices.clear)
+        self.furgon = Furgon.objects.create(patente='PS-1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_ps', password='p', is_staff=True))
+        clock = mock.patch.object(versions, 'time')
+        self.clock = clock.start().time
+        self.addCleanup(clock.stop)
+        self.clock.return_value = self.start
+
+    def fix(self, latitude, second):
+        reported_at = timezone.make_aware(datetime(2025, 11, 20, 8, 30)) + timedelta(seconds=second)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.furgon.update_location(latitude, 0.0, reported_at)
+
+    def test_fixes_of_one_slice_write_the_stamp_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for second in range(3):
+                self.fix(1.0 + second, second)
+            writes = [q for q in ctx.captured_queries if 'INSERT' in q['sql'] and versions.POSITIONS in q['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(versions.stored([versions._key(versions.POSITIONS)]),
+                         {versions._key(versions.POSITIONS): self.start + 0.75})
+        self.clock.return_value = self.start + 1
+        self.fix(4.0, 3)
+        self.assertEqual(versions.stored([versions._key(versions.POSITIONS)]),
+                         {versions._key(versions.POSITIONS): self.start + 1.75})
+
+    def test_open_slice_is_neither_validated_nor_cached(self):
+        self.fix(1.0, 0)
+        resp = self.client.get('/api/furgones/')
+        self.assertNotIn('ETag', resp)
+        self.assertIn('no-cache', resp['Cache-Control'])
+        self.fix(2.0, 1)  # same slice: the stamp is not written again
+        self.assertEqual(self.client.get('/api/furgones/').json()['results'][0]['last_latitude'], 2.0)
+        self.clock.return_value = self.start + 1
+        etag = self.client.get('/api/furgones/')['ETag']
+        self.assertEqual(self.client.get('/api/furgones/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('admin_cp', password='p', is_staff=True)
+        self.client.login(username='admin_cp', password='p')
+        Furgon.objects.create(patente='CP-1')
+
+    def test_frontend_list_returns_304_until_a_change(self):
+        self.client.get('/furgones/')  # sets the CSRF cookie the ETag depends on
+        resp = self.client.get('/furgones/')
+        self.assertEqual(resp.status_code, 200)
+        etag = resp['ETag']
+        self.assertEqual(self.client.get('/furgones/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Furgon.objects.create(patente='CP-2')
+        self.assertEqual(self.client.get('/furgones/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
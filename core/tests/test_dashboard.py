@@ -0,0 +1,60 @@
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import dashboard
+from core.models import Colegio, Conductor, Estudiante, Furgon, Notificacion
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cond_user = User.objects.create_user('cond_db', password='p')
+        self.cond_user.groups.add(Group.objects.create(name='Conductor'))
+        conductor = Conductor.objects.create(rut='92000000-1', nombre='Cond DB', user=self.cond_user)
+        colegio = Colegio.objects.create(nombre='San Jorge')
+        self.mine = Furgon.objects.create(patente='DB-1', conductor=conductor, colegio=colegio)
+        Furgon.objects.create(patente='DB-2', colegio=colegio)
+        Estudiante.objects.create(rut='1-1', nombre='Pasajero', furgon=self.mine)
+        Notificacion.objects.create(furgon=self.mine, mensaje='mía')
+        Notificacion.objects.create(mensaje='general')
+
+    def test_global_counts_are_one_query_then_cached(self):
+        stamps = dashboard.current_stamps()
+        with self.assertNumQueries(1):
+            counts = dashboard.counts(stamps)
+        self.assertEqual((counts['furgones'], counts['colegios'], counts['estudiantes'], counts['pagos']), (2, 1, 1, 0))
+        with self.assertNumQueries(0):
+            dashboard.counts(stamps)
+        with self.assertNumQueries(1):  # the version stamps
+            dashboard.counts()
+        Furgon.objects.create(patente='DB-3')
+        self.assertEqual(dashboard.counts()['furgones'], 3)
+
+    def test_user_counts_follow_the_role_and_writes(self):
+        self.assertEqual(dashboard.my_furgones_count(self.cond_user), 1)
+        self.assertEqual(dashboard.unread_notifications_count(self.cond_user), 1)
+        Notificacion.objects.get(mensaje='mía').marcar_como_leida()
+        self.assertEqual(dashboard.unread_notifications_count(self.cond_user), 0)
+        admin = User.objects.create_user('admin_db', password='p', is_staff=True)
+        self.assertEqual(dashboard.unread_notifications_count(admin), 1)
+        self.assertEqual(dashboard.my_furgones_count(admin), 0)
+
+    def test_top_colegios(self):
+        Colegio.objects.create(nombre='Alemán')
+        self.assertEqual(
+            [(c['nombre'], c['num_furgones']) for c in dashboard.top_colegios()],
+            [('San Jorge', 2), ('Alemán', 0)],
+        )
+
+    def test_home_page_does_not_query_the_tables_when_warm(self):
+        self.client.force_login(self.cond_user)
+        first = self.client.get('/')
+        self.assertContains(first, 'Total: 2')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/')
+        core = [q['sql'] for q in ctx.captured_queries if 'core_' in q['sql']]
+        self.assertEqual(len(core), 1)  # the version stamps, shared by the counters
+        self.assertIn('core_sello', core[0])
@@ -0,0 +1,77 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import eta, live, versions
+from core.models import EstadoFurgon, Furgon, Ruta, ParadaRuta, TiempoTramo
+
+# three stops ~1.1 km apart heading north
+STOPS = [(-38.750, -72.6), (-38.740, -72.6), (-38.730, -72.6)]
+
+
+class EtaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        live.positions().clear()
+        self.furgon = Furgon.objects.create(patente='ETA-1')
+        self.ruta = Ruta.objects.create(furgon=self.furgon, tipo_ruta='ida')
+        for orden, (lat, lon) in enumerate(STOPS, start=1):
+            ParadaRuta.objects.create(ruta=self.ruta, orden=orden, nombre=f'P{orden}', latitude=lat, longitude=lon)
+        self.t0 = timezone.now() - timedelta(minutes=30)
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_geo', password='x', is_staff=True))
+
+    def test_segment_time_is_learned_between_consecutive_stops(self):
+        self.furgon.update_location(*STOPS[0], reported_at=self.t0)
+        self.furgon.update_location(-38.745, -72.6, reported_at=self.t0 + timedelta(seconds=60))
+        self.furgon.update_location(*STOPS[1], reported_at=self.t0 + timedelta(seconds=200))
+        tramo = TiempoTramo.objects.get(ruta=self.ruta, orden_desde=1)
+        self.assertEqual(tramo.segundos_promedio, 200)
+        self.assertEqual(tramo.muestras, 1)
+
+    def test_eta_uses_historical_segments_and_is_cached(self):
+        TiempoTramo.objects.create(ruta=self.ruta, orden_desde=2, segundos_promedio=300, muestras=4)
+        self.furgon.update_location(*STOPS[0], reported_at=self.t0)
+        self.furgon.update_location(*STOPS[1], reported_at=self.t0 + timedelta(seconds=120))
+        result = eta.compute_eta(self.furgon.pk)
+        self.assertEqual([p['orden'] for p in result['paradas']], [3])
+        # at stop 2 with a 300 s historical segment to stop 3
+        self.assertAlmostEqual(result['paradas'][0]['segundos'], 300, delta=1)
+        with self.assertNumQueries(1):  # the route stamps
+            self.assertEqual(eta.compute_eta(self.furgon.pk), result)
+
+    def test_route_changes_by_other_processes_are_seen(self):
+        self.furgon.update_location(-38.755, -72.6, reported_at=self.t0)
+        self.assertEqual(len(eta.compute_eta(self.furgon.pk)['paradas']), 3)
+        # as another process would: no signal reaches this one, the stamp is shared
+        ParadaRuta.objects.filter(ruta=self.ruta, orden=3).delete()
+        versions.bump(ParadaRuta)
+        self.assertEqual(len(eta.compute_eta(self.furgon.pk)['paradas']), 2)
+
+    def test_progress_is_shared_between_processes(self):
+        self.furgon.update_location(*STOPS[0], reported_at=self.t0)
+        cache.clear()  # another process: nothing cached locally
+        self.furgon.update_location(*STOPS[1], reported_at=self.t0 + timedelta(seconds=200))
+        self.assertEqual(TiempoTramo.objects.get(ruta=self.ruta, orden_desde=1).segundos_promedio, 200)
+        self.assertEqual(EstadoFurgon.objects.get(furgon=self.furgon).eta['last_stop'], 1)
+        self.assertEqual([p['orden'] for p in eta.compute_eta(self.furgon.pk)['paradas']], [3])
+
+    def test_eta_endpoint(self):
+        self.furgon.update_location(-38.755, -72.6, reported_at=self.t0)
+        resp = self.client.get(f'/api/furgones/{self.furgon.pk}/eta/')
+        self.assertEqual(resp.status_code, 200)
+        paradas = resp.json()['paradas']
+        self.assertEqual([p['orden'] for p in paradas], [1, 2, 3])
+        self.assertLess(paradas[0]['segundos'], paradas[1]['segundos'])
+
+    def test_no_active_route_returns_404(self):
+        self.ruta.hora_inicio = time(0, 0)
+        self.ruta.hora_termino = time(0, 1)
+        self.ruta.save()
+        self.furgon.update_location(-38.755, -72.6, reported_at=timezone.now().replace(hour=12))
+        resp = self.client.get(f'/api/furgones/{self.furgon.pk}/eta/')
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,94 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import views
+from core.fastread import compile_encoder
+from core.models import (
+    Asistencia, Colegio, Conductor, Estudiante, Furgon, Notificacion, Pago, ParadaRuta, Ruta
+)
+from core.serializers import EstudianteSerializer
+
+VIEWSETS = {
+    '/api/colegios/': views.ColegioViewSet,
+    '/api/conductores/': views.ConductorViewSet,
+    '/api/furgones/': views.FurgonViewSet,
+    '/api/estudiantes/': views.EstudianteViewSet,
+    '/api/rutas/': views.RutaViewSet,
+    '/api/paradas/': views.ParadaRutaViewSet,
+    '/api/notificaciones/': views.NotificacionViewSet,
+    '/api/pagos/': views.PagoViewSet,
+    '/api/asistencias/': views.AsistenciaViewSet,
+}
+
+
+# both code paths must run: no cached responses
+@override_settings(RESPONSE_CACHE_TTL=0)
+class FastListSerializationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_fr', password='p', is_staff=True))
+        colegio = Colegio.objects.create(
+            nombre='Colegio Ñuñoa', horario_entrada=time(8, 0), horario_salida=time(16, 30, 15),
+            latitude=-38.7359, longitude=-72.5904,
+        )
+        conductor = Conductor.objects.create(rut='98000000-1', nombre='José', fecha_vencimiento_licencia=date(2026, 1, 31))
+        furgon = Furgon.objects.create(
+            patente='FR-1', conductor=conductor, colegio=colegio, fecha_revision_tecnica=date(2025, 6, 1),
+        )
+        furgon.update_location(-38.7001234, -72.6000001, timezone.now() - timedelta(microseconds=1234))
+        Furgon.objects.create(patente='FR-2')
+        for i in range(5):
+            est = Estudiante.objects.create(rut=f'{i}-9', nombre=f'Estudiante «{i}»', furgon=furgon if i % 2 else None)
+            Pago.objects.create(estudiante=est, monto=Decimal('12345.5') + i, fecha=date(2025, 3, i + 1))
+            Asistencia.objects.create(estudiante=est, fecha=date(2025, 3, 3), estado='presente', furgon=furgon)
+            Notificacion.objects.create(estudiante=est, mensaje=f'línea {i} "citada"')
+        ruta = Ruta.objects.create(furgon=furgon, hora_inicio=time(7, 15))
+        for orden in range(3):
+            ParadaRuta.objects.create(ruta=ruta, orden=orden, nombre=f'P{orden}', latitude=-38.7 + orden / 1000, longitude=-72.6)
+
+    def render(self, url, fast):
+        viewset = VIEWSETS[url.split('?')[0]]
+        with mock.patch.object(viewset, 'fast_list', fast):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp.content
+
+    def test_output_is_byte_identical_to_the_serializers(self):
+        for url in VIEWSETS:
+            with self.subTest(url=url):
+                self.assertEqual(self.render(url, True), self.render(url, False))
+
+    def test_sparse_fields_and_pages_are_byte_identical(self):
+        for url in ('/api/pagos/?fields=monto,id&page_size=2', '/api/furgones/?fields=patente,last_reported_at'):
+            with self.subTest(url=url):
+                self.assertEqual(self.render(url, True), self.render(url, False))
+        first = self.client.get('/api/asistencias/?page_size=2').json()
+        with mock.patch.object(views.AsistenciaViewSet, 'fast_list', False):
+            slow = self.client.get(first['next']).content
+        self.assertEqual(self.client.get(first['next']).content, slow)
+
+    def test_list_is_one_query_without_model_instances(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/estudiantes/')
+        # + the version stamps (core.versions)
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_expand_and_custom_serializers_use_the_serializer(self):
+        data = self.client.get('/api/estudiantes/?expand=furgon').json()
+        self.assertIsInstance(data['results'][1]['furgon'], dict)
+
+        class Custom(EstudianteSerializer):
+            def get_fields(self):
+                fields = super().get_fields()
+                fields['extra'] = fields['nombre'].__class__(source='furgon.patente', read_only=True)
+                return fields
+
+        self.assertIsNone(compile_encoder(Custom))
@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import Colegio, Conductor, Estudiante, Furgon, ParadaRuta, Ruta
+
+
+class FieldsetsAndExpansionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_fs', password='p', is_staff=True))
+        self.colegio = Colegio.objects.create(nombre='Colegio FS')
+        for i in range(6):
+            conductor = Conductor.objects.create(rut=f'95{i}-1', nombre=f'Cond {i}')
+            furgon = Furgon.objects.create(patente=f'FS-{i}', conductor=conductor, colegio=self.colegio)
+            Estudiante.objects.create(rut=f'96{i}-1', nombre=f'Est {i}', furgon=furgon)
+            ruta = Ruta.objects.create(furgon=furgon)
+            for orden in range(3):
+                ParadaRuta.objects.create(ruta=ruta, orden=orden, nombre=f'P{orden}', latitude=-38.7, longitude=-72.6)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        # without the version stamps (core.versions)
+        return resp.json(), [q for q in ctx.captured_queries if 'core_sello' not in q['sql']]
+
+    def test_fields_limit_the_response_and_the_selected_columns(self):
+        data, queries = self.get('/api/furgones/?fields=id,patente')
+        self.assertEqual(set(data['results'][0]), {'id', 'patente'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('capacidad_maxima', queries[0]['sql'])
+
+    def test_expand_inlines_related_objects_in_one_query(self):
+        data, queries = self.get('/api/furgones/?expand=conductor,colegio')
+        self.assertEqual(len(queries), 1)
+        first = data['results'][0]
+        self.assertEqual(first['conductor']['nombre'], 'Cond 0')
+        self.assertEqual(first['colegio']['nombre'], 'Colegio FS')
+
+    def test_nested_expansion_and_fields(self):
+        data, queries = self.get('/api/estudiantes/?fields=id,nombre&expand=furgon.conductor')
+        self.assertEqual(len(queries), 1)
+        first = data['results'][0]
+        self.assertEqual(set(first), {'id', 'nombre', 'furgon'})
+        self.assertEqual(first['furgon']['patente'], 'FS-0')
+        self.assertEqual(first['furgon']['conductor']['rut'], '950-1')
+
+    def test_reverse_relations_are_prefetched(self):
+        data, queries = self.get('/api/rutas/?expand=paradas')
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([p['orden'] for p in data['results'][0]['paradas']], [0, 1, 2])
+
+    def test_retrieve_and_unknown_names(self):
+        furgon = Furgon.objects.get(patente='FS-1')
+        data, _ = self.get(f'/api/furgones/{furgon.pk}/?fields=patente&expand=conductor')
+        self.assertEqual(data, {'patente': 'FS-1', 'conductor': data['conductor']})
+        self.assertEqual(data['conductor']['nombre'], 'Cond 1')
+        self.assertEqual(self.client.get('/api/furgones/?fields=nope').status_code, 400)
+        self.assertEqual(self.client.get('/api/furgones/?expand=estudiantes').status_code, 400)
+
+    def test_writes_ignore_the_parameters(self):
+        resp = self.client.post(
+            '/api/furgones/?fields=id&expand=conductor', {'patente': 'FS-NEW', 'colegio': self.colegio.pk}, format='json'
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()['colegio'], self.colegio.pk)
@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import search
+from core.models import Asistencia, Estudiante, Pago
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class FrontendKeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('admin_fp', password='p', is_staff=True))
+        estudiantes = Estudiante.objects.bulk_create([Estudiante(rut=f'{i}-1', nombre=f'E{i:02d}') for i in range(9)])
+        search.index(Estudiante, estudiantes, created=True)
+        # ties on fecha: five estudiantes per day
+        Asistencia.objects.bulk_create([
+            Asistencia(estudiante=e, fecha=date(2025, 3, 1) + timedelta(days=d), estado='presente')
+            for d in range(5) for e in estudiantes
+        ])
+
+    def walk(self, url):
+        pages = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            pages.append(resp.context['page_obj'])
+            url = pages[-1].next_url and url.split('?')[0] + pages[-1].next_url
+        return pages
+
+    def test_pages_follow_the_keyset_order_without_gaps(self):
+        pages = self.walk('/asistencias/')
+        self.assertEqual([len(p) for p in pages], [20, 20, 5])
+        ids = [a.pk for p in pages for a in p]
+        self.assertEqual(ids, list(Asistencia.objects.order_by('-fecha', 'id').values_list('pk', flat=True)))
+        back = self.client.get('/asistencias/' + pages[-1].previous_url).context['page_obj']
+        self.assertEqual([a.pk for a in back], [a.pk for a in pages[1]])
+
+    def test_pagos_without_fecha_come_last_in_both_directions(self):
+        estudiante = Estudiante.objects.first()
+        # every third pago has no fecha; ties on the others
+        Pago.objects.bulk_create([
+            Pago(estudiante=estudiante, monto=Decimal(i), fecha=None if i % 3 == 0 else date(2025, 3, 1 + i % 4))
+            for i in range(45)
+        ])
+        pages = self.walk('/pagos/')
+        self.assertEqual([len(p) for p in pages], [20, 20, 5])
+        pagos = [pago for p in pages for pago in p]
+        dated = sorted((p for p in pagos if p.fecha), key=lambda p: (p.fecha, p.pk), reverse=True)
+        undated = sorted((p for p in pagos if not p.fecha), key=lambda p: p.pk, reverse=True)
+        self.assertEqual([p.pk for p in pagos], [p.pk for p in dated + undated])
+        for index in (1, 0):
+            url = '/pagos/' + pages[index + 1].previous_url
+            back = self.client.get(url).context['page_obj']
+            self.assertEqual([p.pk for p in back], [p.pk for p in pages[index]])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        pages = self.walk('/asistencias/')
+        counts = []
+        for url in ('/asistencias/', '/asistencias/' + pages[1].next_url):
+            cache.clear()
+            self.client.get(url)  # the estimated count is cached
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'] or 'OFFSET' in q['sql']])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_estimated_total_and_search_keep_the_cursor_links(self):
+        resp = self.client.get('/asistencias/', {'q': 'E0'})
+        self.assertContains(resp, 'Aprox. 45 registros')
+        self.assertIn('q=E0', resp.context['page_obj'].next_url)
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/asistencias/', {'cursor': 'nope'}).status_code, 404)
@@ -22,3 +22,13 @@ class FrontendSmokeTests(TestCase):
         r = self.client.get('/colegios/')
         # should redirect to login
         self.assertIn(r.status_code, (200, 302))
+
+    def test_detail_page_shows_fields_and_relations(self):
+        from core.models import Colegio, Furgon
+        self.client.force_login(User.objects.create_user('ui_admin', password='pass', is_staff=True))
+        colegio = Colegio.objects.create(nombre='San Jorge')
+        furgon = Furgon.objects.create(patente='SM-1', colegio=colegio)
+        r = self.client.get(f'/furgones/{furgon.pk}/')
+        self.assertContains(r, 'SM-1')
+        self.assertContains(r, 'San Jorge')
+        self.assertContains(r, 'No hay estudiantes asignados')
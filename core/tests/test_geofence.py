@@ -0,0 +1,129 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import geofence, live, versions
+from core.models import Cambio, Colegio, EstadoFurgon, Furgon, Notificacion, ParadaRuta, Ruta
+
+COLEGIO = (-38.7400, -72.6000)
+
+
+def fix(furgon, lat, lon, at):
+    return {'furgon': furgon.pk, 'latitude': lat, 'longitude': lon, 'reported_at': at}
+
+
+class GeofenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        live.positions().clear()
+        self.colegio = Colegio.objects.create(nombre='San Jorge', latitude=COLEGIO[0], longitude=COLEGIO[1], radio_geocerca=100)
+        self.furgon = Furgon.objects.create(patente='GEO-1')
+        self.t0 = timezone.now() - timedelta(hours=1)
+
+    def eventos(self):
+        return list(Notificacion.objects.filter(tipo='evento').order_by('pk').values_list('mensaje', flat=True))
+
+    def test_enter_and_exit_create_notifications(self):
+        geofence.observe_fixes([
+            fix(self.furgon, -38.7450, -72.6, self.t0),
+            fix(self.furgon, -38.7401, -72.6, self.t0 + timedelta(seconds=60)),
+            fix(self.furgon, -38.7350, -72.6, self.t0 + timedelta(seconds=300)),
+        ])
+        eventos = self.eventos()
+        self.assertEqual(len(eventos), 2)
+        self.assertIn('GEO-1 llegó a San Jorge', eventos[0])
+        self.assertIn('GEO-1 salió de San Jorge', eventos[1])
+
+    def test_jitter_around_the_border_does_not_flood(self):
+        # 100 m radius, exit only beyond 150 m: alternating 95 m / 120 m stays inside
+        fixes = [fix(self.furgon, -38.7400 - (0.00085 if i % 2 else 0.00108), -72.6, self.t0 + timedelta(seconds=10 * i))
+                 for i in range(1, 30)]
+        geofence.observe_fixes(fixes)
+        self.assertEqual(len(self.eventos()), 1)
+
+    def test_quick_reenter_is_silent(self):
+        geofence.observe_fixes([
+            fix(self.furgon, *COLEGIO, self.t0),
+            fix(self.furgon, -38.7420, -72.6, self.t0 + timedelta(seconds=30)),  # ~220 m: exit
+            fix(self.furgon, *COLEGIO, self.t0 + timedelta(seconds=60)),  # back within cooldown
+            fix(self.furgon, -38.7420, -72.6, self.t0 + timedelta(seconds=90)),
+        ])
+        self.assertEqual(len(self.eventos()), 2)
+
+    def test_late_fixes_are_ignored(self):
+        geofence.observe_fix(self.furgon.pk, -38.7450, -72.6, self.t0 + timedelta(minutes=5))
+        geofence.observe_fix(self.furgon.pk, *COLEGIO, self.t0)
+        self.assertEqual(self.eventos(), [])
+
+    def test_route_stop_only_applies_to_its_furgon(self):
+        otro = Furgon.objects.create(patente='GEO-2')
+        ruta = Ruta.objects.create(furgon=self.furgon, tipo_ruta='ida')
+        ParadaRuta.objects.create(ruta=ruta, orden=1, nombre='Plaza', latitude=-38.7600, longitude=-72.6)
+        geofence.observe_fixes([
+            fix(self.furgon, -38.7600, -72.6, self.t0),
+            fix(otro, -38.7600, -72.6, self.t0),
+        ])
+        notificaciones = Notificacion.objects.filter(tipo='evento')
+        self.assertEqual([(n.furgon_id, n.mensaje[:25]) for n in notificaciones], [(self.furgon.pk, 'El furgón GEO-1 llegó a P')])
+
+    def test_index_is_rebuilt_after_colegio_changes(self):
+        geofence.get_index()
+        self.colegio.latitude = -38.8
+        self.colegio.save()
+        geofence.observe_fix(self.furgon.pk, -38.8, -72.6, self.t0)
+        self.assertEqual(len(self.eventos()), 1)
+
+    def test_index_follows_changes_made_by_other_processes(self):
+        geofence.get_index()
+        # as another process would: no signal reaches this one, the stamp is shared
+        Colegio.objects.filter(pk=self.colegio.pk).update(latitude=-38.8)
+        versions.bump(Colegio)
+        geofence.observe_fix(self.furgon.pk, -38.8, -72.6, self.t0)
+        self.assertEqual(len(self.eventos()), 1)
+
+    def test_state_is_shared_between_processes(self):
+        geofence.observe_fix(self.furgon.pk, *COLEGIO, self.t0)
+        cache.clear()  # another process: nothing cached locally
+        geofence.observe_fix(self.furgon.pk, *COLEGIO, self.t0 + timedelta(seconds=30))
+        geofence.observe_fix(self.furgon.pk, -38.7420, -72.6, self.t0 + timedelta(seconds=60))
+        eventos = self.eventos()
+        self.assertEqual(len(eventos), 2)
+        self.assertIn('salió de San Jorge', eventos[1])
+        self.assertEqual(EstadoFurgon.objects.get(furgon=self.furgon).geocerca['inside'], {})
+
+    def test_old_state_is_discarded(self):
+        geofence.observe_fix(self.furgon.pk, *COLEGIO, self.t0 - timedelta(days=1))
+        geofence.observe_fix(self.furgon.pk, *COLEGIO, self.t0)
+        self.assertEqual(len(self.eventos()), 2)
+
+    def test_bulk_ingest_writes_events_in_one_insert(self):
+        furgones = [Furgon.objects.create(patente=f'GB-{i}') for i in range(10)]
+        admin = User.objects.create_user(username='geoadmin', password='pass', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        payload = [{'furgon': f.pk, 'latitude': COLEGIO[0], 'longitude': COLEGIO[1], 'reported_at': self.t0.isoformat()}
+                   for f in furgones]
+        resp = client.post('/api/furgones/bulk_update_location/', payload, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(self.eventos()), 10)
+        # warm caches: owners + history + UPDATE + re-read + positions stamp + route stamps + fence stamps
+        # + states + patentes + notifications INSERT + journal INSERT + notifications stamp + states upsert
+        payload = [dict(item, latitude=-38.75, reported_at=(self.t0 + timedelta(minutes=5)).isoformat()) for item in payload]
+        with self.assertNumQueries(13):
+            client.post('/api/furgones/bulk_update_location/', payload, format='json')
+        self.assertEqual(len(self.eventos()), 20)
+
+    def test_backend_without_returning_bulk_inserts(self):
+        # MySQL: bulk_create leaves the pks unset
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            created = geofence.observe_fixes([fix(self.furgon, *COLEGIO, self.t0)])
+        self.assertEqual(len(created), 1)
+        self.assertIsNotNone(created[0].pk)
+        self.assertEqual(list(Cambio.objects.filter(modelo='notificacion').values_list('objeto_id', flat=True)),
+                         [created[0].pk])
@@ -0,0 +1,153 @@
+from datetime import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User, Group
+from core import eta, geofence, gps, live, versions
+from core.models import Conductor, Furgon, Colegio
+
+
+class BulkLocationTests(TestCase):
+    url = '/api/furgones/bulk_update_location/'
+
+    def setUp(self):
+        cond_group, _ = Group.objects.get_or_create(name='Conductor')
+
+        self.admin = User.objects.create_user('admin_bulk', password='a')
+        self.admin.is_staff = True
+        self.admin.save()
+
+        self.cond_user = User.objects.create_user('cond_bulk', password='c')
+        self.cond_user.groups.add(cond_group)
+
+        self.cole = Colegio.objects.create(nombre='Cole Bulk')
+        self.conductor = Conductor.objects.create(rut='94000000-1', nombre='Cond B', user=self.cond_user)
+        self.own = Furgon.objects.create(patente='BULK-1', conductor=self.conductor, colegio=self.cole)
+        self.other = Furgon.objects.create(patente='BULK-2', colegio=self.cole)
+
+        self.client = APIClient()
+
+    def test_admin_applies_many_furgones_with_constant_queries(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.admin)
+        extra = [Furgon.objects.create(patente=f'BULK-X{i}') for i in range(10)]
+        # no ruta, stop nor segment written yet
+        versions.stamps(geofence.INDEX_DEPENDENCIES + eta.ROUTE_DEPENDENCIES)
+        payload = [
+            {'furgon': f.pk, 'latitude': -38.7, 'longitude': -72.6, 'reported_at': '2025-11-20T08:30:00'}
+            for f in extra
+        ]
+        # select owners + history INSERT + single UPDATE + re-read of the updated rows
+        # + positions stamp + route stamps and rutas lookup for ETA + fence stamps and
+        # geofence index (cached afterwards), regardless of the number of furgones
+        with self.assertNumQueries(9):
+            resp = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['applied'], 10)
+        self.assertEqual(Furgon.objects.filter(last_latitude=-38.7).count(), 10)
+
+    def test_newest_fix_per_furgon_wins(self):
+        self.client.force_authenticate(user=self.admin)
+        payload = {'fixes': [
+            {'furgon': self.own.pk, 'latitude': 2.0, 'longitude': 2.0, 'reported_at': '2025-11-20T08:31:00'},
+            {'furgon': self.own.pk, 'latitude': 1.0, 'longitude': 1.0, 'reported_at': '2025-11-20T08:30:00'},
+        ]}
+        resp = self.client.post(self.url, payload, format='json')
+        statuses = [r['status'] for r in resp.json()['results']]
+        self.assertEqual(statuses, ['applied', 'superseded'])
+        self.own.refresh_from_db()
+        self.assertEqual(self.own.last_latitude, 2.0)
+
+    def test_conductor_only_updates_own_furgon_and_gets_per_item_errors(self):
+        self.client.force_authenticate(user=self.cond_user)
+        payload = [
+            {'furgon': self.own.pk, 'latitude': -38.7, 'longitude': -72.6},
+            {'furgon': self.other.pk, 'latitude': -38.7, 'longitude': -72.6},
+            {'furgon': 999999, 'latitude': -38.7, 'longitude': -72.6},
+            {'furgon': self.own.pk, 'latitude': 'nope'},
+        ]
+        resp = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()['results']
+        self.assertEqual([r['status'] for r in results], ['applied', 'error', 'error', 'error'])
+        self.other.refresh_from_db()
+        self.assertIsNone(self.other.last_latitude)
+
+    def test_rejects_non_list_payload(self):
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.post(self.url, {'latitude': 1}, format='json')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_anonymous_cannot_ingest(self):
+        resp = self.client.post(self.url, [{'furgon': self.own.pk, 'latitude': 1, 'longitude': 1}], format='json')
+        self.assertIn(resp.status_code, (401, 403))
+
+
+class OutOfOrderLocationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin_ooo', password='a', is_staff=True)
+        self.furgon = Furgon.objects.create(patente='OOO-1', capacidad_actual=3)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _single(self, lat, reported_at):
+        return self.client.post(
+            f'/api/furgones/{self.furgon.pk}/update_location/',
+            {'latitude': lat, 'longitude': 0.0, 'reported_at': reported_at},
+            format='json',
+        )
+
+    def test_stale_and_duplicate_single_fixes_are_rejected(self):
+        self.assertEqual(self._single(1.0, '2025-11-20T08:30:10').status_code, 200)
+        stale = self._single(2.0, '2025-11-20T08:30:00')
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()['status'], 'stale')
+        dup = self._single(3.0, '2025-11-20T08:30:10')
+        self.assertEqual(dup.json()['status'], 'duplicate')
+        self.furgon.refresh_from_db()
+        self.assertEqual(self.furgon.last_latitude, 1.0)
+
+    def test_location_write_does_not_touch_other_columns(self):
+        stale_copy = Furgon.objects.get(pk=self.furgon.pk)
+        Furgon.objects.filter(pk=self.furgon.pk).update(capacidad_actual=7)
+        stale_copy.update_location(1.0, 1.0)
+        self.furgon.refresh_from_db()
+        self.assertEqual(self.furgon.capacidad_actual, 7)
+        self.assertEqual(self.furgon.last_latitude, 1.0)
+
+    def test_bulk_reports_stale_and_duplicate(self):
+        self._single(1.0, '2025-11-20T08:30:10')
+        payload = [
+            {'furgon': self.furgon.pk, 'latitude': 2.0, 'longitude': 0.0, 'reported_at': '2025-11-20T08:30:00'},
+            {'furgon': self.furgon.pk, 'latitude': 3.0, 'longitude': 0.0, 'reported_at': '2025-11-20T08:30:10'},
+            {'furgon': self.furgon.pk, 'latitude': 4.0, 'longitude': 0.0, 'reported_at': '2025-11-20T08:30:20'},
+            {'furgon': self.furgon.pk, 'latitude': 5.0, 'longitude': 0.0, 'reported_at': '2025-11-20T08:30:20'},
+        ]
+        resp = self.client.post('/api/furgones/bulk_update_location/', payload, format='json')
+        statuses = [r['status'] for r in resp.json()['results']]
+        self.assertEqual(statuses, ['stale', 'duplicate', 'duplicate', 'applied'])
+        self.furgon.refresh_from_db()
+        self.assertEqual(self.furgon.last_latitude, 5.0)
+
+    def test_fix_overtaken_by_a_concurrent_write_is_stale(self):
+        live.positions().clear()
+        newer = timezone.make_aware(datetime(2025, 11, 20, 8, 31))
+        read_owners = gps.allowed_furgon_ids
+
+        def read_then_write(user, furgon_ids):
+            found = read_owners(user, furgon_ids)
+            # another request writes a newer fix before this one's UPDATE
+            Furgon.objects.filter(pk=self.furgon.pk).update(last_latitude=9.0, last_reported_at=newer)
+            return found
+
+        payload = [{'furgon': self.furgon.pk, 'latitude': 2.0, 'longitude': 0.0, 'reported_at': '2025-11-20T08:30:00'}]
+        with mock.patch.object(gps, 'allowed_furgon_ids', read_then_write):
+            resp = self.client.post('/api/furgones/bulk_update_location/', payload, format='json')
+        self.assertEqual([r['status'] for r in resp.json()['results']], ['stale'])
+        self.assertEqual(resp.json()['applied'], 0)
+        self.assertIsNone(live.positions().get(self.furgon.pk))
+        self.furgon.refresh_from_db()
+        self.assertEqual(self.furgon.last_latitude, 9.0)
@@ -0,0 +1,61 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+
+from core.models import Furgon, PosicionFurgon, history_bucket
+
+
+class GpsHistoryTests(TestCase):
+    def setUp(self):
+        self.furgon = Furgon.objects.create(patente='HIST-1')
+        self.admin = User.objects.create_user('admin_hist', password='a', is_staff=True)
+        self.client = APIClient()
+
+    def test_single_update_appends_history(self):
+        now = timezone.now()
+        self.furgon.update_location(-38.7, -72.6, reported_at=now)
+        self.furgon.update_location(-38.8, -72.7, reported_at=now + timedelta(seconds=5))
+        points = list(self.furgon.posiciones.order_by('reported_at').values_list('latitude', flat=True))
+        self.assertEqual(points, [-38.7, -38.8])
+        self.assertEqual(self.furgon.posiciones.first().bucket, history_bucket(now))
+
+    def test_bulk_ingest_appends_all_points_and_ignores_duplicates(self):
+        self.client.force_authenticate(user=self.admin)
+        payload = [
+            {'furgon': self.furgon.pk, 'latitude': 1.0, 'longitude': 1.0, 'reported_at': '2025-11-20T08:30:00'},
+            {'furgon': self.furgon.pk, 'latitude': 2.0, 'longitude': 2.0, 'reported_at': '2025-11-20T08:30:05'},
+        ]
+        self.client.post('/api/furgones/bulk_update_location/', payload, format='json')
+        self.client.post('/api/furgones/bulk_update_location/', payload, format='json')
+        self.assertEqual(PosicionFurgon.objects.filter(furgon=self.furgon).count(), 2)
+        self.assertEqual(set(PosicionFurgon.objects.values_list('bucket', flat=True)), {20251120})
+
+    def _point(self, when):
+        return PosicionFurgon.from_fix(self.furgon.pk, 0.0, 0.0, when)
+
+    def test_retention_drops_old_buckets(self):
+        now = timezone.now()
+        PosicionFurgon.objects.bulk_create([
+            self._point(now - timedelta(days=200)),
+            self._point(now - timedelta(days=1)),
+        ])
+        call_command('gps_retention', '--keep-days', '90', stdout=StringIO())
+        self.assertEqual(PosicionFurgon.objects.count(), 1)
+
+    def test_downsample_keeps_one_point_per_interval(self):
+        start = timezone.now().replace(second=0, microsecond=0) - timedelta(days=10)
+        PosicionFurgon.objects.bulk_create([self._point(start + timedelta(seconds=5 * i)) for i in range(24)])
+        recent = self._point(timezone.now())
+        recent.save()
+        call_command(
+            'gps_retention', '--keep-days', '90', '--downsample-after-days', '7', '--interval', '60',
+            stdout=StringIO(),
+        )
+        # 24 points every 5s span two minutes -> one point per minute is kept
+        self.assertEqual(PosicionFurgon.objects.exclude(pk=recent.pk).count(), 2)
+        self.assertTrue(PosicionFurgon.objects.filter(pk=recent.pk).exists())
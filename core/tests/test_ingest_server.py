@@ -0,0 +1,156 @@
+import asyncio
+
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TransactionTestCase
+from django.contrib.auth.models import User, Group
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import live, tokens
+from core.ingest_server import GpsIngestServer, authenticate_token, parse_line
+from core.models import Conductor, Furgon, PosicionFurgon
+
+
+class ParseLineTests(SimpleTestCase):
+    def test_json_and_csv_lines(self):
+        self.assertEqual(parse_line('{"furgon": 1, "latitude": 2, "longitude": 3}')['furgon'], 1)
+        item = parse_line('4,-38.7,-72.6,2025-11-20T08:30:00\n')
+        self.assertEqual(item, {'furgon': '4', 'latitude': '-38.7', 'longitude': '-72.6',
+                                'reported_at': '2025-11-20T08:30:00'})
+        self.assertIsNone(parse_line('garbage'))
+
+
+class IngestServerTests(TransactionTestCase):
+    def setUp(self):
+        live.positions().clear()
+        cond_group, _ = Group.objects.get_or_create(name='Conductor')
+        self.cond_user = User.objects.create_user('cond_srv', password='p')
+        self.cond_user.groups.add(cond_group)
+        conductor = Conductor.objects.create(rut='96000000-1', nombre='Cond Srv', user=self.cond_user)
+        self.own = Furgon.objects.create(patente='SRV-1', conductor=conductor)
+        self.other = Furgon.objects.create(patente='SRV-2')
+
+    def test_authenticate_token_scopes_conductor(self):
+        _, allowed = authenticate_token(str(AccessToken.for_user(self.cond_user)))
+        self.assertEqual(allowed, {self.own.pk})
+        with self.assertRaises(PermissionError):
+            authenticate_token('not-a-token')
+
+    def test_end_to_end_batches_fixes(self):
+        token = str(AccessToken.for_user(self.cond_user))
+        lines = [f'{self.own.pk},-38.{700 + i},-72.6,2025-11-20T08:30:{i:02d}' for i in range(20)]
+        lines.append(f'{self.other.pk},-38.7,-72.6')
+
+        async def scenario():
+            server = GpsIngestServer(batch_size=8, flush_interval=0.05)
+            await server.start('127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            writer.write(f'AUTH {token}\n'.encode())
+            greeting = await reader.readline()
+            writer.write(('\n'.join(lines) + '\n').encode())
+            await writer.drain()
+            error = await reader.readline()
+            writer.close()
+            await server.stop()
+            return greeting, error, server.stats
+
+        greeting, error, stats = asyncio.run(scenario())
+        self.assertEqual(greeting, b'OK\n')
+        self.assertTrue(error.startswith(b'ERR 21 No autorizado'))
+        self.assertEqual(stats['flushed'], 20)
+        self.assertGreaterEqual(stats['batches'], 3)
+        self.assertEqual(PosicionFurgon.objects.filter(furgon=self.own).count(), 20)
+        self.own.refresh_from_db()
+        self.assertAlmostEqual(self.own.last_latitude, -38.719)
+
+    def test_rejects_bad_auth(self):
+        async def scenario():
+            server = GpsIngestServer()
+            await server.start('127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            writer.write(b'AUTH nope\n')
+            answer = await reader.readline()
+            writer.close()
+            await server.stop()
+            return answer
+
+        self.assertTrue(asyncio.run(scenario()).startswith(b'ERR'))
+
+    def test_revoked_token_is_rejected(self):
+        token = str(tokens.add_role_claims(AccessToken.for_user(self.cond_user), self.cond_user))
+        tokens.revoke([self.cond_user.pk])
+        with self.assertRaisesMessage(PermissionError, 'token revocado'):
+            authenticate_token(token)
+
+
+class ServerLifecycleTests(SimpleTestCase):
+    def run_server(self, lines, authenticate, flush, **options):
+        options.setdefault('batch_size', 8)
+
+        async def scenario():
+            server = GpsIngestServer(flush_interval=0.01, authenticate=authenticate, flush=flush, **options)
+            await server.start('127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            writer.write(b'AUTH token\n')
+            answers = [await reader.readline()]
+            writer.write(''.join(f'{line}\n' for line in lines).encode())
+            writer.write_eof()
+            answers += [line async for line in reader]
+            writer.close()
+            await server.stop()
+            return answers, server.stats
+
+        return asyncio.run(scenario())
+
+    def test_open_connections_are_authenticated_again(self):
+        checks = iter([
+            (None, {1}),
+            (None, {1, 2}),  # furgón 2 assigned after the connection opened
+            PermissionError('token revocado'),
+        ])
+        written = []
+
+        def authenticate(token):
+            result = next(checks)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        answers, stats = self.run_server(['2,-38.7,-72.6', '1,-38.7,-72.6'], authenticate, written.extend,
+                                         reauth_interval=0)
+        self.assertEqual(answers, [b'OK\n', b'ERR token revocado\n'])
+        self.assertEqual([fix['furgon'] for fix in written], [2])
+
+    def test_failed_writes_are_retried_and_only_rejected_fixes_dropped(self):
+        failures = [OperationalError('database is locked')]
+        written = []
+
+        def flush(fixes):
+            if failures:
+                raise failures.pop()
+            if any(fix['furgon'] == 3 for fix in fixes):
+                raise IntegrityError('furgón eliminado')
+            written.extend(fixes)
+
+        lines = ['1,-38.7,-72.6', '3,-38.7,-72.6', '2,-38.7,-72.6']
+        answers, stats = self.run_server(lines, lambda token: (None, {1, 2, 3}), flush, retry_delay=0.01)
+        self.assertEqual(answers, [b'OK\n'])
+        self.assertEqual(sorted(fix['furgon'] for fix in written), [1, 2])
+        self.assertEqual((stats['flushed'], stats['dropped'], stats['retries']), (2, 1, 1))
+
+    def test_retries_are_bounded_and_other_errors_drop_the_batch(self):
+        written = []
+
+        def flush(fixes):
+            if fixes[0]['furgon'] == 1:
+                raise OperationalError('database is locked')
+            if fixes[0]['furgon'] == 2:
+                raise ValueError('bug')
+            written.extend(fixes)
+
+        lines = ['1,-38.7,-72.6', '2,-38.7,-72.6', '3,-38.7,-72.6']
+        with self.assertLogs('core.ingest_server', 'ERROR'):
+            answers, stats = self.run_server(lines, lambda token: (None, {1, 2, 3}), flush, batch_size=1,
+                                             retry_delay=0.01, max_retries=2)
+        self.assertEqual(answers, [b'OK\n'])
+        self.assertEqual([fix['furgon'] for fix in written], [3])
+        self.assertEqual((stats['flushed'], stats['dropped'], stats['retries']), (1, 2, 2))
@@ -0,0 +1,104 @@
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import live
+from core.models import Conductor, Furgon
+
+
+def auth_queries(queries):
+    return [q['sql'] for q in queries if 'auth_user' in q['sql'] or 'auth_group' in q['sql']]
+
+
+class RoleClaimsTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        live.positions().clear()
+        self.cond_group = Group.objects.create(name='Conductor')
+        self.cond_user = User.objects.create_user('cond_jwt', password='condpass')
+        self.cond_user.groups.add(self.cond_group)
+        self.conductor = Conductor.objects.create(rut='93000000-1', nombre='Cond JWT', user=self.cond_user)
+        self.furgon = Furgon.objects.create(patente='JWT-1', conductor=self.conductor)
+        self.other = Furgon.objects.create(patente='JWT-2')
+        self.client = APIClient()
+
+    def obtain(self, username='cond_jwt', password='condpass'):
+        resp = self.client.post('/api/token/', {'username': username, 'password': password}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def post_location(self, access, furgon, lat=-38.7):
+        return self.client.post(
+            f'/api/furgones/{furgon.pk}/update_location/',
+            {'latitude': lat, 'longitude': -72.6},
+            format='json',
+            HTTP_AUTHORIZATION=f'Bearer {access}',
+        )
+
+    def test_access_token_carries_roles_and_profile_ids(self):
+        token = AccessToken(self.obtain()['access'])
+        self.assertEqual(token['roles'], ['Conductor'])
+        self.assertEqual(token['conductor'], self.conductor.pk)
+        self.assertEqual(token['furgones'], [self.furgon.pk])
+        self.assertFalse(token['is_staff'])
+
+    def test_update_location_authorizes_without_user_or_group_queries(self):
+        access = self.obtain()['access']
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.post_location(access, self.furgon)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(auth_queries(ctx.captured_queries), [])
+        # not visible to this conductor (SQL scoping): 404
+        self.assertEqual(self.post_location(access, self.other).status_code, 404)
+
+    def test_bulk_update_location_uses_token_claims(self):
+        access = self.obtain()['access']
+        payload = [
+            {'furgon': self.furgon.pk, 'latitude': -38.7, 'longitude': -72.6},
+            {'furgon': self.other.pk, 'latitude': -38.7, 'longitude': -72.6},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(
+                '/api/furgones/bulk_update_location/', payload, format='json', HTTP_AUTHORIZATION=f'Bearer {access}'
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r['status'] for r in resp.json()['results']], ['applied', 'error'])
+        self.assertEqual(auth_queries(ctx.captured_queries), [])
+
+    def test_demoted_user_token_is_revoked_and_refresh_rebuilds_claims(self):
+        tokens = self.obtain()
+        self.cond_user.groups.remove(self.cond_group)
+        resp = self.post_location(tokens['access'], self.furgon)
+        self.assertEqual(resp.status_code, 401)
+        resp = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        access = resp.json()['access']
+        self.assertEqual(AccessToken(access)['roles'], [])
+        self.assertEqual(self.post_location(access, self.furgon).status_code, 403)
+
+    def test_revocations_reach_every_process(self):
+        access = self.obtain()['access']
+        self.cond_user.groups.remove(self.cond_group)
+        cache.clear()  # the default cache is per process
+        self.assertEqual(self.post_location(access, self.furgon).status_code, 401)
+
+    def test_reassigning_a_furgon_revokes_the_conductor_token(self):
+        access = self.obtain()['access']
+        self.other.conductor = self.conductor
+        self.other.save()
+        self.assertEqual(self.post_location(access, self.other).status_code, 401)
+        access = self.obtain()['access']
+        self.assertEqual(self.post_location(access, self.other).status_code, 200)
+
+    def test_login_does_not_revoke_existing_tokens(self):
+        access = self.obtain()['access']
+        self.obtain()
+        self.assertEqual(self.post_location(access, self.furgon).status_code, 200)
+
+    def test_tokens_without_role_claims_still_authenticate(self):
+        access = str(AccessToken.for_user(self.cond_user))
+        self.assertEqual(self.post_location(access, self.furgon).status_code, 200)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+
+from core import live
+from core.models import Furgon
+
+
+class LivePositionStoreTests(TestCase):
+    def test_local_store_is_bounded_and_ignores_older_fixes(self):
+        store = live.LocalPositionStore(max_size=2)
+        now = timezone.now()
+        self.assertTrue(store.update(1, 1.0, 1.0, now))
+        self.assertFalse(store.update(1, 9.0, 9.0, now - timedelta(seconds=1)))
+        store.update(2, 2.0, 2.0, now)
+        store.update(3, 3.0, 3.0, now)
+        _, positions = store.snapshot()
+        self.assertEqual(sorted(positions), [2, 3])
+
+    def test_changed_since_returns_only_newer_entries(self):
+        store = live.LocalPositionStore()
+        now = timezone.now()
+        store.update(1, 1.0, 1.0, now)
+        version = store.version()
+        store.update(2, 2.0, 2.0, now)
+        _, changed = store.changed_since(version)
+        self.assertEqual(list(changed), [2])
+
+    def test_shared_store_roundtrip(self):
+        store = live.SharedPositionStore(LocMemCache('live-test', {}))
+        now = timezone.now()
+        store.update(5, 1.0, 2.0, now)
+        version, positions = store.snapshot()
+        self.assertEqual(positions[5], (1.0, 2.0, now))
+        self.assertFalse(store.update(5, 3.0, 3.0, now))
+        self.assertEqual(store.version(), version)
+
+    def test_shared_store_membership_across_processes(self):
+        cache = LocMemCache('live-shared', {})
+        first, second = live.SharedPositionStore(cache, max_size=3), live.SharedPositionStore(cache, max_size=3)
+        now = timezone.now()
+        first.update(1, 1.0, 1.0, now)
+        second.update(2, 2.0, 2.0, now)  # no list read by one and written back by the other
+        first.update(1, 1.5, 1.0, now + timedelta(seconds=1))
+        self.assertEqual(sorted(second.snapshot()[1]), [1, 2])
+        second.remove(1)
+        self.assertEqual(sorted(first.snapshot()[1]), [2])
+        self.assertTrue(first.is_complete())
+        with self.assertLogs('core.live', 'WARNING'):
+            for pk in (3, 4, 5):
+                first.update(pk, 0.0, 0.0, now)
+        self.assertFalse(second.is_complete())
+        self.assertEqual(sorted(second.snapshot()[1]), [2, 3])
+        first.max_size = 10  # warm_up, in any process
+        second.update(5, 0.0, 0.0, now + timedelta(seconds=1))
+        self.assertEqual(sorted(second.snapshot()[1]), [2, 3, 5])
+
+    def test_deleted_furgon_leaves_the_store(self):
+        live.positions().clear()
+        furgon = Furgon.objects.create(patente='DEL-1')
+        furgon.update_location(-38.7, -72.6)
+        version = live.positions().version()
+        furgon.delete()
+        self.assertIsNone(live.positions().get(furgon.pk))
+        self.assertGreater(live.positions().version(), version)
+
+
+class FleetLargerThanStoreTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(live, '_store', live.LocalPositionStore(max_size=2))
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.furgones = [Furgon.objects.create(patente=f'CAP-{i}') for i in range(3)]
+        for i, furgon in enumerate(self.furgones):
+            Furgon.objects.filter(pk=furgon.pk).update(
+                last_latitude=-38.7 - i, last_longitude=-72.6, last_reported_at=timezone.now(),
+            )
+
+    def test_warm_up_sizes_the_store_for_the_fleet(self):
+        with self.assertLogs('core.live', 'WARNING'):
+            live.warm_up()
+        self.assertEqual(self.store.max_size, 3)
+        self.assertTrue(self.store.is_complete())
+        self.assertEqual(sorted(self.store.snapshot()[1]), [f.pk for f in self.furgones])
+
+    def test_evicted_positions_are_read_from_the_database(self):
+        with self.assertLogs('core.live', 'WARNING'):
+            live.warm_up()
+            new = Furgon.objects.create(patente='CAP-3')
+            new.update_location(-38.0, -72.0)
+        self.assertFalse(self.store.is_complete())
+        self.assertIsNone(self.store.get(self.furgones[0].pk))
+        _, positions = live.snapshot()
+        self.assertEqual(sorted(positions), [f.pk for f in self.furgones] + [new.pk])
+        self.assertEqual(live.position(self.furgones[0].pk)[0], -38.7)
+
+
+class PositionsEndpointTests(TestCase):
+    url = '/api/furgones/positions/'
+
+    def setUp(self):
+        live.positions().clear()
+        self.admin = User.objects.create_user('admin_live', password='a', is_staff=True)
+        self.furgon = Furgon.objects.create(patente='LIVE-1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_snapshot_reflects_writes_without_querying_database(self):
+        self.furgon.update_location(-38.7, -72.6)
+        self.client.get(self.url)  # warm-up
+        self.client.post(
+            '/api/furgones/bulk_update_location/',
+            [{'furgon': self.furgon.pk, 'latitude': -38.8, 'longitude': -72.7}],
+            format='json',
+        )
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['positions'][0][:3], [self.furgon.pk, -38.8, -72.7])
+
+    def test_etag_returns_304_when_unchanged(self):
+        self.furgon.update_location(-38.7, -72.6)
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.furgon.update_location(-38.9, -72.6)
+        third = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
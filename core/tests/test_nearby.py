@@ -0,0 +1,72 @@
+import random
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from core import geo
+from core.models import Furgon
+
+
+class GeohashTests(SimpleTestCase):
+    def test_encode_known_value(self):
+        # Reference value from the geohash specification examples
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_covering_cells_contain_all_points_within_radius(self):
+        rnd = random.Random(1)
+        lat, lon = -38.7359, -72.5904
+        for radius in (150, 1000, 5000, 20000):
+            precision = geo.precision_for_radius(lat, radius)
+            cells = geo.covering_cells(lat, lon, precision)
+            for _ in range(200):
+                p_lat = lat + rnd.uniform(-1, 1) * radius / geo.METERS_PER_DEGREE
+                p_lon = lon + rnd.uniform(-1, 1) * radius / geo.METERS_PER_DEGREE
+                if geo.haversine(lat, lon, p_lat, p_lon) <= radius:
+                    self.assertIn(geo.encode(p_lat, p_lon, precision), cells)
+
+    def test_haversine_many_matches_single(self):
+        lats, lons = [-38.74, -33.45], [-72.6, -70.66]
+        many = geo.haversine_many(-38.73, -72.59, lats, lons)
+        self.assertAlmostEqual(many[1], geo.haversine(-38.73, -72.59, -33.45, -70.66))
+        self.assertAlmostEqual(many[0], 1410, delta=5)
+
+
+class NearbyEndpointTests(TestCase):
+    url = '/api/furgones/nearby/'
+    center = (-38.7359, -72.5904)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_geo', password='x', is_staff=True))
+        lat, lon = self.center
+        self.near = Furgon.objects.create(patente='NEAR-1', last_latitude=lat + 0.001, last_longitude=lon)
+        self.mid = Furgon.objects.create(patente='MID-1', last_latitude=lat + 0.02, last_longitude=lon)
+        self.far = Furgon.objects.create(patente='FAR-1', last_latitude=lat + 1.0, last_longitude=lon)
+        self.nowhere = Furgon.objects.create(patente='NONE-1')
+
+    def test_geohash_stays_out_of_the_api(self):
+        self.assertNotIn('geohash', self.client.get(f'/api/furgones/{self.near.pk}/').json())
+        self.assertNotIn('geohash', self.client.get('/api/furgones/').json()['results'][0])
+
+    def test_geohash_maintained_on_save_and_update_location(self):
+        self.assertEqual(self.near.geohash, geo.encode(self.near.last_latitude, self.near.last_longitude))
+        self.assertEqual(self.nowhere.geohash, '')
+        self.nowhere.update_location(-33.45, -70.66)
+        self.nowhere.refresh_from_db()
+        self.assertEqual(self.nowhere.geohash, geo.encode(-33.45, -70.66))
+
+    def test_radius_mode(self):
+        lat, lon = self.center
+        resp = self.client.get(self.url, {'lat': lat, 'lon': lon, 'radius': 5000})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r['patente'] for r in resp.json()['results']], ['NEAR-1', 'MID-1'])
+
+    def test_k_nearest_mode(self):
+        lat, lon = self.center
+        resp = self.client.get(self.url, {'lat': lat, 'lon': lon, 'k': 3})
+        self.assertEqual([r['patente'] for r in resp.json()['results']], ['NEAR-1', 'MID-1', 'FAR-1'])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'lat': 'x', 'lon': 1}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': 1, 'lon': 1, 'radius': -1}).status_code, 400)
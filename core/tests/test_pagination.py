@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Asistencia, Estudiante, Notificacion
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_pg', password='p', is_staff=True))
+        Notificacion.objects.bulk_create([Notificacion(mensaje=f'n{i}') for i in range(23)])
+        # ties on creado_at: the id tie-breaker must keep every row exactly once
+        now = timezone.now()
+        for i, pk in enumerate(Notificacion.objects.order_by('pk').values_list('pk', flat=True)):
+            Notificacion.objects.filter(pk=pk).update(creado_at=now - timedelta(minutes=i // 4))
+
+    def walk(self, url):
+        pages = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            data = resp.json()
+            pages.append(data)
+            url = data['next']
+        return pages
+
+    def test_pages_follow_the_keyset_order_without_gaps(self):
+        pages = self.walk('/api/notificaciones/?page_size=5')
+        self.assertEqual([len(p['results']) for p in pages], [5, 5, 5, 5, 3])
+        ids = [row['id'] for p in pages for row in p['results']]
+        expected = list(Notificacion.objects.order_by('-creado_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_the_previous_page(self):
+        pages = self.walk('/api/notificaciones/?page_size=5')
+        back = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(back['results'], pages[1]['results'])
+        first = self.client.get(back['previous']).json()
+        self.assertEqual(first['results'], pages[0]['results'])
+        self.assertIsNone(first['previous'])
+
+    def test_mixed_direction_ordering(self):
+        est = [Estudiante.objects.create(rut=f'{i}-1', nombre=f'E{i}') for i in range(3)]
+        for day in range(4):
+            for e in est:
+                Asistencia.objects.create(estudiante=e, fecha=date(2025, 3, 1 + day), estado='presente')
+        pages = self.walk('/api/asistencias/?page_size=5')
+        rows = [(r['fecha'], r['id']) for p in pages for r in p['results']]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows, sorted(rows, key=lambda r: (-date.fromisoformat(r[0]).toordinal(), r[1])))
+
+    def test_single_query_without_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/notificaciones/?page_size=100000')
+        self.assertEqual(len(resp.json()['results']), 23)
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'core_sello' not in q['sql']]), 1)
+
+    def test_invalid_cursor_is_rejected(self):
+        resp = self.client.get('/api/notificaciones/?cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,229 @@
+"""Query budget of every route in ``frontend/urls.py`` and ``core/urls.py``.
+
+Each route is requested over a fixture with several rows per model and must
+stay within its budget without repeated statements (N+1, see
+``core.querycount``). The budgets do not depend on the number of rows. A
+new route fails ``test_every_route_has_a_budget`` until it is added here.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from core import live, querycount, urls as core_urls
+from core.models import (
+    Asistencia, Colegio, Conductor, Estudiante, Furgon, Notificacion, Pago, ParadaRuta, Ruta,
+)
+from frontend import urls as frontend_urls
+
+ROWS = 4
+
+# the pages that read the user's groups (core.roles, one query per request)
+# even for an admin
+ADMIN_ROLE_CHECKS = {'furgon_list', 'estudiante_list', 'notificacion_mark_read'}
+
+# name: (method, url kwargs as fixture attribute names, query string / payload, budget)
+FRONTEND = {
+    'index': ('get', {}, None, 5),
+    'login': ('get', {}, None, 2),
+    'logout': ('post', {}, None, 4),
+    'colegio_list': ('get', {}, None, 7),
+    'colegio_create': ('get', {}, None, 2),
+    'colegio_detail': ('get', {'pk': 'colegio'}, None, 5),
+    'colegio_edit': ('get', {'pk': 'colegio'}, None, 3),
+    'conductor_list': ('get', {}, None, 5),
+    'conductor_create': ('get', {}, None, 3),
+    'conductor_detail': ('get', {'pk': 'conductor'}, None, 5),
+    'conductor_edit': ('get', {'pk': 'conductor'}, None, 4),
+    'furgon_list': ('get', {}, None, 6),
+    'furgon_create': ('get', {}, None, 4),
+    'furgon_edit': ('get', {'pk': 'furgon'}, None, 5),
+    'furgon_detail': ('get', {'pk': 'furgon'}, None, 6),
+    'furgon_update_location': ('post', {'pk': 'furgon'}, {'latitude': '-38.7', 'longitude': '-72.6'}, 20),
+    'mi_furgon': ('get', {}, None, 7),
+    'estudiante_list': ('get', {}, None, 6),
+    'estudiante_create': ('get', {}, None, 4),
+    'estudiante_edit': ('get', {'pk': 'estudiante'}, None, 5),
+    'estudiante_detail': ('get', {'pk': 'estudiante'}, None, 6),
+    'ruta_list': ('get', {}, None, 5),
+    'ruta_create': ('get', {}, None, 3),
+    'ruta_detail': ('get', {'pk': 'ruta'}, None, 4),
+    'ruta_edit': ('get', {'pk': 'ruta'}, None, 4),
+    'notificacion_list': ('get', {}, None, 5),
+    'notificacion_create': ('get', {}, None, 4),
+    'notificacion_mark_read': ('post', {'pk': 'notificacion'}, {}, 9),
+    'notificacion_detail': ('get', {'pk': 'notificacion'}, None, 3),
+    'pago_list': ('get', {}, None, 5),
+    'pago_create': ('get', {}, None, 3),
+    'pago_detail': ('get', {'pk': 'pago'}, None, 4),
+    'asistencia_list': ('get', {}, None, 5),
+    'asistencia_create': ('get', {}, None, 4),
+    'asistencia_detail': ('get', {'pk': 'asistencia'}, None, 4),
+}
+
+# the pages whose queries depend on the role, for a conductor
+CONDUCTOR = {
+    'index': ('get', {}, None, 6),  # + the furgones of the conductor
+    # + the groups of the conductor
+    **{name: spec if name in ADMIN_ROLE_CHECKS else (*spec[:3], spec[3] + 1)
+       for name, spec in FRONTEND.items() if name.endswith('_list') or name == 'mi_furgon'},
+}
+
+API = {
+    'api-root': ('get', {}, None, 2),
+    'colegio-list': ('get', {}, None, 4),
+    'colegio-detail': ('get', {'pk': 'colegio'}, None, 4),
+    'conductor-list': ('get', {}, None, 4),
+    'conductor-detail': ('get', {'pk': 'conductor'}, None, 4),
+    'conductor-autocomplete': ('get', {}, {'q': '1'}, 3),
+    'furgon-list': ('get', {}, None, 4),
+    'furgon-detail': ('get', {'pk': 'furgon'}, None, 4),
+    'furgon-autocomplete': ('get', {}, {'q': 'qb'}, 3),
+    'furgon-positions': ('get', {}, None, 4),  # the store is warmed up: fleet size + positions
+    'furgon-nearby': ('get', {}, {'lat': '-38.74', 'lon': '-72.6'}, 3),
+    'furgon-track': ('get', {'pk': 'furgon'}, None, 4),
+    'furgon-eta': ('get', {'pk': 'furgon'}, None, 8),
+    'furgon-update-location': ('post', {'pk': 'furgon'}, {'latitude': -38.7, 'longitude': -72.6}, 17),
+    'furgon-bulk-update-location': ('post', {}, 'fixes', 20),
+    'furgon-stream': None,
+    'estudiante-list': ('get', {}, None, 4),
+    'estudiante-detail': ('get', {'pk': 'estudiante'}, None, 4),
+    'estudiante-autocomplete': ('get', {}, {'q': '1'}, 3),
+    'estudiante-bulk': ('post', {}, 'estudiantes', 13),
+    'ruta-list': ('get', {}, None, 4),
+    'ruta-detail': ('get', {'pk': 'ruta'}, None, 4),
+    'paradaruta-list': ('get', {}, None, 4),
+    'paradaruta-detail': ('get', {'pk': 'parada'}, None, 4),
+    'notificacion-list': ('get', {}, None, 4),
+    'notificacion-detail': ('get', {'pk': 'notificacion'}, None, 4),
+    'notificacion-marcar-leida': ('post', {'pk': 'notificacion'}, {}, 8),
+    'pago-list': ('get', {}, None, 4),
+    'pago-detail': ('get', {'pk': 'pago'}, None, 4),
+    'pago-bulk': ('post', {}, 'pagos', 7),
+    'asistencia-list': ('get', {}, None, 4),
+    'asistencia-detail': ('get', {'pk': 'asistencia'}, None, 4),
+    'asistencia-bulk': ('post', {}, 'asistencias', 8),
+    'sync': ('get', {}, None, 6),
+    'search': ('get', {}, {'q': 'est 1'}, 11),
+}
+# Server-Sent Events: the stream never ends; its per-tick cost is covered
+# by core/tests/test_stream.py.
+UNBUDGETED = {'furgon-stream'}
+
+
+class QueryLogTests(TestCase):
+    def test_repeated_patterns_are_reported(self):
+        Colegio.objects.bulk_create([Colegio(nombre=f'C{i}') for i in range(4)])
+        with querycount.record() as log:
+            for colegio in Colegio.objects.all():
+                Colegio.objects.filter(pk=colegio.pk).exists()
+            list(Colegio.objects.filter(pk__in=[1, 2]))
+            list(Colegio.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual(len(log), 7)
+        self.assertEqual(list(log.duplicates().values()), [4])
+        self.assertEqual(len(log.problems(budget=5)), 2)
+        self.assertEqual(log.duplicates(threshold=2).get(querycount.pattern(log.queries[-1])), 2)
+
+    @override_settings(MIDDLEWARE=['core.querycount.QueryCountMiddleware', *settings.MIDDLEWARE])
+    def test_middleware_header(self):
+        self.assertEqual(self.client.get('/login/')['X-Query-Count'], '0')
+
+
+def _names(patterns):
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            yield from _names(entry.url_patterns)
+        elif isinstance(entry, URLPattern) and entry.name:
+            yield entry.name
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_qb', password='p', is_staff=True)
+        cls.cond_user = User.objects.create_user('cond_qb', password='p')
+        cls.cond_user.groups.add(Group.objects.create(name='Conductor'))
+        apoderado = User.objects.create_user('apod_qb', password='p')
+        apoderado.groups.add(Group.objects.create(name='Apoderado'))
+        now = timezone.now()
+        for i in range(ROWS):
+            colegio = Colegio.objects.create(nombre=f'Colegio {i}', latitude=-38.74, longitude=-72.6)
+            user = cls.cond_user if i == 0 else User.objects.create_user(f'cond_qb{i}', password='p')
+            conductor = Conductor.objects.create(rut=f'9100000{i}-1', nombre=f'Cond {i}', user=user)
+            furgon = Furgon.objects.create(patente=f'QB-{i}', conductor=conductor, colegio=colegio)
+            furgon.update_location(-38.74, -72.6 + i / 1000, now - timedelta(minutes=i))
+            ruta = Ruta.objects.create(furgon=furgon, tipo_ruta='ida')
+            for orden in range(ROWS):
+                ParadaRuta.objects.create(ruta=ruta, orden=orden, nombre=f'P{orden}',
+                                          latitude=-38.7 - orden / 100, longitude=-72.6)
+            for j in range(ROWS):
+                estudiante = Estudiante.objects.create(
+                    rut=f'{i}{j}-1', nombre=f'Est {i}{j}', furgon=furgon, apoderado_user=apoderado,
+                )
+                Pago.objects.create(estudiante=estudiante, monto=1000)
+                Asistencia.objects.create(estudiante=estudiante, fecha=date(2025, 3, 3), estado='presente',
+                                          furgon=furgon)
+                Notificacion.objects.create(estudiante=estudiante, furgon=furgon, mensaje=f'n {i}{j}')
+        cls.colegio, cls.conductor, cls.furgon = colegio, conductor, furgon
+        cls.ruta, cls.parada, cls.estudiante = ruta, ruta.paradas.first(), estudiante
+        cls.pago, cls.asistencia = estudiante.pagos.get(), estudiante.asistencias.get()
+        cls.notificacion = estudiante.notificaciones.get()
+
+    def setUp(self):
+        cache.clear()
+        live.positions().clear()
+
+    def payload(self, name):
+        if name == 'fixes':
+            return [{'furgon': f.pk, 'latitude': -38.75, 'longitude': -72.6} for f in Furgon.objects.all()]
+        if name == 'estudiantes':
+            return {'mode': 'upsert', 'rows': [{'rut': f'{i}0-1', 'nombre': f'Nuevo {i}'} for i in range(ROWS)]}
+        if name == 'pagos':
+            return {'mode': 'upsert', 'rows': [{'id': p.pk, 'estado': 'pagado'} for p in Pago.objects.all()]}
+        if name == 'asistencias':
+            return {'mode': 'upsert', 'rows': [
+                {'estudiante': e.pk, 'fecha': '2025-03-03', 'estado': 'ausente'} for e in Estudiante.objects.all()
+            ]}
+        return name
+
+    def measure(self, url_name, spec):
+        method, kwargs, data, budget = spec
+        url = reverse(url_name, kwargs={k: getattr(self, v).pk for k, v in kwargs.items()})
+        data = self.payload(data)
+        with querycount.record() as log:
+            if method == 'get':
+                resp = self.client.get(url, data)
+            elif isinstance(data, (list, dict)) and url.startswith('/api/'):
+                resp = self.client.post(url, data, content_type='application/json')
+            else:
+                resp = self.client.post(url, data)
+        self.assertLess(resp.status_code, 400, f'{url_name}: {resp.status_code}')
+        return log, budget
+
+    def check(self, routes, prefix='', user=None):
+        self.client.get('/')  # CSRF cookie
+        for url_name, spec in routes.items():
+            if spec is None:
+                continue
+            self.client.force_login(user or self.admin)  # again after logout
+            with self.subTest(route=url_name):
+                log, budget = self.measure(prefix + url_name, spec)
+                self.assertEqual(log.problems(budget), [], f'{url_name}: {len(log)} queries')
+
+    def test_frontend_routes(self):
+        self.check(FRONTEND, 'frontend:')
+
+    def test_frontend_routes_as_conductor(self):
+        self.check(CONDUCTOR, 'frontend:', self.cond_user)
+
+    def test_api_routes(self):
+        self.check(API)
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(set(_names(frontend_urls.urlpatterns)), set(FRONTEND))
+        self.assertEqual(set(_names(core_urls.urlpatterns)), set(API) | UNBUDGETED)
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core import respcache, roles
+from core.models import Colegio, Conductor, Estudiante, Furgon, Sello
+
+
+@override_settings(RESPONSE_CACHE_TTL=300)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin_rc', password='p', is_staff=True)
+        self.cond_user = User.objects.create_user('cond_rc', password='p')
+        self.cond_user.groups.add(Group.objects.create(name='Conductor'))
+        conductor = Conductor.objects.create(rut='93000000-1', nombre='Cond RC', user=self.cond_user)
+        self.mine = Furgon.objects.create(patente='RC-1', conductor=conductor)
+        Estudiante.objects.create(rut='1-1', nombre='Pasajero', furgon=self.mine)
+        Estudiante.objects.create(rut='2-2', nombre='Ajeno')
+        Colegio.objects.create(nombre='San Jorge')
+        self.client = APIClient()
+
+    def get(self, user, url):
+        self.client.force_authenticate(user=user)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_reference_data_is_shared_between_users(self):
+        self.get(self.admin, '/api/colegios/')
+        roles.user_roles(self.cond_user)
+        with self.assertNumQueries(1):  # the version stamps
+            data = self.get(self.cond_user, '/api/colegios/')
+        self.assertEqual([c['nombre'] for c in data['results']], ['San Jorge'])
+
+    def test_writes_invalidate_the_cached_responses(self):
+        self.get(self.admin, '/api/colegios/')
+        Colegio.objects.create(nombre='Alemán')
+        data = self.get(self.admin, '/api/colegios/')
+        self.assertEqual([c['nombre'] for c in data['results']], ['Alemán', 'San Jorge'])
+
+    def test_writes_of_other_processes_invalidate_the_local_copy(self):
+        self.get(self.admin, '/api/colegios/')
+        # another worker: the row and the stamp change, this process's cache does not
+        Colegio.objects.update(nombre='San Jorge bis')
+        Sello.objects.filter(nombre='version:core.colegio').update(valor=F('valor') + 1)
+        data = self.get(self.admin, '/api/colegios/')
+        self.assertEqual([c['nombre'] for c in data['results']], ['San Jorge bis'])
+
+    def test_scoped_resources_are_cached_per_scope(self):
+        self.assertEqual(len(self.get(self.admin, '/api/estudiantes/')['results']), 2)
+        self.assertEqual(len(self.get(self.cond_user, '/api/estudiantes/')['results']), 1)
+        with self.assertNumQueries(1):  # the version stamps
+            self.assertEqual(len(self.get(self.admin, '/api/estudiantes/')['results']), 2)
+
+    def test_query_string_is_part_of_the_key(self):
+        full = self.get(self.admin, '/api/estudiantes/')
+        sparse = self.get(self.admin, '/api/estudiantes/?fields=id')
+        self.assertIn('nombre', full['results'][0])
+        self.assertEqual(set(sparse['results'][0]), {'id'})
+
+    def test_frontend_pages_are_cached(self):
+        self.client.force_login(self.admin)
+        self.client.get('/furgones/')  # sets the CSRF cookie
+        first = self.client.get('/furgones/')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/furgones/')
+        self.assertEqual(second.content, first.content)
+        self.assertFalse([q for q in ctx.captured_queries if 'core_furgon' in q['sql']])
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'valor', True
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(respcache.get_or_compute('k', compute, 60)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['valor'] * 5)
+
+    def test_uncacheable_results_are_not_stored(self):
+        self.assertEqual(respcache.get_or_compute('k', lambda: ('error', False), 60), 'error')
+        self.assertEqual(respcache.get_or_compute('k', lambda: ('ok', True), 60), 'ok')
@@ -0,0 +1,72 @@
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import roles
+from core.models import Furgon
+from core.permissions import in_group
+from frontend.templatetags.role_tags import has_group
+
+
+def group_queries(queries):
+    return [q for q in queries if 'auth_user_groups' in q['sql'] or 'auth_group' in q['sql']]
+
+
+class RoleResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cond_group = Group.objects.create(name='Conductor')
+        self.apod_group = Group.objects.create(name='Apoderado')
+        self.user = User.objects.create_user('roles', password='p')
+        self.user.groups.add(self.cond_group)
+
+    def test_roles_are_loaded_once_per_user_object(self):
+        user = User.objects.get(pk=self.user.pk)
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(in_group(user, 'Conductor'))
+            self.assertFalse(in_group(user, 'Apoderado'))
+            self.assertFalse(in_group(user, 'Administrador'))
+            self.assertTrue(has_group(user, 'Conductor'))
+
+    def test_each_request_reads_the_current_membership(self):
+        roles.user_roles(User.objects.get(pk=self.user.pk))
+        # as another process would: no signal reaches this one
+        User.groups.through.objects.filter(user=self.user).delete()
+        self.assertFalse(in_group(User.objects.get(pk=self.user.pk), 'Conductor'))
+
+    def test_membership_changes_are_seen(self):
+        self.assertFalse(in_group(self.user, 'Apoderado'))
+        self.user.groups.add(self.apod_group)
+        self.assertTrue(in_group(self.user, 'Apoderado'))
+        self.apod_group.user_set.remove(self.user)
+        self.assertFalse(in_group(User.objects.get(pk=self.user.pk), 'Apoderado'))
+        self.cond_group.user_set.clear()
+        self.assertFalse(in_group(User.objects.get(pk=self.user.pk), 'Conductor'))
+
+    def test_group_rename_and_delete_are_seen(self):
+        self.assertTrue(in_group(self.user, 'Conductor'))
+        self.cond_group.name = 'Chofer'
+        self.cond_group.save()
+        self.assertTrue(in_group(User.objects.get(pk=self.user.pk), 'Chofer'))
+        self.cond_group.delete()
+        self.assertEqual(roles.user_roles(User.objects.get(pk=self.user.pk)), frozenset())
+
+    def test_anonymous_user_has_no_roles(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(in_group(AnonymousUser(), 'Conductor'))
+
+    def test_index_page_resolves_groups_at_most_once(self):
+        Furgon.objects.create(patente='ROL-1')
+        client = Client()
+        client.login(username='roles', password='p')
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get('/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertLessEqual(len(group_queries(ctx.captured_queries)), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get('/')
+        self.assertEqual(len(group_queries(ctx.captured_queries)), 1)
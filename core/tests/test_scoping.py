@@ -0,0 +1,87 @@
+from datetime import date
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import Asistencia, Conductor, Estudiante, Furgon, Notificacion, Pago, ParadaRuta, Ruta
+
+
+class RoleScopedQuerysetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cond_group = Group.objects.create(name='Conductor')
+        apod_group = Group.objects.create(name='Apoderado')
+        self.admin = User.objects.create_user('admin_s', password='p', is_staff=True)
+        self.cond_user = User.objects.create_user('cond_s', password='p')
+        self.cond_user.groups.add(cond_group)
+        self.apod_user = User.objects.create_user('apod_s', password='p')
+        self.apod_user.groups.add(apod_group)
+        self.nobody = User.objects.create_user('nobody_s', password='p')
+
+        conductor = Conductor.objects.create(rut='94000000-1', nombre='Cond S', user=self.cond_user)
+        self.mine = Furgon.objects.create(patente='SCO-1', conductor=conductor)
+        self.other = Furgon.objects.create(patente='SCO-2')
+        self.hijo = Estudiante.objects.create(rut='1-1', nombre='Hijo', furgon=self.other, apoderado_user=self.apod_user)
+        self.pasajero = Estudiante.objects.create(rut='2-2', nombre='Pasajero', furgon=self.mine)
+        self.ajeno = Estudiante.objects.create(rut='3-3', nombre='Ajeno', furgon=self.other)
+        for est in (self.hijo, self.pasajero, self.ajeno):
+            Pago.objects.create(estudiante=est, monto=1000)
+            Asistencia.objects.create(estudiante=est, fecha=date(2025, 3, 3), estado='presente')
+            Notificacion.objects.create(estudiante=est, mensaje=f'n {est.nombre}')
+        Notificacion.objects.create(furgon=self.mine, mensaje='furgon mio')
+        self.client = APIClient()
+
+    def ids(self, user, url):
+        self.client.force_authenticate(user=user)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return sorted(item['id'] for item in resp.json()['results'])
+
+    def test_admin_sees_everything(self):
+        self.assertEqual(len(self.ids(self.admin, '/api/estudiantes/')), 3)
+        self.assertEqual(len(self.ids(self.admin, '/api/notificaciones/')), 4)
+
+    def test_conductor_sees_own_furgon_and_its_students(self):
+        self.assertEqual(self.ids(self.cond_user, '/api/furgones/'), [self.mine.pk])
+        self.assertEqual(self.ids(self.cond_user, '/api/estudiantes/'), [self.pasajero.pk])
+        self.assertEqual(self.ids(self.cond_user, '/api/pagos/'), [self.pasajero.pagos.get().pk])
+        self.assertEqual(self.ids(self.cond_user, '/api/asistencias/'), [self.pasajero.asistencias.get().pk])
+        self.assertEqual(
+            self.ids(self.cond_user, '/api/notificaciones/'),
+            [Notificacion.objects.get(mensaje='furgon mio').pk],
+        )
+
+    def test_apoderado_sees_own_students_and_their_furgon(self):
+        self.assertEqual(self.ids(self.apod_user, '/api/furgones/'), [self.other.pk])
+        self.assertEqual(self.ids(self.apod_user, '/api/estudiantes/'), [self.hijo.pk])
+        self.assertEqual(self.ids(self.apod_user, '/api/pagos/'), [self.hijo.pagos.get().pk])
+        self.assertEqual(self.ids(self.apod_user, '/api/notificaciones/'), [self.hijo.notificaciones.get().pk])
+
+    def test_users_without_role_and_anonymous_see_nothing(self):
+        self.assertEqual(self.ids(self.nobody, '/api/estudiantes/'), [])
+        self.assertEqual(self.ids(None, '/api/furgones/'), [])
+
+    def test_shared_resources_do_not_expand_furgones(self):
+        ruta = Ruta.objects.create(furgon=self.mine)
+        ParadaRuta.objects.create(ruta=ruta, orden=0, nombre='P0', latitude=-38.7, longitude=-72.6)
+        for user in (None, self.apod_user):
+            self.client.force_authenticate(user=user)
+            for url in ('/api/rutas/?expand=furgon', '/api/paradas/?expand=ruta.furgon'):
+                with self.subTest(user=user, url=url):
+                    self.assertEqual(self.client.get(url).status_code, 400)
+            parada = self.client.get('/api/paradas/?expand=ruta').json()['results'][0]
+            self.assertEqual(parada['ruta']['furgon'], self.mine.pk)
+
+    def test_objects_outside_scope_are_not_found(self):
+        self.client.force_authenticate(user=self.apod_user)
+        self.assertEqual(self.client.get(f'/api/estudiantes/{self.ajeno.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/estudiantes/{self.hijo.pk}/').status_code, 200)
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_list_is_a_single_query(self):
+        self.client.force_authenticate(user=self.cond_user)
+        self.client.get('/api/estudiantes/')  # roles cached
+        with self.assertNumQueries(2):  # + the version stamps (core.versions)
+            self.client.get('/api/estudiantes/')
@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import search
+from core.models import Estudiante, Furgon, Pago, TerminoBusqueda
+
+
+def found(model, text):
+    return set(search.matching(model.objects.all(), text).values_list('pk', flat=True))
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.maria = Estudiante.objects.create(rut='12.345.678-5', nombre='María José Pérez')
+        self.juan = Estudiante.objects.create(rut='9876543-2', nombre='Juan Ñuñez')
+
+    def test_fold_and_terms(self):
+        self.assertEqual(search.fold('Ñuñez-Pérez'), 'nunez perez')
+        self.assertEqual(search.terms({'rut': '12.345.678-5'}), {'12', '345', '678', '5', '123456785'})
+
+    def test_prefix_accent_folded_and_substring_matches(self):
+        self.assertEqual(found(Estudiante, 'maria'), {self.maria.pk})
+        self.assertEqual(found(Estudiante, 'JOS per'), {self.maria.pk})
+        self.assertEqual(found(Estudiante, 'unez'), {self.juan.pk})
+        self.assertEqual(found(Estudiante, 'pe juan'), set())
+        self.assertEqual(found(Estudiante, 'xyz'), set())
+
+    def test_identifier_variants(self):
+        self.assertEqual(found(Estudiante, '12345678'), {self.maria.pk})
+        self.assertEqual(found(Estudiante, '12.345.6'), {self.maria.pk})
+        self.assertEqual(found(Estudiante, '98765432'), {self.juan.pk})
+
+    def test_index_follows_saves_and_deletes(self):
+        self.juan.nombre = 'Pedro Soto'
+        self.juan.save()
+        self.assertEqual(found(Estudiante, 'juan'), set())
+        self.assertEqual(found(Estudiante, 'soto'), {self.juan.pk})
+        self.juan.delete()
+        self.assertFalse(TerminoBusqueda.objects.filter(modelo='estudiante', objeto_id=self.juan.pk).exists())
+
+    def test_related_sources(self):
+        pago = Pago.objects.create(estudiante=self.maria, monto=1000, referencia='TRF-0042')
+        Pago.objects.create(estudiante=self.juan, monto=1000)
+        pagos = Pago.objects.all()
+        sources = ((Pago, 'pk'), (Estudiante, 'estudiante'))
+        self.assertEqual(list(search.matching(pagos, 'trf0042', *sources)), [pago])
+        self.assertEqual(list(search.matching(pagos, 'perez', *sources)), [pago])
+
+    def test_rebuild_command(self):
+        TerminoBusqueda.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', '--batch-size', '1', stdout=out)
+        self.assertIn('estudiante: 2 filas indexadas', out.getvalue())
+        self.assertEqual(found(Estudiante, 'maria'), {self.maria.pk})
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class SearchViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin_se', password='p', is_staff=True)
+        self.apoderado = User.objects.create_user('apod_se', password='p')
+        self.apoderado.groups.add(Group.objects.create(name='Apoderado'))
+        self.furgon = Furgon.objects.create(patente='AB-CD12')
+        self.mine = Estudiante.objects.create(rut='1-9', nombre='Ana Andrade', apoderado_user=self.apoderado)
+        self.other = Estudiante.objects.create(rut='2-7', nombre='Anabel Soto')
+        self.client.force_login(self.admin)
+
+    def test_frontend_filter(self):
+        resp = self.client.get('/estudiantes/', {'q': 'ANDRADE'})
+        self.assertEqual(list(resp.context['object_list']), [self.mine])
+        resp = self.client.get('/furgones/', {'q': 'abcd'})
+        self.assertEqual(list(resp.context['object_list']), [self.furgon])
+
+    def test_bulk_writes_are_indexed(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        resp = api.post('/api/estudiantes/bulk/', {'mode': 'create', 'rows': [{'rut': '3-5', 'nombre': 'Óscar Lagos'}]},
+                        format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(found(Estudiante, 'oscar'), {Estudiante.objects.get(rut='3-5').pk})
+
+    def test_global_search_is_scoped(self):
+        api = APIClient()
+        api.force_authenticate(self.apoderado)
+        data = api.get('/api/search/', {'q': 'ana', 'tipos': 'estudiante,furgon'}).json()
+        self.assertEqual(data, {'estudiante': [{'id': self.mine.pk, 'nombre': 'Ana Andrade', 'rut': '1-9'}],
+                                'furgon': []})
+        api.force_authenticate(self.admin)
+        data = api.get('/api/search/', {'q': 'ana'}).json()
+        self.assertEqual({row['id'] for row in data['estudiante']}, {self.mine.pk, self.other.pk})
+        self.assertEqual(set(data), set(search.SEARCHABLE))
+        self.assertEqual(len(api.get('/api/search/', {'q': 'ana', 'limit': 1}).json()['estudiante']), 1)
+        self.assertEqual(api.get('/api/search/', {'q': 'ana', 'tipos': 'ruta'}).status_code, 400)
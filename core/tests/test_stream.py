@@ -0,0 +1,133 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.test import TestCase, Client
+from django.contrib.auth.models import User, Group
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import live, stream, tokens
+from core.models import Conductor, Furgon, Estudiante
+
+
+def _payload(event):
+    data = [line for line in event.decode().splitlines() if line.startswith('data: ')][0]
+    return json.loads(data[len('data: '):])
+
+
+class PositionStreamTests(TestCase):
+    url = '/api/furgones/stream/'
+
+    def setUp(self):
+        live.positions().clear()
+        cond_group, _ = Group.objects.get_or_create(name='Conductor')
+        apod_group, _ = Group.objects.get_or_create(name='Apoderado')
+        self.cond_user = User.objects.create_user('cond_sse', password='p')
+        self.cond_user.groups.add(cond_group)
+        self.apod_user = User.objects.create_user('apod_sse', password='p')
+        self.apod_user.groups.add(apod_group)
+        self.plain_user = User.objects.create_user('plain_sse', password='p')
+        conductor = Conductor.objects.create(rut='95000000-1', nombre='Cond S', user=self.cond_user)
+        self.own = Furgon.objects.create(patente='SSE-1', conductor=conductor)
+        self.other = Furgon.objects.create(patente='SSE-2')
+        Estudiante.objects.create(rut='sse-s1', nombre='S', apoderado_user=self.apod_user, furgon=self.other)
+        self.own.update_location(-38.7, -72.6)
+        self.other.update_location(-38.8, -72.7)
+        self.client = Client()
+
+    def test_requires_authentication_and_a_role(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.login(username='plain_sse', password='p')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_visible_ids_by_role(self):
+        self.assertEqual(stream.visible_furgon_ids(self.cond_user), {self.own.pk})
+        self.assertEqual(stream.visible_furgon_ids(self.apod_user), {self.other.pk})
+
+    def test_session_stream_sends_scoped_snapshot(self):
+        self.client.login(username='apod_sse', password='p')
+        resp = self.client.get(self.url)
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        first = next(iter(resp.streaming_content))
+        self.assertEqual([row[0] for row in _payload(first)['positions']], [self.other.pk])
+
+    def test_bearer_token_is_accepted(self):
+        token = AccessToken.for_user(self.cond_user)
+        resp = self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(resp.status_code, 200)
+        first = next(iter(resp.streaming_content))
+        self.assertEqual([row[0] for row in _payload(first)['positions']], [self.own.pk])
+
+    def test_revoked_token_is_refused(self):
+        token = tokens.add_role_claims(AccessToken.for_user(self.cond_user), self.cond_user)
+        tokens.revoke([self.cond_user.pk])
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 401)
+
+    def test_snapshot_fills_the_gaps_of_an_incomplete_store(self):
+        live.positions().clear()
+        live.warm_up()
+        live.positions().clear()  # evicted
+        live.positions().mark_warm()
+        feed = stream.PositionFeed(None, source=stream.PositionBroadcaster(tick=0))
+        with mock.patch.object(live.positions(), 'is_complete', return_value=False):
+            rows = _payload(feed.poll())['positions']
+        self.assertEqual([row[0] for row in rows], [self.own.pk, self.other.pk])
+
+    def test_feed_coalesces_bursts_per_furgon(self):
+        feed = stream.PositionFeed({self.own.pk}, source=stream.PositionBroadcaster(tick=0))
+        feed.poll()  # initial snapshot
+        self.assertIsNone(feed.poll())
+        for i in range(5):
+            self.own.update_location(-38.7 + i * 0.001, -72.6)
+        self.other.update_location(-38.9, -72.7)  # not visible
+        rows = _payload(feed.poll())['positions']
+        self.assertEqual(len(rows), 1)
+        self.assertAlmostEqual(rows[0][1], -38.696)
+        self.assertIsNone(feed.poll())
+
+    def test_changes_are_read_once_per_tick_for_every_feed(self):
+        source = stream.PositionBroadcaster(tick=60)
+        feeds = [stream.PositionFeed({self.own.pk}, source=source) for _ in range(3)]
+        feeds.append(stream.PositionFeed({self.other.pk}, source=source))
+        for feed in feeds:
+            feed.poll()  # initial snapshot
+        source.changed_since(feeds[0].last_version)  # first tick
+        source._read_at -= 60
+        self.own.update_location(-38.71, -72.6)
+        self.other.update_location(-38.81, -72.7)
+        store = live.positions()
+        with mock.patch.object(store, 'changed_since', wraps=store.changed_since) as read:
+            events = [feed.poll() for feed in feeds]
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual([[row[0] for row in _payload(e)['positions']] for e in events],
+                             [[self.own.pk]] * 3 + [[self.other.pk]])
+            self.own.update_location(-38.72, -72.6)  # within the same tick
+            self.assertEqual([feed.poll() for feed in feeds], [None] * 4)
+            self.assertEqual(read.call_count, 1)
+
+    def test_feed_behind_the_history_reads_the_store(self):
+        source = stream.PositionBroadcaster(tick=0, history=1)
+        feed = stream.PositionFeed({self.own.pk}, source=source)
+        feed.poll()
+        for lat in (-38.71, -38.72):
+            source.changed_since(feed.last_version)
+            self.own.update_location(lat, -72.6)
+        source.changed_since(feed.last_version)
+        rows = _payload(feed.poll())['positions']
+        self.assertAlmostEqual(rows[0][1], -38.72)
+
+    def test_async_events_emit_heartbeat_when_idle(self):
+        live.warm_up()  # as positions_stream does before streaming
+        feed = stream.PositionFeed(None)
+
+        async def collect():
+            out = []
+            async for chunk in stream._aevents(feed, interval=0, heartbeat=0):
+                out.append(chunk)
+                if len(out) == 2:
+                    break
+            return out
+
+        chunks = asyncio.run(collect())
+        self.assertTrue(chunks[0].startswith(b'event: positions'))
+        self.assertEqual(chunks[1], stream.HEARTBEAT)
@@ -0,0 +1,124 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import journal
+from core.models import Cambio, Conductor, Estudiante, Furgon, Notificacion, Ruta
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cond_user = User.objects.create_user('cond_sy', password='p')
+        self.cond_user.groups.add(Group.objects.create(name='Conductor'))
+        self.apod_user = User.objects.create_user('apod_sy', password='p')
+        self.apod_user.groups.add(Group.objects.create(name='Apoderado'))
+        conductor = Conductor.objects.create(rut='99000000-1', nombre='Cond SY', user=self.cond_user)
+        self.mine = Furgon.objects.create(patente='SY-1', conductor=conductor)
+        self.other = Furgon.objects.create(patente='SY-2')
+        self.pasajero = Estudiante.objects.create(rut='1-1', nombre='Pasajero', furgon=self.mine)
+        self.hijo = Estudiante.objects.create(rut='2-2', nombre='Hijo', furgon=self.other, apoderado_user=self.apod_user)
+        self.client = APIClient()
+
+    def sync(self, user, since=None):
+        self.client.force_authenticate(user=user)
+        url = '/api/sync/' if since is None else f'/api/sync/?since={since}'
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.json()
+
+    def ids(self, data, resource, kind):
+        return sorted(row if kind == 'deleted' else row['id'] for row in data[resource][kind])
+
+    def test_full_sync_returns_visible_rows_and_a_token(self):
+        data = self.sync(self.cond_user)
+        self.assertEqual(self.ids(data, 'estudiantes', 'created'), [self.pasajero.pk])
+        self.assertEqual(data['token'], str(Cambio.objects.latest('pk').pk))
+        self.assertFalse(data['more'])
+
+    def test_quiet_period_returns_nothing(self):
+        token = self.sync(self.cond_user)['token']
+        data = self.sync(self.cond_user, token)
+        self.assertEqual(data['token'], token)
+        for resource in ('estudiantes', 'rutas', 'notificaciones'):
+            self.assertEqual(data[resource], {'created': [], 'updated': [], 'deleted': []})
+
+    def test_created_updated_and_deleted_rows_since_token(self):
+        token = self.sync(self.cond_user)['token']
+        nuevo = Estudiante.objects.create(rut='3-3', nombre='Nuevo', furgon=self.mine)
+        self.pasajero.nombre = 'Pasajero 2'
+        self.pasajero.save()
+        Estudiante.objects.create(rut='4-4', nombre='Ajeno', furgon=self.other)
+        temporal = Estudiante.objects.create(rut='5-5', nombre='Temporal', furgon=self.mine)
+        temporal.delete()
+        data = self.sync(self.cond_user, token)
+        self.assertEqual(self.ids(data, 'estudiantes', 'created'), [nuevo.pk])
+        self.assertEqual([r['nombre'] for r in data['estudiantes']['updated']], ['Pasajero 2'])
+        self.assertEqual(data['estudiantes']['deleted'], [])
+
+        token = data['token']
+        pk = nuevo.pk
+        nuevo.delete()
+        data = self.sync(self.cond_user, token)
+        self.assertEqual(data['estudiantes']['deleted'], [pk])
+        # the apoderado never saw it
+        self.assertEqual(self.sync(self.apod_user, token)['estudiantes']['deleted'], [])
+
+    def test_row_leaving_the_callers_scope_is_reported_as_deleted(self):
+        token = self.sync(self.cond_user)['token']
+        self.pasajero.furgon = self.other
+        self.pasajero.save()
+        data = self.sync(self.cond_user, token)
+        self.assertEqual(data['estudiantes']['deleted'], [self.pasajero.pk])
+        self.assertEqual(data['estudiantes']['updated'], [])
+
+    def test_deleting_a_furgon_detaches_its_students(self):
+        token = self.sync(self.apod_user)['token']
+        self.other.delete()
+        data = self.sync(self.apod_user, token)
+        self.assertEqual([(r['id'], r['furgon']) for r in data['estudiantes']['updated']], [(self.hijo.pk, None)])
+
+    def test_bulk_writes_and_geofence_notifications_are_journaled(self):
+        token = self.sync(self.cond_user)['token']
+        admin = User.objects.create_user('admin_sy', password='p', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        self.client.post('/api/estudiantes/bulk/', {'mode': 'upsert', 'rows': [
+            {'rut': '1-1', 'nombre': 'Pasajero bulk'},
+            {'rut': '6-6', 'nombre': 'Bulk nuevo', 'furgon': self.mine.pk},
+        ]}, format='json')
+        Notificacion.objects.create(furgon=self.mine, mensaje='aviso')
+        Ruta.objects.create(furgon=self.other)
+        data = self.sync(self.cond_user, token)
+        self.assertEqual([r['nombre'] for r in data['estudiantes']['created']], ['Bulk nuevo'])
+        self.assertEqual([r['nombre'] for r in data['estudiantes']['updated']], ['Pasajero bulk'])
+        self.assertEqual([r['mensaje'] for r in data['notificaciones']['created']], ['aviso'])
+        # rutas are visible to every user
+        self.assertEqual(len(data['rutas']['created']), 1)
+
+    def test_large_backlogs_are_paged(self):
+        token = self.sync(self.cond_user)['token']
+        for i in range(3):
+            Estudiante.objects.create(rut=f'7{i}-7', nombre=f'N{i}', furgon=self.mine)
+        with mock.patch.object(journal, 'MAX_ENTRIES_PER_SYNC', 2):
+            first = self.sync(self.cond_user, token)
+            second = self.sync(self.cond_user, first['token'])
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        self.assertEqual(len(first['estudiantes']['created']) + len(second['estudiantes']['created']), 3)
+
+    def test_invalid_and_expired_tokens(self):
+        self.client.force_authenticate(user=self.cond_user)
+        self.assertEqual(self.client.get('/api/sync/?since=abc').status_code, 400)
+        Cambio.objects.update(creado_at=timezone.now() - timedelta(days=60))
+        Estudiante.objects.create(rut='8-8', nombre='Reciente')
+        call_command('sync_retention', '--keep-days', '30', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/sync/?since=0').status_code, 410)
+        self.client.force_authenticate(user=None)
+        self.assertIn(self.client.get('/api/sync/').status_code, (401, 403))
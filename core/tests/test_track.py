@@ -0,0 +1,84 @@
+import math
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+
+from core import geo
+from core.models import Furgon, PosicionFurgon
+from core.views import FurgonViewSet
+
+
+class SimplifyTests(SimpleTestCase):
+    def test_straight_line_collapses_to_endpoints(self):
+        lats = [-38.7 + i * 1e-4 for i in range(100)]
+        lons = [-72.6] * 100
+        self.assertEqual(geo.simplify(lats, lons, 1.0), [0, 99])
+
+    def test_corner_is_kept(self):
+        lats = [0.0, 0.0, 0.0, 0.001, 0.002]
+        lons = [0.0, 0.001, 0.002, 0.002, 0.002]
+        self.assertEqual(geo.simplify(lats, lons, 5.0), [0, 2, 4])
+
+    def test_zero_tolerance_keeps_everything(self):
+        self.assertEqual(geo.simplify([0, 1, 2], [0, 1, 0], 0), [0, 1, 2])
+
+    def test_tolerance_for_zoom_halves_per_level(self):
+        self.assertAlmostEqual(geo.tolerance_for_zoom(10, 0) / geo.tolerance_for_zoom(11, 0), 2.0)
+
+
+class TrackEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.furgon = Furgon.objects.create(patente='TRK-1')
+        self.start = timezone.now() - timedelta(hours=2)
+        # zig-zag along a straight road: 200 fixes, 5 s apart
+        PosicionFurgon.objects.bulk_create([
+            PosicionFurgon.from_fix(
+                self.furgon.pk,
+                -38.7 + i * 1e-4,
+                -72.6 + 2e-6 * math.sin(i),
+                self.start + timedelta(seconds=5 * i),
+            )
+            for i in range(200)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin_geo', password='x', is_staff=True))
+        self.url = f'/api/furgones/{self.furgon.pk}/track/'
+
+    def test_track_is_simplified_and_cached(self):
+        params = {'desde': self.start.isoformat(), 'hasta': (self.start + timedelta(hours=1)).isoformat(), 'zoom': 15}
+        resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['original_points'], 200)
+        self.assertEqual(len(data['points']), 2)
+        with self.assertNumQueries(1):  # only get_object; points come from the cache
+            self.assertEqual(self.client.get(self.url, params).json(), data)
+
+    def test_open_window_is_cached_per_bucket(self):
+        bucket = FurgonViewSet.TRACK_OPEN_BUCKET
+        start = timezone.now().replace(microsecond=0)
+        start -= timedelta(seconds=int(start.timestamp()) % bucket)
+        with mock.patch('core.views.timezone.now', return_value=start + timedelta(seconds=1)):
+            data = self.client.get(self.url).json()
+        self.assertEqual(data['original_points'], 200)
+        self.assertEqual(parse_datetime(data['hasta']), start + timedelta(seconds=bucket))
+        with mock.patch('core.views.timezone.now', return_value=start + timedelta(seconds=bucket - 1)):
+            with self.assertNumQueries(1):  # only get_object
+                self.assertEqual(self.client.get(self.url).json(), data)
+        with mock.patch('core.views.timezone.now', return_value=start + timedelta(seconds=bucket)):
+            self.assertNotEqual(self.client.get(self.url).json()['hasta'], data['hasta'])
+
+    def test_zero_tolerance_returns_full_track(self):
+        resp = self.client.get(self.url, {'tolerance': 0})
+        self.assertEqual(len(resp.json()['points']), 200)
+
+    def test_invalid_window(self):
+        params = {'desde': self.start.isoformat(), 'hasta': (self.start - timedelta(hours=1)).isoformat()}
+        self.assertEqual(self.client.get(self.url, params).status_code, 400)
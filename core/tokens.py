@@ -0,0 +1,92 @@
+"""JWTs that carry the user's roles as signed claims.
+
+Access tokens issued by ``/api/token/`` and ``/api/token/refresh/`` include:
+
+* ``roles``: names of the user's groups,
+* ``is_staff``,
+* ``conductor``: id of the user's ``Conductor`` profile (or ``None``),
+* ``furgones``: ids of the furgones driven by that conductor,
+* ``rv``: the user's revocation stamp when the token was issued.
+
+``core.authentication.ClaimsJWTAuthentication`` turns such a token into a
+``ClaimsUser`` without loading the user or its groups from the database.
+Claims can go stale when an admin changes a user's groups or furgones, so
+those changes call ``revoke`` (see ``core.signals``): the user's stamp is
+bumped and tokens issued before it are rejected. Clients then get a 401 and
+refresh, and the refresh rebuilds the claims from the database. The stamps
+are kept with the version stamps (``core.versions``, a database table), so a
+revocation reaches every worker process, not only the one that made the
+change; checking a token costs one indexed query.
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import versions
+
+ROLES_CLAIM = 'roles'
+REVOCATION_CLAIM = 'rv'
+
+
+def _revocation_key(user_id):
+    return f'jwt:revoked:{user_id}'
+
+
+def revocation_stamp(user_id):
+    key = _revocation_key(user_id)
+    return versions.stored([key]).get(key, 0)
+
+
+def revoke(user_ids):
+    """Reject the role-claim tokens already issued to ``user_ids``."""
+    versions.store([_revocation_key(pk) for pk in user_ids if pk is not None], time.time())
+
+
+def is_revoked(token):
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    return token.get(REVOCATION_CLAIM, 0) < revocation_stamp(user_id)
+
+
+def add_role_claims(token, user):
+    """Store the roles and profile ids of ``user`` in ``token``."""
+    from .models import Conductor, Furgon
+
+    conductor_id = Conductor.objects.filter(user=user).values_list('pk', flat=True).first()
+    token[ROLES_CLAIM] = sorted(user.groups.values_list('name', flat=True))
+    token['is_staff'] = user.is_staff
+    token['conductor'] = conductor_id
+    token['furgones'] = (
+        sorted(Furgon.objects.filter(conductor_id=conductor_id).values_list('pk', flat=True))
+        if conductor_id is not None else []
+    )
+    token[REVOCATION_CLAIM] = revocation_stamp(user.pk)
+    return token
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        data['access'] = str(add_role_claims(access, self.user))
+        return data
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that recomputes the role claims instead of copying them."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        User = get_user_model()
+        try:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]})
+        except (User.DoesNotExist, KeyError) as exc:
+            raise InvalidToken('usuario no encontrado') from exc
+        if not user.is_active:
+            raise InvalidToken('usuario inactivo')
+        data['access'] = str(add_role_claims(access, user))
+        return data
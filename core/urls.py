@@ -1,6 +1,6 @@
 from rest_framework import routers
 from django.urls import path, include
-from . import views
+from . import stream, views
 
 router = routers.DefaultRouter()
 router.register(r'colegios', views.ColegioViewSet)
@@ -8,10 +8,15 @@ router.register(r'conductores', views.ConductorViewSet)
 router.register(r'furgones', views.FurgonViewSet)
 router.register(r'estudiantes', views.EstudianteViewSet)
 router.register(r'rutas', views.RutaViewSet)
+router.register(r'paradas', views.ParadaRutaViewSet)
 router.register(r'notificaciones', views.NotificacionViewSet)
 router.register(r'pagos', views.PagoViewSet)
 router.register(r'asistencias', views.AsistenciaViewSet)
 
 urlpatterns = [
+    # Must precede the router so "stream" is not taken as a furgón pk
+    path('furgones/stream/', stream.positions_stream, name='furgon-stream'),
+    path('sync/', views.sync, name='sync'),
+    path('search/', views.global_search, name='search'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,219 @@
+"""Per-model version stamps for conditional GET (ETag / Last-Modified).
+
+Every model has a stamp, the time of its last change, in the ``Sello``
+table: every process that writes (web workers, ``gps_server``, management
+commands) bumps the stamps all the others read, which a per-process cache
+could not guarantee.
+The model signals (``core.signals``) bump it on save and delete, and the
+write paths that bypass the signals bump it themselves (``core.bulk``,
+``core.gps``, ``core.geofence``). GPS fixes only touch the position columns
+of ``Furgon``; they bump ``POSITIONS`` instead of the ``Furgon`` stamp, so
+views that only depend on who drives which furgón are not invalidated on
+every fix.
+
+Fixes arrive many times per second, and every upsert of the same ``Sello``
+row takes its lock until the writer commits (serializing the writers on
+MySQL). ``POSITIONS`` is therefore sliced (``SLICES``, ``bump_slice``): its
+value is the end of the current one-second slice, and each process writes
+it at most once per slice, so the row is written at most once per second
+per process however many fixes arrive. Until the slice ends further fixes
+may change the data without changing the stamp, so a response depending
+on an open slice gets no validators and is not cached (``settled``); see
+``scripts/bench_positions_stamp.py``. The slices assume the clocks of the
+writers and the readers agree.
+
+A view declares the stamps its response depends on: the rendered models
+and the ones that decide what the user may see (``core.scoping``). The
+validators are derived from those stamps and the request alone, so a
+matching ``If-None-Match``/``If-Modified-Since`` is answered with 304
+before the view runs its query or serializer; reading the stamps is one
+indexed query. A missing stamp is set to the current time, which only
+costs one full response.
+"""
+import hashlib
+import math
+import time
+
+from django.db import connection, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .roles import user_roles
+
+POSITIONS = 'core.furgon.posiciones'
+
+# Stamps bumped with ``bump_slice``: name -> width of a slice, in seconds.
+SLICES = {POSITIONS: 1.0}
+# name -> end of the last slice this process stored
+_stored_slices = {}
+
+# Last-Modified has a resolution of one second: a stamp this recent could be
+# followed by another change within the same second, so only the ETag is sent.
+LAST_MODIFIED_MIN_AGE = 1.0
+
+
+def _name(dependency):
+    return dependency if isinstance(dependency, str) else dependency._meta.label_lower
+
+
+def _key(dependency):
+    return f'version:{_name(dependency)}'
+
+
+def store(names, value):
+    """Set the stamps ``names`` to ``value``, in one statement."""
+    from .models import Sello
+
+    # a single order, so concurrent writers lock the rows in the same order
+    names = sorted(set(names))
+    if not names:
+        return
+    target = {'unique_fields': ['nombre']} if connection.features.supports_update_conflicts_with_target else {}
+    Sello.objects.bulk_create([Sello(nombre=name, valor=value) for name in names],
+                              update_conflicts=True, update_fields=['valor'], **target)
+
+
+def stored(names):
+    """``{name: value}`` of the existing stamps among ``names``."""
+    from .models import Sello
+
+    return dict(Sello.objects.filter(nombre__in=list(names)).values_list('nombre', 'valor'))
+
+
+def bump(*dependencies):
+    """Mark the models (or stamp names) ``dependencies`` as changed now."""
+    store([_key(dep) for dep in dependencies], time.time())
+
+
+def bump_slice(dependency):
+    """Mark ``dependency`` (one of ``SLICES``) as changed in the current
+    slice; the stamp is only written by the first call of the slice."""
+    name = _name(dependency)
+    width = SLICES[name]
+    end = (math.floor(time.time() / width) + 1) * width
+    if _stored_slices.get(name) == end:
+        return
+    store([_key(name)], end)
+    # a rolled back write must be retried by the next fix
+    transaction.on_commit(lambda: _stored_slices.__setitem__(name, end))
+
+
+def settled(dependencies, values):
+    """Whether the slices of the sliced stamps among ``dependencies`` are
+    over (``values``: their stamps), so the data they cover is final."""
+    now = time.time()
+    return not any(_name(dep) in SLICES and value > now for dep, value in zip(dependencies, values))
+
+
+def stamps(dependencies):
+    """Current stamps of ``dependencies``, in order, in one query."""
+    from .models import Sello
+
+    keys = [_key(dep) for dep in dependencies]
+    found = stored(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time()
+        # ignore_conflicts: another process may have set (or bumped) it meanwhile
+        Sello.objects.bulk_create([Sello(nombre=key, valor=now) for key in set(missing)], ignore_conflicts=True)
+        found.update(stored(missing))
+    return [found.get(key, 0.0) for key in keys]
+
+
+def fingerprint(*parts):
+    """Short hash of ``parts`` (their ``repr``), for ETags and cache keys."""
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def validators(request, dependencies, *extra, values=None):
+    """``(etag, last_modified)`` of a response built from ``dependencies``
+    (``values``: their stamps, when already read).
+
+    The ETag also covers what else the response varies on: the URL, the
+    negotiated format, the user and its roles, and ``extra``.
+    ``last_modified`` is an epoch in seconds, or ``None`` when too recent.
+    Both are ``None`` while a slice is open (``settled``).
+    """
+    if values is None:
+        values = stamps(dependencies)
+    if not settled(dependencies, values):
+        return None, None
+    user = request.user
+    identity = None
+    if user.is_authenticated:
+        # staff see everything regardless of their groups (core.scoping)
+        identity = (user.pk, True) if user.is_staff else (user.pk, False, sorted(user_roles(user)))
+    etag = '"%s"' % fingerprint(request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), identity, values, extra)
+    newest = max(values, default=0.0)
+    last_modified = int(newest) if time.time() - newest >= LAST_MODIFIED_MIN_AGE else None
+    return etag, last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """The 304 response for ``request`` if its validators match, else ``None``."""
+    if request.method not in ('GET', 'HEAD') or etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    """Add the validators to a full response. Clients (browsers included)
+    must revalidate before reusing it, and shared caches must not store it."""
+    if response.status_code in (200, 304):
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _expanded_models(serializer_class, expand):
+    expandable = serializer_class.get_expandable_fields()
+    for name, nested in expand.items():
+        nested_class = expandable[name]
+        yield nested_class.Meta.model
+        yield from _expanded_models(nested_class, nested)
+
+
+class ConditionalGetMixin:
+    """Viewset mixin answering conditional ``list``/``retrieve`` requests
+    with 304 before the queryset is built.
+
+    ``version_dependencies`` lists the stamps the response depends on (by
+    default the viewset model); relations expanded with ``?expand=``
+    (``core.fieldsets``) are added to it.
+    """
+    version_dependencies = None
+    _version_stamps = None
+
+    def get_version_stamps(self):
+        """Stamps of the dependencies, read once per request."""
+        if self._version_stamps is None:
+            self._version_stamps = stamps(self.get_version_dependencies())
+        return self._version_stamps
+
+    def get_version_dependencies(self):
+        dependencies = list(self.version_dependencies or (self.queryset.model,))
+        _, expand = self.get_fieldsets()
+        for model in _expanded_models(self.get_serializer_class(), expand):
+            dependencies.append(model)
+            if model._meta.label_lower == 'core.furgon':
+                dependencies.append(POSITIONS)
+        return list(dict.fromkeys(dependencies))
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = validators(request, self.get_version_dependencies(), values=self.get_version_stamps())
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = set_validators(handler(request, *args, **kwargs), etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
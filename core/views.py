@@ -1,12 +1,18 @@
+from datetime import timedelta
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.core.cache import cache
 from django.utils import timezone
 
-from .models import Colegio, Conductor, Furgon, Estudiante, Ruta, Notificacion, Pago, Asistencia
+from .models import (
+    Colegio, Conductor, Furgon, Estudiante, Ruta, Notificacion, Pago, Asistencia, PosicionFurgon, ParadaRuta
+)
 from .serializers import (
     ColegioSerializer, ConductorSerializer, FurgonSerializer, EstudianteSerializer,
-    RutaSerializer, NotificacionSerializer, PagoSerializer, AsistenciaSerializer
+    RutaSerializer, NotificacionSerializer, PagoSerializer, AsistenciaSerializer, ParadaRutaSerializer
 )
 from .permissions import (
     IsAdminOrReadOnly,
@@ -14,25 +20,101 @@ from .permissions import (
     AllowAuthenticatedWriteOrReadOnly,
 )
 from .permissions import in_group
+from .fieldsets import FieldsetsMixin
+from .fastread import FastListMixin
+from .versions import POSITIONS, ConditionalGetMixin
+from .respcache import ResponseCacheMixin
+from .canonical import AutocompleteMixin
+from . import bulk, eta, geo, gps, journal, live, scoping, search
+
+
+class BaseModelViewSet(ConditionalGetMixin, ResponseCacheMixin, FastListMixin, FieldsetsMixin, viewsets.ModelViewSet):
+    """ModelViewSet with the read path of the API: conditional GET
+    (``core.versions``), response cache (``core.respcache``), list encoding
+    without model instances (``core.fastread``) and ``?fields=``/``?expand=``
+    (``core.fieldsets``)."""
+
+
+class BulkWriteMixin:
+    """``POST <recurso>/bulk/``: alta, actualización o upsert de muchas filas
+    en una sola solicitud (ver ``core.bulk``).
+
+    Payload esperado (JSON), una lista (modo ``create``) o un objeto:
+        {"mode": "create" | "update" | "upsert", "rows": [{...}, ...]}
+
+    Responde con un resultado por fila, en el mismo orden; las filas con
+    errores no impiden que se escriban las demás.
+    """
 
+    def bulk_allowed(self, user):
+        return scoping.is_admin(user)
 
-class ColegioViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not self.bulk_allowed(request.user):
+            return Response({'detail': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
+        items, mode = request.data, bulk.MODE_CREATE
+        if isinstance(items, dict):
+            items, mode = items.get('rows'), items.get('mode', bulk.MODE_CREATE)
+        if mode not in bulk.MODES:
+            return Response(
+                {'detail': f'mode debe ser uno de: {", ".join(bulk.MODES)}'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'se espera una lista de filas'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > bulk.MAX_ROWS_PER_REQUEST:
+            return Response(
+                {'detail': f'máximo {bulk.MAX_ROWS_PER_REQUEST} filas por solicitud'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        results = bulk.apply(self.get_serializer_class(), items, mode, request.user)
+        counts = {state: sum(1 for r in results if r['status'] == state)
+                  for state in (bulk.STATUS_CREATED, bulk.STATUS_UPDATED, bulk.STATUS_ERROR)}
+        return Response({**counts, 'results': results})
+
+
+class ColegioViewSet(BaseModelViewSet):
     queryset = Colegio.objects.all()
     serializer_class = ColegioSerializer
+    keyset_ordering = ('nombre', 'id')
+    shared_responses = True
     permission_classes = [IsAdminOrReadOnly]
 
 
-class ConductorViewSet(viewsets.ModelViewSet):
+class ConductorViewSet(AutocompleteMixin, BaseModelViewSet):
     queryset = Conductor.objects.all()
     serializer_class = ConductorSerializer
+    keyset_ordering = ('nombre', 'id')
+    autocomplete_columns = ('id', 'rut', 'nombre')
+    shared_responses = True
     permission_classes = [IsAdminOrReadOnly]
 
 
-class FurgonViewSet(viewsets.ModelViewSet):
+class FurgonViewSet(AutocompleteMixin, BaseModelViewSet):
     queryset = Furgon.objects.all()
     serializer_class = FurgonSerializer
+    keyset_ordering = ('patente', 'id')
+    autocomplete_columns = ('id', 'patente', 'modelo')
+    version_dependencies = (Furgon, POSITIONS, Conductor, Estudiante)
     permission_classes = [IsAdminOrConductorOrReadOnly]
 
+    def get_queryset(self):
+        return scoping.furgones(super().get_queryset(), self.request.user)
+
+    NEARBY_DEFAULT_RADIUS_M = 2000
+    NEARBY_MAX_RADIUS_M = 100000
+    NEARBY_MAX_K = 100
+
+    TRACK_MAX_WINDOW = timedelta(days=7)
+    TRACK_DEFAULT_TOLERANCE_M = 10.0
+    # Windows closed longer ago than this are considered immutable.
+    TRACK_OPEN_WINDOW_GRACE = timedelta(minutes=5)
+    TRACK_CACHE_TTL_OPEN = 30
+    TRACK_CACHE_TTL_CLOSED = 24 * 3600
+    # Without ``hasta`` the window ends at the end of the current bucket of
+    # this many seconds, so requests within it share their cache entry.
+    TRACK_OPEN_BUCKET = TRACK_CACHE_TTL_OPEN
+
     @action(detail=True, methods=['post'])
     def update_location(self, request, pk=None):
         """Endpoint para actualizar ubicación GPS del furgón.
@@ -43,6 +125,10 @@ class FurgonViewSet(viewsets.ModelViewSet):
                 "longitude": <float>,
                 "reported_at": "YYYY-MM-DDTHH:MM:SS"  # opcional
             }
+
+        Si ``reported_at`` no es más reciente que la última posición guardada,
+        la posición no se escribe y se responde 409 con ``status`` igual a
+        ``duplicate`` o ``stale``.
         """
         furgon = self.get_object()
         lat = request.data.get('latitude')
@@ -55,23 +141,205 @@ class FurgonViewSet(viewsets.ModelViewSet):
             lon = float(lon)
         except (TypeError, ValueError):
             return Response({'detail': 'latitude y longitude deben ser números'}, status=status.HTTP_400_BAD_REQUEST)
-        if reported_at:
-            try:
-                reported_at = timezone.datetime.fromisoformat(reported_at)
-            except Exception:
-                reported_at = timezone.now()
-        else:
-            reported_at = timezone.now()
-        furgon.update_location(latitude=lat, longitude=lon, reported_at=reported_at)
+        reported_at = gps.parse_reported_at(reported_at)
+        result = furgon.update_location(latitude=lat, longitude=lon, reported_at=reported_at)
         serializer = self.get_serializer(furgon)
+        if result != Furgon.LOCATION_APPLIED:
+            detail = (
+                'posición duplicada' if result == Furgon.LOCATION_DUPLICATE
+                else 'posición más antigua que la última registrada'
+            )
+            return Response(
+                {'detail': detail, 'status': result, 'furgon': serializer.data},
+                status=status.HTTP_409_CONFLICT,
+            )
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_update_location(self, request):
+        """Ingesta masiva de posiciones GPS para varios furgones.
+
+        Payload esperado (JSON), una lista o un objeto con la clave ``fixes``:
+            [
+                {"furgon": <id>, "latitude": <float>, "longitude": <float>,
+                 "reported_at": "YYYY-MM-DDTHH:MM:SS"},  # reported_at opcional
+                ...
+            ]
+
+        Responde con un resultado por elemento, en el mismo orden.
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('fixes')
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'se espera una lista de posiciones'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > gps.MAX_FIXES_PER_REQUEST:
+            return Response(
+                {'detail': f'máximo {gps.MAX_FIXES_PER_REQUEST} posiciones por solicitud'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        results = gps.ingest_fixes(items, request.user)
+        applied = sum(1 for r in results if r['status'] == gps.STATUS_APPLIED)
+        return Response({'applied': applied, 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def positions(self, request):
+        """Posiciones actuales de toda la flota, servidas desde memoria.
+
+        Respuesta compacta: ``positions`` es una lista de filas con las
+        columnas indicadas en ``fields`` (``reported_at`` en segundos epoch).
+        Soporta ``If-None-Match``: responde 304 si la versión no cambió.
+        Solo incluye los furgones visibles para el usuario.
+        """
+        live.warm_up()
+        store = live.positions()
+        etag = f'"{store.version()}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        version, positions = live.snapshot()
+        if not scoping.is_admin(request.user):
+            visible = set(self.get_queryset().values_list('pk', flat=True))
+            positions = {pk: pos for pk, pos in positions.items() if pk in visible}
+        rows = [
+            [pk, lat, lon, int(reported_at.timestamp()) if reported_at else None]
+            for pk, (lat, lon, reported_at) in sorted(positions.items())
+        ]
+        data = {'version': version, 'fields': ['id', 'latitude', 'longitude', 'reported_at'], 'positions': rows}
+        return Response(data, headers={'ETag': f'"{version}"'})
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Furgones cercanos a un punto, usando el índice geohash.
+
+        Parámetros (query string):
+            lat, lon   punto de referencia (requeridos)
+            radius     radio en metros (modo radio, por defecto 2000)
+            k          cantidad de furgones más cercanos (modo k-nearest)
+        """
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+        except (KeyError, TypeError, ValueError):
+            return Response({'detail': 'lat y lon son requeridos y deben ser números'}, status=status.HTTP_400_BAD_REQUEST)
+        k = request.query_params.get('k')
+        try:
+            if k is not None:
+                k = int(k)
+                if not 1 <= k <= self.NEARBY_MAX_K:
+                    raise ValueError
+            radius = float(request.query_params.get('radius', self.NEARBY_DEFAULT_RADIUS_M))
+            if not 0 < radius <= self.NEARBY_MAX_RADIUS_M:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response(
+                {'detail': f'k debe estar entre 1 y {self.NEARBY_MAX_K}; '
+                           f'radius entre 0 y {self.NEARBY_MAX_RADIUS_M} metros'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        if k is not None:
+            found = geo.nearest(queryset, lat, lon, k)
+        else:
+            found = geo.within_radius(queryset, lat, lon, radius)
+        results = [
+            {
+                'id': pk,
+                'patente': patente,
+                'latitude': f_lat,
+                'longitude': f_lon,
+                'last_reported_at': reported_at,
+                'distance_m': round(distance, 1),
+            }
+            for distance, (pk, patente, f_lat, f_lon, reported_at) in found
+        ]
+        return Response({'count': len(results), 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def track(self, request, pk=None):
+        """Recorrido simplificado del furgón en una ventana de tiempo.
 
-class EstudianteViewSet(viewsets.ModelViewSet):
+        Parámetros (query string):
+            desde, hasta   ISO-8601 (por defecto: últimas 24 horas; máximo 7 días)
+            zoom           nivel de zoom del mapa (0-22): tolerancia de 1 píxel
+            tolerance      tolerancia en metros (si no se indica zoom; por defecto 10)
+
+        El resultado simplificado (Douglas–Peucker) se guarda en caché por
+        ventana y zoom/tolerancia. Sin ``hasta`` la ventana termina al final
+        del intervalo de ``TRACK_OPEN_BUCKET`` segundos en curso.
+        """
+        furgon = self.get_object()
+        params = request.query_params
+        if params.get('hasta'):
+            hasta = gps.parse_reported_at(params['hasta'])
+        else:
+            now = timezone.now().replace(microsecond=0)
+            hasta = now + timedelta(seconds=self.TRACK_OPEN_BUCKET - int(now.timestamp()) % self.TRACK_OPEN_BUCKET)
+        desde = gps.parse_reported_at(params.get('desde')) if params.get('desde') else hasta - timedelta(days=1)
+        if desde >= hasta or hasta - desde > self.TRACK_MAX_WINDOW:
+            return Response({'detail': 'ventana inválida (desde < hasta, máximo 7 días)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            zoom = int(params['zoom']) if 'zoom' in params else None
+            tolerance = float(params.get('tolerance', self.TRACK_DEFAULT_TOLERANCE_M))
+            if (zoom is not None and not 0 <= zoom <= 22) or tolerance < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'detail': 'zoom debe estar entre 0 y 22; tolerance >= 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+        level = f'z{zoom}' if zoom is not None else f't{tolerance:g}'
+        key = f'track:{furgon.pk}:{int(desde.timestamp())}:{int(hasta.timestamp())}:{level}'
+        data = cache.get(key)
+        if data is None:
+            rows = list(
+                PosicionFurgon.objects.filter(furgon=furgon, reported_at__gte=desde, reported_at__lte=hasta)
+                .order_by('reported_at')
+                .values_list('latitude', 'longitude', 'reported_at')
+            )
+            lats = [r[0] for r in rows]
+            lons = [r[1] for r in rows]
+            if zoom is not None:
+                tolerance = geo.tolerance_for_zoom(zoom, lats[0] if lats else 0.0)
+            keep = geo.simplify(lats, lons, tolerance)
+            data = {
+                'furgon': furgon.pk,
+                'desde': desde,
+                'hasta': hasta,
+                'tolerance_m': round(tolerance, 2),
+                'original_points': len(rows),
+                'fields': ['latitude', 'longitude', 'reported_at'],
+                'points': [[lats[i], lons[i], int(rows[i][2].timestamp())] for i in keep],
+            }
+            closed = hasta < timezone.now() - self.TRACK_OPEN_WINDOW_GRACE
+            cache.set(key, data, self.TRACK_CACHE_TTL_CLOSED if closed else self.TRACK_CACHE_TTL_OPEN)
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def eta(self, request, pk=None):
+        """Hora estimada de llegada a cada parada restante de la ruta activa.
+
+        Se recalcula sólo cuando llega una nueva posición del furgón.
+        """
+        furgon = self.get_object()
+        result = eta.compute_eta(furgon.pk)
+        if result is None:
+            return Response(
+                {'detail': 'sin posición conocida o sin ruta activa con paradas'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({k: v for k, v in result.items() if k != 'version'})
+
+
+class EstudianteViewSet(AutocompleteMixin, BulkWriteMixin, BaseModelViewSet):
     queryset = Estudiante.objects.all()
     serializer_class = EstudianteSerializer
+    keyset_ordering = ('nombre', 'id')
+    fast_list = True
+    autocomplete_columns = ('id', 'rut', 'nombre')
+    version_dependencies = (Estudiante, Furgon, Conductor)
     permission_classes = [AllowAuthenticatedWriteOrReadOnly]
 
+    def get_queryset(self):
+        return scoping.estudiantes(super().get_queryset(), self.request.user)
+
     def partial_update(self, request, *args, **kwargs):
         # Custom partial update that enforces ownership without relying on DRF's get_object (which
         # calls object-level permission checks). We retrieve the instance directly and apply
@@ -103,14 +371,29 @@ class EstudianteViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class RutaViewSet(viewsets.ModelViewSet):
+class RutaViewSet(BaseModelViewSet):
     queryset = Ruta.objects.all()
     serializer_class = RutaSerializer
+    keyset_ordering = ('id',)
+    shared_responses = True
 
 
-class NotificacionViewSet(viewsets.ModelViewSet):
+class ParadaRutaViewSet(BaseModelViewSet):
+    queryset = ParadaRuta.objects.all()
+    serializer_class = ParadaRutaSerializer
+    keyset_ordering = ('ruta_id', 'orden')
+    shared_responses = True
+    permission_classes = [IsAdminOrConductorOrReadOnly]
+
+
+class NotificacionViewSet(BaseModelViewSet):
     queryset = Notificacion.objects.all().order_by('-creado_at')
     serializer_class = NotificacionSerializer
+    keyset_ordering = ('-creado_at', '-id')
+    version_dependencies = (Notificacion, Estudiante, Furgon, Conductor)
+
+    def get_queryset(self):
+        return scoping.notificaciones(super().get_queryset(), self.request.user)
 
     @action(detail=True, methods=['post'])
     def marcar_leida(self, request, pk=None):
@@ -119,11 +402,89 @@ class NotificacionViewSet(viewsets.ModelViewSet):
         return Response({'status': 'ok'})
 
 
-class PagoViewSet(viewsets.ModelViewSet):
+class PagoViewSet(BulkWriteMixin, BaseModelViewSet):
     queryset = Pago.objects.all()
     serializer_class = PagoSerializer
+    keyset_ordering = ('-id',)
+    version_dependencies = (Pago, Estudiante, Furgon, Conductor)
+
+    def get_queryset(self):
+        return scoping.pagos(super().get_queryset(), self.request.user)
 
 
-class AsistenciaViewSet(viewsets.ModelViewSet):
+class AsistenciaViewSet(BulkWriteMixin, BaseModelViewSet):
     queryset = Asistencia.objects.all()
     serializer_class = AsistenciaSerializer
+    keyset_ordering = ('-fecha', 'id')
+    fast_list = True
+    version_dependencies = (Asistencia, Estudiante, Furgon, Conductor)
+
+    def get_queryset(self):
+        return scoping.asistencias(super().get_queryset(), self.request.user)
+
+    def bulk_allowed(self, user):
+        # conductores record the attendance of the students in their furgones
+        return super().bulk_allowed(user) or in_group(user, 'Conductor')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """Sincronización incremental de estudiantes, rutas y notificaciones.
+
+    Parámetros (query string):
+        since   token de la respuesta anterior; sin él se envían todas las
+                filas visibles (sincronización completa)
+
+    Por recurso responde ``created`` y ``updated`` (filas completas) y
+    ``deleted`` (ids), sólo con lo visible para el usuario. Si ``more`` es
+    verdadero quedan cambios: repetir con el nuevo ``token``. Responde 410
+    si el token es más antiguo que el registro conservado.
+    """
+    since = request.query_params.get('since')
+    if since is None:
+        token, more, data = journal.snapshot(request.user)
+    else:
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response({'detail': 'since debe ser un token válido'}, status=status.HTTP_400_BAD_REQUEST)
+        if journal.is_expired(since):
+            return Response(
+                {'detail': 'token expirado: sincronice sin since'}, status=status.HTTP_410_GONE
+            )
+        token, more, data = journal.changes_since(request.user, since)
+    return Response({'token': str(token), 'more': more, **data})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def global_search(request):
+    """Búsqueda global y autocompletado por nombre, rut, patente y referencia.
+
+    Parámetros (query string):
+        q       texto a buscar; sin tildes ni mayúsculas, cada palabra debe
+                ser el comienzo de una palabra del objeto o (desde 3 letras)
+                estar contenida en ella
+        tipos   lista separada por comas de colegio, conductor, furgon,
+                estudiante y pago (por defecto todos)
+        limit   máximo de resultados por tipo (por defecto 10, máximo 50)
+
+    Responde ``{tipo: [fila, ...]}`` sólo con lo visible para el usuario.
+    """
+    text = request.query_params.get('q', '')
+    kinds = [k for k in request.query_params.get('tipos', '').split(',') if k] or None
+    if kinds and not set(kinds) <= set(search.SEARCHABLE):
+        return Response(
+            {'detail': f"tipos válidos: {', '.join(search.SEARCHABLE)}"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = int(request.query_params.get('limit', search.AUTOCOMPLETE_LIMIT))
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return Response({'detail': 'limit debe ser un entero positivo'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(limit, search.MAX_AUTOCOMPLETE_LIMIT)
+    return Response(search.autocomplete(text, request.user, kinds, limit))
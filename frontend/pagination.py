@@ -0,0 +1,133 @@
+"""Keyset pagination for the frontend list pages.
+
+``KeysetListMixin`` replaces the ``?page=N`` paginator of a ``ListView``
+(``COUNT(*)`` plus an ``OFFSET`` scan, both linear in the table size) with
+the cursors of ``core.pagination``: a page is read with ``WHERE (ordering
+columns) > (last row shown) ... LIMIT paginate_by + 1`` whatever its depth,
+and the links only move forward or back one page.
+
+The total shown under the table is an estimate: the planner statistics of
+the table when the list is not filtered (PostgreSQL, MySQL), otherwise a
+``COUNT(*)`` cached for ``COUNT_ESTIMATE_TTL`` seconds per query. It is only
+computed when the template reads it.
+"""
+from django.db import connections
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from core import respcache, versions
+from core.pagination import decode_cursor, encode_cursor, position, seek
+
+COUNT_ESTIMATE_TTL = 300
+
+
+def _table_statistics(queryset):
+    """Row count kept by the database for an unfiltered ``queryset``, or ``None``."""
+    query = queryset.query
+    if query.where or query.distinct:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    elif connection.vendor == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+def estimated_count(queryset):
+    """Approximate number of rows of ``queryset``."""
+    estimate = _table_statistics(queryset)
+    if estimate is not None:
+        return estimate
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = versions.fingerprint(queryset.db, sql, params)
+    return respcache.get_or_compute(f'count:{key}', lambda: (queryset.count(), True), COUNT_ESTIMATE_TTL)
+
+
+class KeysetPaginator:
+    """What the templates read from ``paginator``: the estimated ``count``."""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.queryset)
+
+
+class KeysetPage:
+    """The ``page_obj`` of a keyset-paginated list: its rows and the URLs of
+    the neighbouring pages (``None`` at either end)."""
+
+    def __init__(self, object_list, paginator, next_url, previous_url):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_url = next_url
+        self.previous_url = previous_url
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_url is not None
+
+    def has_previous(self):
+        return self.previous_url is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetListMixin:
+    """Keyset pagination for a ``ListView``. ``keyset_ordering`` must end in a
+    unique column and should match an index of the table."""
+    keyset_ordering = ('-id',)
+    cursor_param = 'cursor'
+
+    def _url(self, cursor):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        if cursor is None:
+            params.pop(self.cursor_param, None)
+        else:
+            params[self.cursor_param] = cursor
+        return f'?{params.urlencode()}' if params else self.request.path
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = tuple(self.keyset_ordering)
+        values, reverse = None, False
+        encoded = self.request.GET.get(self.cursor_param)
+        if encoded:
+            try:
+                values, reverse = decode_cursor(encoded, queryset.model, ordering)
+            except ValueError:
+                raise Http404('Cursor inválido')
+
+        rows = list(seek(queryset, ordering, values, reverse)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_url = previous_url = None
+        if has_next and rows:
+            next_url = self._url(encode_cursor(position(rows[-1], ordering), reverse=False))
+        if has_previous:
+            cursor = encode_cursor(position(rows[0], ordering), reverse=True) if rows else None
+            previous_url = self._url(cursor)
+        page = KeysetPage(rows, KeysetPaginator(queryset, page_size), next_url, previous_url)
+        return page.paginator, page, rows, page.has_other_pages()
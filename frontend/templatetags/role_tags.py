@@ -1,13 +1,13 @@
 from django import template
 
+from core.permissions import in_group
+
 register = template.Library()
 
 
 @register.filter
 def has_group(user, group_name):
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name=group_name).exists()
+    return in_group(user, group_name)
 
 
 @register.filter
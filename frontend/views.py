@@ -1,18 +1,81 @@
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, CreateView, UpdateView, TemplateView
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.views.generic import DetailView
-from django.db.models import Count, Q
+from django.db.models import Q
 
 from core.models import Colegio, Conductor, Furgon, Estudiante, Ruta, Notificacion, Pago, Asistencia
 from core.permissions import in_group
+from core import dashboard, respcache, search, versions
 from .forms import (
     ColegioForm, ConductorForm, FurgonForm, EstudianteForm, RutaForm,
     NotificacionForm, PagoForm, AsistenciaForm
 )
+from .pagination import KeysetListMixin
+
+
+class ConditionalPageMixin:
+    """Answer ``If-None-Match``/``If-Modified-Since`` with 304 from the version
+    stamps of ``version_dependencies`` (see ``core.versions``), before the
+    page's queries run, and serve the page from ``core.respcache`` otherwise.
+    Pages with pending messages are always rendered."""
+    version_dependencies = ()
+
+    def get_version_dependencies(self):
+        # every page shows the username in the navbar
+        return [*self.version_dependencies, get_user_model()]
+
+    def get_version_extra(self):
+        # forms embed a token derived from the CSRF secret
+        return (self.request.META.get('CSRF_COOKIE'),)
+
+    def get(self, request, *args, **kwargs):
+        if len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+        etag, last_modified = versions.validators(request, self.get_version_dependencies(), *self.get_version_extra())
+        response = versions.not_modified(request, etag, last_modified)
+        if response is None:
+            # the ETag already identifies the user, the page and the data
+            render = super().get
+            response = respcache.page(etag, lambda: render(request, *args, **kwargs))
+            response = versions.set_validators(response, etag, last_modified)
+        return response
+
+
+class ConditionalDetailMixin(ConditionalPageMixin):
+    # the detail page renders every field and the main relations
+    version_dependencies = (
+        Colegio, Conductor, Furgon, versions.POSITIONS, Estudiante, Ruta, Notificacion, Pago, Asistencia
+    )
+
+    def get_version_extra(self):
+        # the "Volver" link
+        return (*super().get_version_extra(), self.request.META.get('HTTP_REFERER'))
+
+
+class DetailFieldsMixin:
+    """Context for ``frontend/detail.html``: ``fields``, the ``(label, value)``
+    of every concrete field, and ``model_name``. The foreign keys are loaded
+    with the object so the rows cost no extra query."""
+
+    def get_queryset(self):
+        related = [f.name for f in self.model._meta.fields if f.many_to_one or f.one_to_one]
+        return super().get_queryset().select_related(*related)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        obj = self.object
+        ctx['model_name'] = obj._meta.model_name
+        ctx['fields'] = [
+            (field.verbose_name, getattr(obj, f'get_{field.name}_display')() if field.choices
+             else getattr(obj, field.name))
+            for field in obj._meta.fields
+        ]
+        return ctx
 
 
 class IndexView(TemplateView):
@@ -21,56 +84,30 @@ class IndexView(TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         user = self.request.user
-        # Global counts
-        ctx['count_furgones'] = Furgon.objects.count()
-        ctx['count_colegios'] = Colegio.objects.count()
-        ctx['count_conductores'] = Conductor.objects.count()
-        ctx['count_estudiantes'] = Estudiante.objects.count()
-        ctx['count_rutas'] = Ruta.objects.count()
-        ctx['count_pagos'] = Pago.objects.count()
-        ctx['count_asistencias'] = Asistencia.objects.count()
+        stamps = dashboard.current_stamps()
+        # Global counts (one cached query, see core.dashboard)
+        for name, value in dashboard.counts(stamps).items():
+            ctx[f'count_{name}'] = value
         # user-specific counts
-        if user and user.is_authenticated and in_group(user, 'Conductor'):
-            ctx['count_my_furgones'] = Furgon.objects.filter(conductor__user=user).count()
-        else:
-            ctx['count_my_furgones'] = 0
-        if user and user.is_authenticated:
-            # unread notifications relevant to user
-            if in_group(user, 'Apoderado'):
-                qs = Notificacion.objects.filter(
-                    estudiante__apoderado_user=user,
-                    leido=False,
-                )
-                ctx['count_unread_notifications'] = qs.count()
-            elif in_group(user, 'Conductor'):
-                qs = Notificacion.objects.filter(
-                    furgon__conductor__user=user,
-                    leido=False,
-                )
-                ctx['count_unread_notifications'] = qs.count()
-            else:
-                ctx['count_unread_notifications'] = Notificacion.objects.filter(leido=False).count()
-        else:
-            ctx['count_unread_notifications'] = 0
-        # top colegios by furgones
-        ctx['top_colegios'] = (
-            Colegio.objects.annotate(num_furgones=Count('furgones'))
-            .order_by('-num_furgones')[:5]
-        )
+        ctx['count_my_furgones'] = dashboard.my_furgones_count(user, stamps)
+        ctx['count_unread_notifications'] = dashboard.unread_notifications_count(user, stamps)
+        # top colegios by furgones, only computed if the template uses it
+        ctx['top_colegios'] = lambda: dashboard.top_colegios(stamps)
         return ctx
 
 
-class ColegioList(LoginRequiredMixin, ListView):
+class ColegioList(LoginRequiredMixin, ConditionalPageMixin, ListView):
     model = Colegio
     template_name = 'frontend/colegio_list.html'
     paginate_by = 20
+    version_dependencies = (Colegio,)
     ordering = ['nombre']
 
     def get_queryset(self):
         qs = super().get_queryset().order_by('nombre')
         q = self.request.GET.get('q')
         if q:
-            qs = qs.filter(nombre__icontains=q)
+            qs = search.matching(qs, q)
         return qs
 
 
@@ -104,17 +141,18 @@ class ColegioUpdate(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
         return response
 
 
-class ConductorList(LoginRequiredMixin, ListView):
+class ConductorList(LoginRequiredMixin, ConditionalPageMixin, ListView):
     model = Conductor
     template_name = 'frontend/conductor_list.html'
     paginate_by = 20
+    version_dependencies = (Conductor,)
     ordering = ['nombre']
 
     def get_queryset(self):
         qs = super().get_queryset().order_by('nombre')
         q = self.request.GET.get('q')
         if q:
-            qs = qs.filter(Q(nombre__icontains=q) | Q(rut__icontains=q))
+            qs = search.matching(qs, q)
         return qs
 
 
@@ -151,10 +189,11 @@ class ConductorUpdate(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return response
 
 
-class FurgonList(LoginRequiredMixin, ListView):
+class FurgonList(LoginRequiredMixin, ConditionalPageMixin, ListView):
     model = Furgon
     template_name = 'frontend/furgon_list.html'
     paginate_by = 20
+    version_dependencies = (Furgon, versions.POSITIONS, Conductor, Estudiante)
 
     def get_queryset(self):
         user = self.request.user
@@ -174,8 +213,8 @@ class FurgonList(LoginRequiredMixin, ListView):
         if qs is None:
             qs = Furgon.objects.none()
         if q:
-            qs = qs.filter(Q(patente__icontains=q) | Q(modelo__icontains=q))
-        return qs
+            qs = search.matching(qs, q)
+        return qs.select_related('conductor')
 
 
 class FurgonMineView(LoginRequiredMixin, TemplateView):
@@ -211,17 +250,17 @@ class FurgonCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     success_url = reverse_lazy('frontend:furgon_list')
 
 
-class ColegioDetail(LoginRequiredMixin, DetailView):
+class ColegioDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Colegio
     template_name = 'frontend/detail.html'
 
 
-class ConductorDetail(LoginRequiredMixin, DetailView):
+class ConductorDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Conductor
     template_name = 'frontend/detail.html'
 
 
-class FurgonDetail(LoginRequiredMixin, DetailView):
+class FurgonDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Furgon
     template_name = 'frontend/detail.html'
 
@@ -265,17 +304,21 @@ def furgon_update_location(request, pk):
         messages.error(request, 'latitude y longitude son requeridos')
         return redirect('frontend:furgon_list')
     try:
-        f.update_location(float(lat), float(lon))
-        messages.success(request, 'Ubicación actualizada')
+        if f.update_location(float(lat), float(lon)) == Furgon.LOCATION_APPLIED:
+            messages.success(request, 'Ubicación actualizada')
+        else:
+            messages.warning(request, 'Ya existe una ubicación más reciente')
     except Exception:
         messages.error(request, 'Error actualizando ubicación')
     return redirect('frontend:furgon_list')
 
 
-class EstudianteList(LoginRequiredMixin, ListView):
+class EstudianteList(LoginRequiredMixin, ConditionalPageMixin, KeysetListMixin, ListView):
     model = Estudiante
     template_name = 'frontend/estudiante_list.html'
     paginate_by = 20
+    keyset_ordering = ('nombre', 'id')
+    version_dependencies = (Estudiante, Furgon, Conductor)
 
     def get_queryset(self):
         user = self.request.user
@@ -291,8 +334,8 @@ class EstudianteList(LoginRequiredMixin, ListView):
             qs = Estudiante.objects.none()
         q = self.request.GET.get('q')
         if q:
-            qs = qs.filter(Q(nombre__icontains=q) | Q(rut__icontains=q))
-        return qs
+            qs = search.matching(qs, q)
+        return qs.select_related('furgon__conductor', 'apoderado_user')
 
 
 class EstudianteCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
@@ -307,7 +350,7 @@ class EstudianteCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
         return response
 
 
-class EstudianteDetail(LoginRequiredMixin, DetailView):
+class EstudianteDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Estudiante
     template_name = 'frontend/detail.html'
 
@@ -341,10 +384,11 @@ class EstudianteUpdate(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return response
 
 
-class RutaList(LoginRequiredMixin, ListView):
+class RutaList(LoginRequiredMixin, ConditionalPageMixin, ListView):
     model = Ruta
     template_name = 'frontend/ruta_list.html'
     paginate_by = 20
+    version_dependencies = (Ruta, Furgon)
     ordering = ['hora_inicio']
 
     def get_queryset(self):
@@ -352,7 +396,7 @@ class RutaList(LoginRequiredMixin, ListView):
         q = self.request.GET.get('q')
         if q:
             qs = qs.filter(Q(tipo_ruta__icontains=q) | Q(furgon__patente__icontains=q))
-        return qs
+        return qs.select_related('furgon')
 
 
 class RutaCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
@@ -390,16 +434,18 @@ class RutaUpdate(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return response
 
 
-class RutaDetail(LoginRequiredMixin, DetailView):
+class RutaDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Ruta
     template_name = 'frontend/detail.html'
 
 
-class NotificacionList(LoginRequiredMixin, ListView):
+class NotificacionList(LoginRequiredMixin, ConditionalPageMixin, KeysetListMixin, ListView):
     model = Notificacion
     template_name = 'frontend/notificacion_list.html'
     ordering = ['-creado_at']
     paginate_by = 20
+    keyset_ordering = ('-creado_at', '-id')
+    version_dependencies = (Notificacion, Estudiante, Furgon, Conductor)
 
     def get_queryset(self):
         user = self.request.user
@@ -414,7 +460,7 @@ class NotificacionList(LoginRequiredMixin, ListView):
         q = self.request.GET.get('q')
         if q:
             qs = qs.filter(mensaje__icontains=q)
-        return qs
+        return qs.select_related('furgon__conductor', 'estudiante')
 
 
 @login_required
@@ -446,23 +492,26 @@ class NotificacionCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     success_url = reverse_lazy('frontend:notificacion_list')
 
 
-class NotificacionDetail(LoginRequiredMixin, DetailView):
+class NotificacionDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Notificacion
     template_name = 'frontend/detail.html'
 
 
-class PagoList(LoginRequiredMixin, ListView):
+class PagoList(LoginRequiredMixin, ConditionalPageMixin, KeysetListMixin, ListView):
     model = Pago
     template_name = 'frontend/pago_list.html'
     paginate_by = 20
-    ordering = ['-fecha']
+    version_dependencies = (Pago, Estudiante)
+    ordering = ['-fecha', '-id']
+    # pagos without fecha come last (core.pagination.seek)
+    keyset_ordering = ('-fecha', '-id')
 
     def get_queryset(self):
-        qs = super().get_queryset().order_by('-fecha')
+        qs = super().get_queryset()
         q = self.request.GET.get('q')
         if q:
-            qs = qs.filter(Q(estudiante__nombre__icontains=q) | Q(referencia__icontains=q))
-        return qs
+            qs = search.matching(qs, q, (Pago, 'pk'), (Estudiante, 'estudiante'))
+        return qs.select_related('estudiante')
 
 
 class PagoCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
@@ -472,23 +521,25 @@ class PagoCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     success_url = reverse_lazy('frontend:pago_list')
 
 
-class PagoDetail(LoginRequiredMixin, DetailView):
+class PagoDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Pago
     template_name = 'frontend/detail.html'
 
 
-class AsistenciaList(LoginRequiredMixin, ListView):
+class AsistenciaList(LoginRequiredMixin, ConditionalPageMixin, KeysetListMixin, ListView):
     model = Asistencia
     template_name = 'frontend/asistencia_list.html'
     paginate_by = 20
+    version_dependencies = (Asistencia, Estudiante, Furgon)
     ordering = ['-fecha']
+    keyset_ordering = ('-fecha', 'id')
 
     def get_queryset(self):
         qs = super().get_queryset().order_by('-fecha')
         q = self.request.GET.get('q')
         if q:
-            qs = qs.filter(Q(estudiante__nombre__icontains=q))
-        return qs
+            qs = search.matching(qs, q, (Estudiante, 'estudiante'))
+        return qs.select_related('estudiante', 'furgon')
 
 
 class AsistenciaCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
@@ -498,6 +549,6 @@ class AsistenciaCreate(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     success_url = reverse_lazy('frontend:asistencia_list')
 
 
-class AsistenciaDetail(LoginRequiredMixin, DetailView):
+class AsistenciaDetail(LoginRequiredMixin, DetailFieldsMixin, ConditionalDetailMixin, DetailView):
     model = Asistencia
     template_name = 'frontend/detail.html'
@@ -33,6 +33,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# X-Query-Count header and a warning for repeated statements (N+1), see core/querycount.py
+if os.getenv('QUERY_COUNT_LOG') == '1':
+    MIDDLEWARE.insert(0, 'core.querycount.QueryCountMiddleware')
+
 ROOT_URLCONF = 'gestion_furgones.urls'
 
 TEMPLATES = [
@@ -52,6 +56,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'gestion_furgones.wsgi.application'
+ASGI_APPLICATION = 'gestion_furgones.asgi.application'
 
 # Database configuration: by default use SQLite for local development.
 # To use MySQL set environment variables: DB_ENGINE, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
@@ -77,17 +82,64 @@ else:
         }
     }
 
+# Default cache: roles, ETA plans and cached responses (core.respcache).
+# Process memory by default; with CACHE_BACKEND=file it lives under
+# CACHE_LOCATION and is shared by all the worker processes of the host. The
+# version stamps (core.versions) and token revocations (core.tokens) are kept
+# in the database, shared by every process either way.
+if os.getenv('CACHE_BACKEND') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gestion-furgones',
+            # one copy per worker process
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '2000'))},
+        }
+    }
+# Seconds a cached list/detail response is kept (0 disables the response cache).
+# The entries are keyed on the version stamps, which live in the database, so
+# a per-process copy is never served after a write in any process; the TTL and
+# MAX_ENTRIES only bound the memory each worker spends on its copies.
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '300' if os.getenv('CACHE_BACKEND') == 'file' else '60'))
+
 # Django REST Framework / Auth settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
+    # Keyset pagination (?cursor=, ?page_size= up to 500); see core.pagination
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Access tokens carry the user's roles as claims (core.tokens), so API
+# permission checks do not query the user or its groups.
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'core.tokens.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.tokens.RoleTokenRefreshSerializer',
+}
+
+# Live GPS positions (core.live). By default they are kept in process memory;
+# set LIVE_POSITIONS_CACHE_ALIAS to a CACHES alias to share them between workers.
+# LIVE_POSITIONS_MAX_SIZE is raised to the size of the fleet when the store warms up.
+LIVE_POSITIONS_CACHE_ALIAS = os.getenv('LIVE_POSITIONS_CACHE_ALIAS', '')
+LIVE_POSITIONS_MAX_SIZE = int(os.getenv('LIVE_POSITIONS_MAX_SIZE', '5000'))
+# Server-Sent Events stream (core.stream): seconds between checks and between heartbeats.
+LIVE_STREAM_INTERVAL = float(os.getenv('LIVE_STREAM_INTERVAL', '1.0'))
+LIVE_STREAM_HEARTBEAT = float(os.getenv('LIVE_STREAM_HEARTBEAT', '15.0'))
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'es'
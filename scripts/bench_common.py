@@ -0,0 +1,58 @@
+"""Shared setup for the ``scripts/bench_*.py`` benchmarks.
+
+Benchmarks run against a throw-away test database (in-memory for SQLite), so
+they never touch ``db.sqlite3``. Usage::
+
+    from bench_common import bench_db, timed
+
+    with bench_db():
+        with timed('label', n_items):
+            ...
+"""
+import contextlib
+import os
+import pathlib
+import sys
+import time
+
+# Ensure project root is on sys.path so Django settings can be imported
+BASE_DIR = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion_furgones.settings')
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+
+@contextlib.contextmanager
+def bench_db(response_cache=False):
+    """Create a fresh test database for the duration of the block.
+
+    The response cache (``core.respcache``) is off unless ``response_cache``,
+    so repeated requests measure the views themselves.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(RESPONSE_CACHE_TTL=(settings.RESPONSE_CACHE_TTL or 300) if response_cache else 0):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextlib.contextmanager
+def timed(label, count):
+    """Print elapsed time and throughput (items/sec) for the block."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else float('inf')
+    print(f'{label:<40} {count:>8} items  {elapsed:8.3f}s  {rate:12.1f} items/s')
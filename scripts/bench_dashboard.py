@@ -0,0 +1,46 @@
+"""Home page (``IndexView``) latency with the cached dashboard counters
+(``core.dashboard``): cold (empty cache) vs warm, for a growing fleet.
+
+Usage:
+    python scripts/bench_dashboard.py [n_requests]
+"""
+import sys
+from datetime import date
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client
+
+from core.models import Asistencia, Estudiante
+
+
+def grow(n_estudiantes):
+    start = Estudiante.objects.count()
+    Estudiante.objects.bulk_create(
+        [Estudiante(rut=f'{i}-K', nombre=f'Estudiante {i}') for i in range(start, n_estudiantes)], batch_size=1000
+    )
+    Asistencia.objects.bulk_create([
+        Asistencia(estudiante_id=pk, fecha=date(2025, 3, 3), estado='presente')
+        for pk in Estudiante.objects.filter(pk__gt=start).values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+def main(n_requests=200):
+    with bench_db():
+        client = Client()
+        client.force_login(User.objects.create_user('bench_admin', password='x', is_staff=True))
+        for size in (1000, 10000, 50000):
+            grow(size)
+            with timed(f'/ cold ({size} estudiantes)', n_requests):
+                for _ in range(n_requests):
+                    cache.clear()
+                    client.get('/')
+            with timed(f'/ warm ({size} estudiantes)', n_requests):
+                for _ in range(n_requests):
+                    client.get('/')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,47 @@
+"""Deep pages of the ``/asistencias/`` page: keyset cursors
+(``frontend.pagination``) at the start and at ~90% depth of the table.
+
+Usage:
+    python scripts/bench_frontend_pagination.py [n_estudiantes] [n_dias] [pages]
+"""
+import sys
+from datetime import date, timedelta
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from core.models import Asistencia, Estudiante
+from core.pagination import encode_cursor
+
+
+def main(n_estudiantes=1000, n_dias=200, pages=20):
+    with bench_db():
+        Estudiante.objects.bulk_create([Estudiante(rut=f'{i}-K', nombre=f'E{i}') for i in range(n_estudiantes)])
+        est_ids = list(Estudiante.objects.values_list('pk', flat=True))
+        start = date(2024, 1, 1)
+        for day in range(n_dias):
+            Asistencia.objects.bulk_create(
+                [Asistencia(estudiante_id=pk, fecha=start + timedelta(days=day), estado='presente') for pk in est_ids],
+                batch_size=1000,
+            )
+        total = n_estudiantes * n_dias
+        print(f'{total} asistencias')
+        client = Client()
+        client.force_login(User.objects.create_user('bench_admin', password='x', is_staff=True))
+        client.get('/asistencias/')  # warm-up, caches the estimated count
+
+        def walk(url):
+            for _ in range(pages):
+                url = '/asistencias/' + client.get(url).context['page_obj'].next_url
+
+        with timed('keyset: first pages', pages):
+            walk('/asistencias/')
+        deep = Asistencia.objects.order_by('-fecha', 'id')[int(total * 0.9)]
+        with timed('keyset: pages at 90% depth', pages):
+            walk(f'/asistencias/?cursor={encode_cursor([deep.fecha, deep.id], reverse=False)}')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
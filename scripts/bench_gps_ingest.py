@@ -0,0 +1,45 @@
+"""Compare single-point ``update_location`` against ``bulk_update_location``.
+
+Usage:
+    python scripts/bench_gps_ingest.py [n_furgones] [rounds]
+"""
+import sys
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from core.models import Furgon
+
+
+def main(n_furgones=300, rounds=3):
+    with bench_db():
+        admin = User.objects.create_user('bench_admin', password='x', is_staff=True)
+        Furgon.objects.bulk_create([Furgon(patente=f'BENCH-{i}') for i in range(n_furgones)])
+        ids = list(Furgon.objects.values_list('pk', flat=True))
+        client = APIClient()
+        client.force_authenticate(user=admin)
+
+        total = n_furgones * rounds
+        with timed('update_location (1 fix/request)', total):
+            for r in range(rounds):
+                for pk in ids:
+                    client.post(
+                        f'/api/furgones/{pk}/update_location/',
+                        {'latitude': -38.7 + r * 1e-4, 'longitude': -72.6},
+                        format='json',
+                    )
+
+        with timed('bulk_update_location (1 request/round)', total):
+            for r in range(rounds):
+                payload = [
+                    {'furgon': pk, 'latitude': -38.7 + r * 1e-4, 'longitude': -72.6}
+                    for pk in ids
+                ]
+                resp = client.post('/api/furgones/bulk_update_location/', payload, format='json')
+                assert resp.status_code == 200, resp.content
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,64 @@
+"""Load generator for the asyncio GPS ingestion server (``gps_server``).
+
+Starts the server in-process on a throw-away database, opens several
+device connections and reports sustained fixes/sec until every fix has
+been written.
+
+Usage:
+    python scripts/bench_gps_server.py [n_furgones] [fixes_per_furgon] [connections]
+"""
+import asyncio
+import sys
+import time
+
+from bench_common import bench_db
+
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.ingest_server import GpsIngestServer
+from core.models import Furgon, PosicionFurgon
+
+
+async def device(port, token, lines):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'AUTH {token}\n'.encode())
+    assert await reader.readline() == b'OK\n'
+    for start in range(0, len(lines), 200):
+        writer.write(''.join(lines[start:start + 200]).encode())
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(ids, fixes_per_furgon, connections, token):
+    server = GpsIngestServer(batch_size=1000, flush_interval=0.2, max_pending=20000)
+    await server.start('127.0.0.1', 0)
+    lines = [
+        f'{pk},{-38.7 + i * 1e-5:.6f},-72.6,2025-11-20T08:{i // 60 % 60:02d}:{i % 60:02d}\n'
+        for i in range(fixes_per_furgon)
+        for pk in ids
+    ]
+    per_conn = (len(lines) + connections - 1) // connections
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        device(server.port, token, lines[c * per_conn:(c + 1) * per_conn]) for c in range(connections)
+    ])
+    await server.stop()
+    elapsed = time.perf_counter() - start
+    return len(lines), elapsed, server.stats
+
+
+def main(n_furgones=200, fixes_per_furgon=50, connections=20):
+    with bench_db():
+        admin = User.objects.create_user('bench_admin', password='x', is_staff=True)
+        Furgon.objects.bulk_create([Furgon(patente=f'SRV-{i}') for i in range(n_furgones)])
+        ids = list(Furgon.objects.values_list('pk', flat=True))
+        token = str(AccessToken.for_user(admin))
+        total, elapsed, stats = asyncio.run(run(ids, fixes_per_furgon, connections, token))
+        print(f'{total} fixes / {connections} conexiones en {elapsed:.2f}s -> {total / elapsed:.0f} fixes/s')
+        print(f'stats: {stats}; filas en historial: {PosicionFurgon.objects.count()}')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
@@ -0,0 +1,51 @@
+"""Authenticated ``update_location`` throughput: plain JWT vs role-claims JWT.
+
+The plain token makes the API load the user and its groups on every
+request; the role-claims token (``core.tokens``) authorizes from its claims.
+
+Usage:
+    python scripts/bench_jwt_auth.py [requests]
+"""
+import sys
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Conductor, Furgon
+from core.tokens import add_role_claims
+
+
+def run(client, label, access, furgon, n):
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+    with CaptureQueriesContext(connection) as ctx, timed(label, n):
+        for i in range(n):
+            resp = client.post(
+                f'/api/furgones/{furgon.pk}/update_location/',
+                {'latitude': -38.7 + i * 1e-5, 'longitude': -72.6},
+                format='json',
+                **headers,
+            )
+            assert resp.status_code == 200, resp.content
+    print(f'{"":<40} {len(ctx.captured_queries) / n:8.1f} queries/request')
+
+
+def main(n=1000):
+    with bench_db():
+        user = User.objects.create_user('bench_cond', password='x')
+        user.groups.add(Group.objects.create(name='Conductor'))
+        conductor = Conductor.objects.create(rut='1-9', nombre='Bench', user=user)
+        furgon = Furgon.objects.create(patente='BENCH-JWT', conductor=conductor)
+        client = APIClient()
+
+        run(client, 'update_location (plain JWT)', str(AccessToken.for_user(user)), furgon, n)
+        claims = str(add_role_claims(AccessToken.for_user(user), user))
+        run(client, 'update_location (role-claims JWT)', claims, furgon, n)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,54 @@
+"""Benchmark ``nearby`` (geohash index) against a full scan + haversine.
+
+Usage:
+    python scripts/bench_nearby.py [n_furgones] [n_queries]
+"""
+import random
+import sys
+
+from bench_common import bench_db, timed
+
+from core import geo
+from core.models import Furgon
+
+# Área aproximada de Temuco / Padre Las Casas
+CENTER = (-38.7359, -72.5904)
+SPREAD = 0.25
+
+
+def full_scan(lat, lon, radius):
+    rows = list(Furgon.objects.exclude(geohash='').values_list(*geo.NEARBY_FIELDS))
+    return [
+        row for row in rows
+        if geo.haversine(lat, lon, row[2], row[3]) <= radius
+    ]
+
+
+def main(n_furgones=10000, n_queries=200):
+    rnd = random.Random(42)
+    with bench_db():
+        furgones = []
+        for i in range(n_furgones):
+            lat = CENTER[0] + rnd.uniform(-SPREAD, SPREAD)
+            lon = CENTER[1] + rnd.uniform(-SPREAD, SPREAD)
+            furgones.append(Furgon(patente=f'NB-{i}', last_latitude=lat, last_longitude=lon, geohash=geo.encode(lat, lon)))
+        Furgon.objects.bulk_create(furgones, batch_size=1000)
+        points = [
+            (CENTER[0] + rnd.uniform(-SPREAD, SPREAD), CENTER[1] + rnd.uniform(-SPREAD, SPREAD))
+            for _ in range(n_queries)
+        ]
+        qs = Furgon.objects.all()
+        print(f'{n_furgones} furgones')
+        for radius in (500, 2000):
+            with timed(f'full scan + haversine (r={radius}m)', n_queries):
+                expected = [len(full_scan(lat, lon, radius)) for lat, lon in points]
+            with timed(f'geohash within_radius (r={radius}m)', n_queries):
+                got = [len(geo.within_radius(qs, lat, lon, radius)) for lat, lon in points]
+            assert got == expected, 'geohash results differ from full scan'
+        with timed('geohash nearest (k=10)', n_queries):
+            for lat, lon in points:
+                geo.nearest(qs, lat, lon, 10)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,72 @@
+"""Deep pages of ``/api/asistencias/``: offset pagination vs keyset cursors.
+
+Offset pagination (``LimitOffsetPagination``) runs ``COUNT(*)`` and skips
+``offset`` rows for every page; the keyset cursor (``core.pagination``)
+seeks straight to the last row seen.
+
+Usage:
+    python scripts/bench_pagination.py [n_estudiantes] [n_dias] [pages]
+"""
+import sys
+from datetime import date, timedelta
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import User
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.test import APIClient
+
+from core.models import Asistencia, Estudiante
+from core.pagination import KeysetPagination
+from core.views import AsistenciaViewSet
+
+
+def main(n_estudiantes=1000, n_dias=200, pages=20):
+    with bench_db():
+        Estudiante.objects.bulk_create([Estudiante(rut=f'{i}-K', nombre=f'E{i}') for i in range(n_estudiantes)])
+        est_ids = list(Estudiante.objects.values_list('pk', flat=True))
+        start = date(2024, 1, 1)
+        for day in range(n_dias):
+            fecha = start + timedelta(days=day)
+            Asistencia.objects.bulk_create(
+                [Asistencia(estudiante_id=pk, fecha=fecha, estado='presente') for pk in est_ids],
+                batch_size=1000,
+            )
+        total = n_estudiantes * n_dias
+        print(f'{total} asistencias')
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user('bench_admin', password='x', is_staff=True))
+        page_size = 100
+        client.get(f'/api/asistencias/?page_size={page_size}')  # warm-up
+
+        with timed('keyset: first pages', pages):
+            url = f'/api/asistencias/?page_size={page_size}'
+            for _ in range(pages):
+                url = client.get(url).json()['next']
+
+        # jump deep with a cursor for the row at ~90% depth
+        deep = Asistencia.objects.order_by('-fecha', 'id')[int(total * 0.9)]
+        token = KeysetPagination().encode_cursor([deep.fecha, deep.id], reverse=False)
+        with timed('keyset: pages at 90% depth', pages):
+            url = f'/api/asistencias/?page_size={page_size}&cursor={token}'
+            for _ in range(pages):
+                url = client.get(url).json()['next']
+
+        # same order as the keyset pages
+        AsistenciaViewSet.pagination_class = LimitOffsetPagination
+        AsistenciaViewSet.queryset = Asistencia.objects.order_by('-fecha', 'id')
+        try:
+            with timed('offset: first pages', pages):
+                for i in range(pages):
+                    client.get(f'/api/asistencias/?limit={page_size}&offset={i * page_size}')
+            offset = int(total * 0.9)
+            with timed('offset: pages at 90% depth', pages):
+                for i in range(pages):
+                    client.get(f'/api/asistencias/?limit={page_size}&offset={offset + i * page_size}')
+        finally:
+            del AsistenciaViewSet.pagination_class
+            AsistenciaViewSet.queryset = Asistencia.objects.all()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
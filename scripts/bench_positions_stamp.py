@@ -0,0 +1,48 @@
+"""Writes of the ``POSITIONS`` stamp per GPS fix: one upsert per fix
+(``versions.bump``) against at most one per slice (``versions.bump_slice``).
+
+Every upsert locks the same ``Sello`` row, so on MySQL the writes per second
+bound the fixes per second of all the workers together.
+
+Usage:
+    python scripts/bench_positions_stamp.py [n_furgones] [rounds]
+"""
+import sys
+from unittest import mock
+
+from bench_common import bench_db, timed
+
+from django.utils import timezone
+
+from core import versions
+from core.models import Furgon
+
+
+def run(label, bump, furgones, rounds):
+    writes = []
+    store = versions.store
+
+    def counting_store(names, value):
+        writes.append(value)
+        store(names, value)
+
+    with mock.patch.object(versions, 'store', counting_store), \
+            mock.patch.object(versions, 'bump_slice', bump):
+        with timed(label, len(furgones) * rounds):
+            for r in range(rounds):
+                reported_at = timezone.now()
+                for furgon in furgones:
+                    furgon.update_location(-38.7 + r * 1e-4, -72.6, reported_at)
+    print(f'{"":<40} {len(writes):>8} stamp writes')
+
+
+def main(n_furgones=300, rounds=3):
+    with bench_db():
+        Furgon.objects.bulk_create([Furgon(patente=f'BENCH-{i}') for i in range(n_furgones)])
+        furgones = list(Furgon.objects.all())
+        run('bump (1 write/fix)', versions.bump, furgones, rounds)
+        run('bump_slice (1 write/slice)', versions.bump_slice, furgones, rounds)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
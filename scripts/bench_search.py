@@ -0,0 +1,55 @@
+"""Search (``core.search``): ``/api/search/`` and the ``?q=`` filter of the
+estudiantes page over the search index, vs the former ``icontains`` scan.
+
+Usage:
+    python scripts/bench_search.py [n_estudiantes] [n_requests]
+"""
+import random
+import sys
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.test import Client
+
+from core import search
+from core.models import Estudiante
+
+NOMBRES = ['María', 'José', 'Ana', 'Juan', 'Sofía', 'Matías', 'Isidora', 'Benjamín', 'Agustina', 'Tomás']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda']
+
+
+def main(n_estudiantes=100000, n_requests=200):
+    rng = random.Random(1)
+    with bench_db():
+        for start in range(0, n_estudiantes, 5000):
+            batch = Estudiante.objects.bulk_create([
+                Estudiante(rut=f'{10000000 + i}-{i % 10}',
+                           nombre=f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)} {i}')
+                for i in range(start, min(start + 5000, n_estudiantes))
+            ])
+            search.index(Estudiante, batch, created=True)
+        client = Client()
+        client.force_login(User.objects.create_user('bench_admin', password='x', is_staff=True))
+        print(f'{n_estudiantes} estudiantes')
+
+        for label, text in (('prefix', 'sepu'), ('rut', '1004231'), ('two words', 'jose munoz'),
+                            ('substring', 'ulved'), ('no match', 'zzzq')):
+            client.get('/api/search/', {'q': text, 'tipos': 'estudiante'})
+            with timed(f'/api/search/ {label}', n_requests):
+                for _ in range(n_requests):
+                    client.get('/api/search/', {'q': text, 'tipos': 'estudiante'})
+
+        queryset = Estudiante.objects.order_by('nombre', 'id')
+        n_queries = max(1, n_requests // 10)
+        with timed('icontains, first page', n_queries):
+            for _ in range(n_queries):
+                list(queryset.filter(Q(nombre__icontains='ulved') | Q(rut__icontains='ulved'))[:20])
+        with timed('search index, first page', n_queries):
+            for _ in range(n_queries):
+                list(search.matching(queryset, 'ulved')[:20])
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
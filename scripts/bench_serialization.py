@@ -0,0 +1,65 @@
+"""Rows/sec of ``/api/estudiantes/`` and ``/api/asistencias/``: the
+``ModelSerializer`` path vs the ``values_list()`` path (``core.fastread``).
+
+Each run walks all pages of the list and checks that both paths return the
+same bytes.
+
+Usage:
+    python scripts/bench_serialization.py [n_estudiantes] [n_dias] [page_size]
+"""
+import sys
+from datetime import date, timedelta
+from unittest import mock
+
+from bench_common import bench_db, timed
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from core.models import Asistencia, Estudiante, Furgon
+from core.views import AsistenciaViewSet, EstudianteViewSet
+
+
+def walk(client, url):
+    pages = []
+    while url:
+        resp = client.get(url)
+        pages.append(resp.content)
+        url = resp.json()['next']
+    return pages
+
+
+def main(n_estudiantes=5000, n_dias=10, page_size=500):
+    with bench_db():
+        furgon = Furgon.objects.create(patente='BENCH-1')
+        Estudiante.objects.bulk_create([
+            Estudiante(rut=f'{i}-K', nombre=f'Estudiante {i}', direccion=f'Calle {i}', furgon=furgon,
+                       fecha_nacimiento=date(2012, 1, 1) + timedelta(days=i % 2000))
+            for i in range(n_estudiantes)
+        ], batch_size=1000)
+        est_ids = list(Estudiante.objects.values_list('pk', flat=True))
+        for day in range(n_dias):
+            Asistencia.objects.bulk_create(
+                [Asistencia(estudiante_id=pk, fecha=date(2025, 3, 1) + timedelta(days=day), estado='presente',
+                            furgon=furgon) for pk in est_ids],
+                batch_size=1000,
+            )
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user('bench_admin', password='x', is_staff=True))
+
+        for viewset, url, total in (
+            (EstudianteViewSet, '/api/estudiantes/', n_estudiantes),
+            (AsistenciaViewSet, '/api/asistencias/', n_estudiantes * n_dias),
+        ):
+            url = f'{url}?page_size={page_size}'
+            walk(client, url)  # warm-up
+            with mock.patch.object(viewset, 'fast_list', False):
+                with timed(f'{url} serializer', total):
+                    slow = walk(client, url)
+            with timed(f'{url} values_list', total):
+                fast = walk(client, url)
+            print('identical output:', slow == fast)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])